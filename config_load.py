@@ -1,5 +1,12 @@
 import json
 import os.path as op
+import zipfile
+from datetime import datetime
+
+try:
+	from zoneinfo import ZoneInfo
+except ImportError:
+	ZoneInfo = None
 
 """
 	Configuration loader module for Social Media Analytics Kit.
@@ -42,10 +49,32 @@ def basic_check(config_dic):
 			"Invalid field": "Invalid \"Datadir\" field. Provide a path to \
 the folder that contains the results directory."
 		}
-	try:
-		assert op.exists(data_dir)
-	except AssertionError:
-		return {"FNF": "{} is not a valid path.".format(data_dir)}
+	if isinstance(data_dir, list):
+		# Datadir may also list the .zip archives of the export.
+		for archive in data_dir:
+			try:
+				assert isinstance(archive, str)
+				assert op.splitext(archive)[1].lower() == ".zip"
+			except AssertionError:
+				return {
+					"Invalid field": "Invalid \"Datadir\" field. A list in this \
+field must only contain paths to .zip archives."
+				}
+			try:
+				assert op.exists(archive)
+			except AssertionError:
+				return {"FNF": "{} is not a valid path.".format(archive)}
+			try:
+				assert zipfile.is_zipfile(archive)
+			except AssertionError:
+				return {
+					"Invalid field": "{} is not a valid .zip archive.".format(archive)
+				}
+	else:
+		try:
+			assert op.exists(data_dir)
+		except AssertionError:
+			return {"FNF": "{} is not a valid path.".format(data_dir)}
 
 	try:
 		assert len(config_dic["Resultsdir"]) != 0
@@ -100,6 +129,39 @@ field.".format(str(name))
 	return None
 
 
+"""
+	If the user limited the analysis to a range of dates, verify that
+	Start_date and End_date are "YYYY-MM-DD" dates (or empty) and that the
+	range is not empty.
+"""
+
+
+def date_range_check(config_dic):
+	dates = []
+	for field in ["Start_date", "End_date"]:
+		date_str = config_dic.get(field, "")
+		try:
+			assert isinstance(date_str, str)
+			if len(date_str) > 0:
+				try:
+					dates.append(datetime.strptime(date_str, "%Y-%m-%d"))
+				except ValueError:
+					raise AssertionError
+		except AssertionError:
+			return {
+				"Invalid field": "Invalid \"{}\" field. Dates must be written \
+as \"YYYY-MM-DD\".".format(field)
+			}
+	try:
+		assert len(dates) < 2 or dates[0] <= dates[1]
+	except AssertionError:
+		return {
+			"Invalid field": "Invalid \"End_date\" field. End_date must not be \
+earlier than Start_date."
+		}
+	return None
+
+
 """
 	Check if all fields relevant to post counting are present and are valid
 	entries.
@@ -178,13 +240,28 @@ def analyzer_config_check(config_dic):
 		"Textrank_top_count",
 		"Textrank_top_ratio"
 	}
+	# Optional spaCy batch, doc cache, worker and sketch settings, see
+	# nlpmodels.docs() and postanalyzer.run().
+	analyzer_config_opt_keys = {
+		"Batch_size",
+		"N_process",
+		"Doc_cache_mb",
+		"Workers",
+		"Sketch_factor"
+	}
+	# Optional path of the result cache, see the resultcache module.
+	analyzer_config_path_keys = {
+		"Result_cache_path"
+	}
 	config_str_keys = ["SGrank_norm", "Textrank_norm"]
 	config_int_keys = ["SGrank_top_count", "Textrank_top_count"]
 	config_float_keys = ["SGrank_top_ratio", "Textrank_top_ratio"]
 	valid_norms = ['lemma', 'lower', '']
 	try:
 		assert isinstance(analyzer_config, dict)
-		assert set(analyzer_config.keys()) == analyzer_config_req_keys
+		assert set(analyzer_config.keys()) >= analyzer_config_req_keys
+		assert set(analyzer_config.keys()) <= analyzer_config_req_keys | \
+			analyzer_config_opt_keys | analyzer_config_path_keys
 		assert isinstance(analyzer_config["SGrank_ngram"], list)
 		for key in config_str_keys:
 			assert isinstance(analyzer_config[key], str)
@@ -195,12 +272,35 @@ def analyzer_config_check(config_dic):
 		for key in config_float_keys:
 			assert isinstance(analyzer_config[key], float)
 			assert analyzer_config[key] >= 0.0 and analyzer_config[key] <= 1.0
+		for key in analyzer_config_opt_keys & set(analyzer_config.keys()):
+			assert isinstance(analyzer_config[key], int)
+			assert not isinstance(analyzer_config[key], bool)
+			# A doc cache of 0 MB disables the cache, 0 workers analyze
+			# everything in the main process, and a sketch factor of 0 counts
+			# all terms exactly.
+			if key in {"Doc_cache_mb", "Workers", "Sketch_factor"}:
+				assert analyzer_config[key] >= 0
+			else:
+				assert analyzer_config[key] > 0
+		for key in analyzer_config_path_keys & set(analyzer_config.keys()):
+			assert isinstance(analyzer_config[key], str)
 	except AssertionError:
 		return {
 			"Invalid field": "Invalid \"Analyzer_config\" field. See the README file \
 for more details on what to fill in this field."
 		}
 
+	# Analysis workers are daemonic processes, which cannot start the
+	# processes of nlp.pipe() themselves.
+	try:
+		assert analyzer_config.get("N_process", 1) == 1 or \
+			analyzer_config.get("Workers", 0) <= 1
+	except AssertionError:
+		return {
+			"Invalid field": "Invalid values in \"Analyzer_config\" field. \
+\"N_process\" must be 1 if \"Workers\" is greater than 1."
+		}
+
 	sgrank_ngram = analyzer_config["SGrank_ngram"]
 	try:
 		assert len(sgrank_ngram) > 0
@@ -338,13 +438,107 @@ for more details on what to fill in this field."
 	return None
 
 
+"""
+	Check if the optional fields relevant to the JSON loader are valid entries.
+	The whole "Loader_config" section may be left out, in which case the
+	default settings are used.
+"""
+
+
+def loader_config_check(config_dic):
+	if "Loader_config" not in config_dic.keys():
+		return None
+
+	loader_config = config_dic["Loader_config"]
+	loader_config_keys = {
+		"Streaming",
+		"Workers",
+		"Manifest_dir",
+		"Snapshot_path"
+	}
+	try:
+		assert isinstance(loader_config, dict)
+		assert set(loader_config.keys()) <= loader_config_keys
+		assert isinstance(loader_config.get("Streaming", False), bool)
+		workers = loader_config.get("Workers", 0)
+		assert isinstance(workers, int) and not isinstance(workers, bool)
+		assert workers >= 0
+		assert isinstance(loader_config.get("Manifest_dir", ""), str)
+		assert isinstance(loader_config.get("Snapshot_path", ""), str)
+	except AssertionError:
+		return {
+			"Invalid field": "Invalid \"Loader_config\" field. See the README file \
+for more details on what to fill in this field."
+		}
+
+	return None
+
+
+"""
+	Check the optional "Time_config" field. The timezone must be a valid IANA
+	timezone name, and day parts must be a list of [name, start hour] pairs in
+	ascending order of their start hours.
+"""
+
+
+def time_config_check(config_dic):
+	if "Time_config" not in config_dic.keys():
+		return None
+
+	time_config = config_dic["Time_config"]
+	time_config_keys = {
+		"Timezone",
+		"Granularities",
+		"Day_parts"
+	}
+	granularities = {
+		"year", "month", "day", "hour", "weekday", "iso_week", "day_part"
+	}
+	try:
+		assert isinstance(time_config, dict)
+		assert set(time_config.keys()) <= time_config_keys
+		timezone = time_config.get("Timezone", "")
+		assert isinstance(timezone, str)
+		if len(timezone) > 0:
+			assert ZoneInfo is not None
+			try:
+				ZoneInfo(timezone)
+			except Exception:
+				raise AssertionError
+		granularity_list = time_config.get("Granularities", ["month"])
+		assert isinstance(granularity_list, list)
+		assert set(granularity_list) <= granularities
+		day_parts = time_config.get("Day_parts", [["day", 6], ["night", 18]])
+		assert isinstance(day_parts, list)
+		assert len(day_parts) > 0
+		prev_hour = -1
+		for day_part in day_parts:
+			assert isinstance(day_part, list) and len(day_part) == 2
+			name, start_hour = day_part
+			assert isinstance(name, str) and len(name) > 0
+			assert isinstance(start_hour, int) and not isinstance(start_hour, bool)
+			assert prev_hour < start_hour <= 23
+			prev_hour = start_hour
+		assert len({name for name, _ in day_parts}) == len(day_parts)
+	except AssertionError:
+		return {
+			"Invalid field": "Invalid \"Time_config\" field. See the README file \
+for more details on what to fill in this field."
+		}
+
+	return None
+
+
 CONFIG_CHECK_FUNCTIONS = [
 	basic_check,
 	name_check,
+	date_range_check,
 	post_count_config_check,
 	analyzer_config_check,
 	smakstats_config_check,
 	visualizer_config_check,
+	loader_config_check,
+	time_config_check,
 ]
 
 
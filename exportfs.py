@@ -0,0 +1,124 @@
+import calendar
+import hashlib
+import io
+import os
+import zipfile
+
+"""
+	Export file access module for the Social Media Analytics Kit.
+	Facebook exports come either as a directory (after unzipping every part
+	of the download) or as the original .zip archives. This module lets the
+	JSON loader treat both the same way: a file inside an archive is addressed
+	as "<archive path>!<member name>", and members are read straight out of the
+	archive without extracting anything to disk.
+
+	@author: DeltaSierra4
+"""
+
+MEMBER_SEPARATOR = "!"
+HASH_BLOCK_SIZE = 1 << 20
+
+# Archives are opened once per process. Worker processes must not share an
+# open archive with their parent, since forked processes share file offsets.
+open_archives = {}
+
+
+"""
+	Returns True IFF data_dir is a list of .zip archives rather than a
+	directory.
+"""
+
+
+def is_archive_list(data_dir):
+	return isinstance(data_dir, list)
+
+
+def member_path(archive, name):
+	return archive + MEMBER_SEPARATOR + name
+
+
+"""
+	Split a path into its archive and member name. Returns (None, path) for
+	regular files. The extension of the archive may be in any case, as in
+	config_load.basic_check().
+"""
+
+
+def split_path(path):
+	idx = path.lower().find(".zip" + MEMBER_SEPARATOR)
+	if idx < 0:
+		return None, path
+	return path[:idx + 4], path[idx + 5:]
+
+
+def get_archive(archive):
+	key = (os.getpid(), archive)
+	if key not in open_archives:
+		open_archives[key] = zipfile.ZipFile(archive)
+	return open_archives[key]
+
+
+"""
+	List the members of every archive that sit below a directory named subdir,
+	in archive order, using only the central directory of each archive.
+	Yields (path, parts) tuples, where parts is the list of path components
+	that follow subdir, e.g. ["inbox", "johndoe_abc123", "message_1.json"]
+	for the "messages" subdirectory.
+"""
+
+
+def list_members(archives, subdir):
+	for archive in archives:
+		for info in get_archive(archive).infolist():
+			if info.is_dir():
+				continue
+			parts = info.filename.split("/")
+			if subdir in parts[:-1]:
+				idx = parts.index(subdir)
+				yield member_path(archive, info.filename), parts[idx + 1:]
+
+
+"""
+	Open a regular file or an archive member for reading as text.
+"""
+
+
+def open_file(path):
+	archive, name = split_path(path)
+	if archive is None:
+		return open(path, 'r')
+	return io.TextIOWrapper(get_archive(archive).open(name), encoding="utf-8")
+
+
+"""
+	Returns the (size, modification time in ns) of a regular file or an
+	archive member.
+"""
+
+
+def file_stat(path):
+	archive, name = split_path(path)
+	if archive is None:
+		st = os.stat(path)
+		return st.st_size, st.st_mtime_ns
+	info = get_archive(archive).getinfo(name)
+	mtime = calendar.timegm(info.date_time + (0, 0, 0))
+	return info.file_size, mtime * 1000000000
+
+
+"""
+	Compute a content hash of a regular file or an archive member. Archive
+	members use the CRC-32 stored in the central directory, so they do not
+	need to be decompressed.
+"""
+
+
+def file_hash(path):
+	archive, name = split_path(path)
+	if archive is not None:
+		return "crc32:{:08x}".format(get_archive(archive).getinfo(name).CRC)
+	sha = hashlib.sha1()
+	with open(path, "rb") as f:
+		for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+			sha.update(block)
+	return "sha1:" + sha.hexdigest()
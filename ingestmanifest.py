@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import os.path as op
+import exportfs
+
+"""
+	Ingestion manifest module for the Social Media Analytics Kit.
+	Keeps track of every export file consumed by the JSON loader, along with
+	its size, modification time, content hash, and the compact records parsed
+	out of it. Files may be regular files or members of .zip archives (see the
+	exportfs module). On the next run, only new or changed files are parsed
+	again, and the cached records are reused for everything else.
+
+	The manifest lives in its own directory:
+
+	<manifest dir>/manifest.json: Metadata for every file.
+	<manifest dir>/records/<hash of path>.json: Parsed records for each file.
+
+	All functions accept None in place of a manifest, in which case they do
+	nothing, so that callers do not need to check whether one is in use.
+
+	@author: DeltaSierra4
+"""
+
+MANIFEST_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+RECORDS_DIR = "records"
+
+
+"""
+	Open the manifest stored in manifest_dir, creating the directory if needed.
+
+	settings is a JSON-serializable dictionary of every setting that affects
+	the parsed records (e.g. username and target names). If the settings differ
+	from the ones the manifest was written with, all cached records are
+	discarded.
+"""
+
+
+def open_manifest(manifest_dir, settings):
+	os.makedirs(op.join(manifest_dir, RECORDS_DIR), exist_ok=True)
+	manifest = {
+		"dir": manifest_dir,
+		"settings": settings,
+		"files": {},
+		"hashes": {},
+	}
+	manifest_path = op.join(manifest_dir, MANIFEST_FILE)
+	if op.exists(manifest_path):
+		with open(manifest_path, "r") as f:
+			saved = json.load(f)
+		same_version = saved.get("version") == MANIFEST_VERSION
+		if same_version and saved.get("settings") == settings:
+			manifest["files"] = saved.get("files", {})
+	return manifest
+
+
+"""
+	Write the manifest back to its directory and delete record files that are
+	no longer referenced by any entry.
+"""
+
+
+def save_manifest(manifest):
+	if manifest is None:
+		return
+	manifest_dir = manifest["dir"]
+	manifest_path = op.join(manifest_dir, MANIFEST_FILE)
+	tmp_path = manifest_path + ".tmp"
+	with open(tmp_path, "w") as f:
+		json.dump({
+			"version": MANIFEST_VERSION,
+			"settings": manifest["settings"],
+			"files": manifest["files"],
+		}, f, indent=1, sort_keys=True)
+	os.replace(tmp_path, manifest_path)
+
+	referenced = {entry["records"] for entry in manifest["files"].values()}
+	records_dir = op.join(manifest_dir, RECORDS_DIR)
+	for filename in os.listdir(records_dir):
+		if filename not in referenced:
+			os.remove(op.join(records_dir, filename))
+
+
+"""
+	Look up the cached records of a file. Returns a (cached, records) tuple,
+	where cached is True IFF the file is unchanged since its records were
+	stored.
+
+	Size and modification time are compared first. If either differs, the
+	content hash decides, so that files that were merely touched or copied are
+	not parsed again.
+"""
+
+
+def lookup(manifest, path):
+	if manifest is None:
+		return False, None
+	entry = manifest["files"].get(path)
+	if entry is None:
+		return False, None
+	size, mtime = exportfs.file_stat(path)
+	if size != entry["size"] or mtime != entry["mtime"]:
+		content_hash = exportfs.file_hash(path)
+		manifest["hashes"][path] = content_hash
+		if content_hash != entry["hash"]:
+			return False, None
+		entry["size"] = size
+		entry["mtime"] = mtime
+	records_path = op.join(manifest["dir"], RECORDS_DIR, entry["records"])
+	if not op.exists(records_path):
+		return False, None
+	with open(records_path, "r") as f:
+		return True, json.load(f)
+
+
+"""
+	Store the freshly parsed records of a file in the manifest. category is
+	the kind of export file (e.g. "posts"), which is used by prune().
+"""
+
+
+def store(manifest, path, records, category):
+	if manifest is None:
+		return
+	size, mtime = exportfs.file_stat(path)
+	content_hash = manifest["hashes"].pop(path, None)
+	if content_hash is None:
+		content_hash = exportfs.file_hash(path)
+	records_name = hashlib.sha1(path.encode("utf-8")).hexdigest() + ".json"
+	with open(op.join(manifest["dir"], RECORDS_DIR, records_name), "w") as f:
+		json.dump(records, f)
+	manifest["files"][path] = {
+		"category": category,
+		"size": size,
+		"mtime": mtime,
+		"hash": content_hash,
+		"records": records_name,
+	}
+
+
+"""
+	Drop the entries of the given category whose files are not in paths, i.e.
+	files that have been deleted from the export (or whose archive is no
+	longer listed) since the last run. Their record files are removed when the
+	manifest is saved.
+"""
+
+
+def prune(manifest, category, paths):
+	if manifest is None:
+		return
+	current = set(paths)
+	for path, entry in list(manifest["files"].items()):
+		if entry["category"] == category and path not in current:
+			del manifest["files"][path]
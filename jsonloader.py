@@ -1,9 +1,16 @@
-from collections import defaultdict
-from itertools import chain
+import multiprocessing
 import os
 import os.path as op
 import json
+import re
+import time
+import exportfs
+import ingestmanifest
+import jsonstream
+import posttable
 import strprocutil
+import titleclassifier
+from functools import partial
 
 """
 	JSON loader module for the Social media analytics tool.
@@ -12,64 +19,250 @@ import strprocutil
 	@author: DeltaSierra4
 """
 
+# Message timestamps as they appear in the raw text of a message_N.json.
+# The trailing non-digit makes sure that a number cut off at the end of a
+# chunk is not matched.
+TIMESTAMP_MS_PATTERN = re.compile(r'"timestamp_ms":\s*([0-9]+)[^0-9]')
+SPAN_CHUNK_SIZE = 1 << 20
+# Kept from the end of every chunk so that a match cut in two by the chunk
+# boundary is found in the next one.
+SPAN_OVERLAP = 64
+
 """
 	load_json() from directory that contains json files with your comments
 	and posts. This is a wrapper method to load individual json files by their
 	specific categories: "comments_and_reactions", "messages", and "posts"
+
+	loader_config is the optional "Loader_config" section of the config file.
+	If "Streaming" is set, comments.json and message_N.json are read
+	incrementally so that only the rows we keep are held in memory. "Workers"
+	sets the number of processes used to load Messenger threads.
+
+	manifest is an optional ingestion manifest (see the ingestmanifest module).
+	Files whose parsed records are cached in the manifest are not parsed again.
+
+	The loaded rows are added to table (see the posttable module), which is
+	created if not given. Returns the table.
+
+	ts_range is an optional [start, end) range of timestamps as returned by
+	tsconverter.date_range(). Rows outside of it are dropped as soon as their
+	timestamp is read, before any of their strings are converted.
 """
 
 
-def load_json(data_dir, subdir, username, target_names):
-	component_dir = op.join(data_dir, subdir)
+def load_json(
+	data_dir, subdir, username, target_names, loader_config=None, manifest=None,
+	table=None, ts_range=None
+):
+	if loader_config is None:
+		loader_config = {}
+	if table is None:
+		table = posttable.new_table()
+	streaming = loader_config.get("Streaming", False)
+	workers = loader_config.get("Workers", 0)
+	paths = find_export_files(data_dir, subdir)
 	if subdir == "comments_and_reactions":
-		component_dir = op.join(component_dir, "comments.json")
-		return load_comment_json(component_dir, username, target_names)
+		return load_comment_json(
+			paths, username, target_names, table, streaming, manifest, ts_range
+		)
 	elif subdir == "posts":
 		return load_post_json(
-			os.listdir(component_dir),
-			component_dir, username, target_names
+			paths, username, target_names, table, manifest, ts_range
 		)
 	else:
-		# Lots of useless subdirectories here. We are only interested in the
-		# inbox subdirectory.
-		component_dir = op.join(component_dir, "inbox")
 		return load_message_json(
-			os.listdir(component_dir),
-			component_dir, username, target_names
+			paths, username, target_names, table, streaming, workers, manifest,
+			ts_range
 		)
 
 
 """
-	load_comment_json() from sub directory that contains comments.
-	Return dictionary is split into a dictionary of comments outside of groups
-	and a dictionary of comments within a group. Each dictionary is further
-	separated into comments on my own post, comments on another person's or
-	page's post, and any replies. The comments for other people and replies
-	are further separated by names of people that the user is interacting with.
+	Find the json files of a category in the export. data_dir is either the
+	directory containing the unzipped export, or a list of the export's .zip
+	archives, in which case the members are listed in archive order so that
+	they are read sequentially.
+
+	comments_and_reactions: comments.json
+	posts: your_posts_N.json (i.e. Ignores json files containing notes)
+	messages: inbox/<thread>/message_N.json (Lots of useless subdirectories
+	here. We are only interested in the inbox subdirectory.)
 """
 
 
-def load_comment_json(comment_dir, username, target_names):
-	comment_dic = {
-		"NonGroup": {
-			"Own": [],
-			"Other": defaultdict(lambda: []),
-			"Replies": defaultdict(lambda: []),
-		},
-		"Group": {
-			"Own": [],
-			"Other": defaultdict(lambda: []),
-			"Replies": defaultdict(lambda: []),
-		},
-	}
-	with open(comment_dir, 'r') as f:
-		data = json.load(f)["comments_v2"]
+def find_export_files(data_dir, subdir):
+	if exportfs.is_archive_list(data_dir):
+		return [
+			path for path, parts in exportfs.list_members(data_dir, subdir)
+			if export_file_match(subdir, parts)
+		]
+
+	component_dir = op.join(data_dir, subdir)
+	if subdir == "comments_and_reactions":
+		return [op.join(component_dir, "comments.json")]
+	elif subdir == "posts":
+		return [
+			op.join(component_dir, filename)
+			for filename in os.listdir(component_dir)
+			if export_file_match(subdir, [filename])
+		]
+	mess_dir = op.join(component_dir, "inbox")
+	valid_json = []
+	for filename in os.listdir(mess_dir):
+		individual_dir = op.join(mess_dir, filename)
+		for file in sorted(os.listdir(individual_dir)):
+			if export_file_match(subdir, ["inbox", filename, file]):
+				valid_json.append(op.join(individual_dir, file))
+	return valid_json
+
+
+"""
+	Checks if a file is one of the json files of a category, given the list of
+	path components that follow the category's directory.
+"""
+
+
+def export_file_match(subdir, parts):
+	if subdir == "comments_and_reactions":
+		return parts == ["comments.json"]
+	elif subdir == "posts":
+		return len(parts) == 1 and "your_posts" in parts[0]
+	if len(parts) != 3 or parts[0] != "inbox" or "message" not in parts[2]:
+		return False
+	return op.splitext(parts[2])[1] == ".json"
+
+
+"""
+	Obtain the parsed records of every file in paths, in the same order.
+
+	Every file is parsed by parse_func(path, *parse_args), which returns a list
+	of compact, JSON-serializable records. Files with up-to-date records in the
+	manifest are skipped, and the records of all other files are stored in the
+	manifest under the given category after parsing. If workers is greater
+	than 1, the files are parsed in a pool of that many worker processes.
+"""
+
+
+def load_files(
+	paths, parse_func, parse_args, category, workers=0, manifest=None
+):
+	file_records = {}
+	pending = []
+	for path in paths:
+		cached, records = ingestmanifest.lookup(manifest, path)
+		if cached:
+			file_records[path] = records
+		else:
+			pending.append(path)
+
+	if workers > 1 and len(pending) > 1:
+		parsed = parse_files_parallel(pending, parse_func, parse_args, workers)
+	else:
+		parsed = parse_files((parse_func, pending, parse_args))
+	for path, records in zip(pending, parsed):
+		ingestmanifest.store(manifest, path, records, category)
+		file_records[path] = records
+	ingestmanifest.prune(manifest, category, paths)
+	if manifest is not None:
+		print("Reused cached records for {} of {} files".format(
+			len(paths) - len(pending), len(paths)
+		))
+	return [file_records[path] for path in paths]
+
+
+"""
+	Worker function that parses a batch of files. Takes a single tuple argument
+	so that it can be handed to a process pool.
+"""
+
+
+def parse_files(args):
+	parse_func, paths, parse_args = args
+	return [parse_func(path, *parse_args) for path in paths]
+
+
+"""
+	Split the files across a pool of worker processes and parse them with
+	parse_files(). Results are returned in the same order as the files, so the
+	merged dictionaries do not depend on the number of workers. Pool startup
+	and total parse times are printed so that the number of workers can be
+	tuned.
+"""
+
+
+def parse_files_parallel(paths, parse_func, parse_args, workers):
+	# Hand out several small batches per worker so that a few huge files do
+	# not leave the other workers idle.
+	batch_count = min(len(paths), workers * 4)
+	batches = [paths[i::batch_count] for i in range(batch_count)]
+	start = time.perf_counter()
+	with multiprocessing.Pool(workers) as pool:
+		startup = time.perf_counter() - start
+		results = pool.map(parse_files, [
+			(parse_func, batch, parse_args) for batch in batches
+		])
+	print(
+		"Parsed {} files with {} workers in {:.2f}s "
+		"(pool startup {:.2f}s)".format(
+			len(paths), workers, time.perf_counter() - start, startup
+		)
+	)
+	# Undo the round-robin split to restore the original file order.
+	ordered = [None] * len(paths)
+	for i, batch_results in enumerate(results):
+		ordered[i::batch_count] = batch_results
+	return ordered
+
+
+"""
+	load_comment_json() from the list of comments.json files into table.
+	Each comment is stored with its group ("NonGroup" or "Group"), its kind
+	(comment on my own post, comment on another person's or page's post, or
+	reply), and the name of the person that the user is interacting with.
+
+	streaming == True IFF the rows of comments_v2 are to be decoded and
+	filtered one at a time instead of loading the whole file at once.
+"""
+
+
+def load_comment_json(
+	paths, username, target_names, table=None, streaming=False, manifest=None,
+	ts_range=None
+):
+	if table is None:
+		table = posttable.new_table()
+	file_records = load_files(
+		paths, parse_comment_file, (username, target_names, streaming, ts_range),
+		"comments", manifest=manifest
+	)
+	for records in file_records:
+		posttable.add_comments(table, records, username)
+	return table
+
+
+"""
+	Parse comments.json into a list of compact (group, type, name, timestamp,
+	comment, group name) records, where group is either "NonGroup" or "Group",
+	and type and name are as returned by load_comment_row().
+"""
+
+
+def parse_comment_file(
+	comment_dir, username, target_names, streaming, ts_range=None
+):
+	records = []
+	with exportfs.open_file(comment_dir) as f:
+		if streaming:
+			data = jsonstream.iter_array(f, "comments_v2")
+		else:
+			data = json.load(f)["comments_v2"]
 		for data_row in data:
 			if invalid_comment(data_row):
 				continue
 			ts = data_row["timestamp"]
+			if not in_date_range(ts, ts_range):
+				continue
 			comment_list = data_row["data"]
-			title = strprocutil.convert_str(data_row["title"])[:-1]
+			title = strprocutil.convert_name(data_row["title"])[:-1]
 
 			# To ensure that all title data is processed correctly, we only
 			# process comments that are obviously made by the user.
@@ -88,203 +281,213 @@ def load_comment_json(comment_dir, username, target_names):
 				if c_type == "":
 					continue
 				comment_group = comment_data.get("group", "")
-				if comment_group:
-					c_dic["Group name"] = comment_group
-					if o_name:
-						comment_dic["Group"][c_type][o_name].append(c_dic)
-					else:
-						comment_dic["Group"][c_type].append(c_dic)
-				else:
-					if o_name:
-						comment_dic["NonGroup"][c_type][o_name].append(c_dic)
-					else:
-						comment_dic["NonGroup"][c_type].append(c_dic)
-	return comment_dic
+				g = "Group" if comment_group else "NonGroup"
+				records.append(
+					(g, c_type, o_name, c_dic["ts"], c_dic["post"], comment_group)
+				)
+	return records
 
 
 """
-	load_post_json() from sub directory that contains posts.
+	load_post_json() from the list of your_posts_N.json files into table.
 
-	Takes in a list of all json files in the posts directory and selectively
-	parses through json files that contain posts only (i.e. Ignores json files
-	containing notes).
-
-	Return dictionary is split into comment on my own post, post on another
-	person's wall, and posts on a group or page. Uncategorized posts go into
-	a "Misc_post" category.
+	Each post is stored under the person, group, or page whose wall it was
+	made on. Uncategorized posts go under "Misc_post".
 """
 
 
-def load_post_json(post_dir_list, post_dir, username, target_names):
-	valid_json = []
-	for filename in post_dir_list:
-		if "your_posts" in filename:
-			valid_json.append(filename)
-
-	post_dic = defaultdict(lambda: [])
-	for filename in valid_json:
-		json_file = op.join(post_dir, filename)
-		with open(json_file, 'r') as f:
-			datarows = json.load(f)
-			for item in datarows:
-				if invalid_row(item):
-					continue
-				if "title" not in item:
-					# Occasionally, posts without titles indicating where they
-					# were posted come up. We classify them as miscellaneous
-					# posts.
-					post_dic["Misc_post"] = list(
-						chain(post_dic["Misc_post"], load_post_row(item))
-					)
-				else:
-					# If title data is found, use it to extract whose wall was
-					# the post made on. Clip off the last period from the title
-					# before using it.
-					title = strprocutil.convert_str(item["title"])[:-1]
-
-					# To ensure that all title data is processed correctly, we only
-					# process comments that are obviously made by the user.
-					# This is why the user must put in their correct username.
-					if username not in title:
-						continue
+def load_post_json(
+	paths, username, target_names, table=None, manifest=None, ts_range=None
+):
+	if table is None:
+		table = posttable.new_table()
+	file_records = load_files(
+		paths, parse_post_file, (username, target_names, ts_range), "posts",
+		manifest=manifest
+	)
+	for records in file_records:
+		posttable.add_posts(table, records)
+	return table
 
-					if title[-8:] == "timeline":
-						# Post was made on a friend's wall
-						name = name_extractor(title, "fr", username)
-						if name == "":
-							continue
-						elif target_names is not None and name not in target_names:
-							continue
-						post_dic[name] = list(chain(post_dic[name], load_post_row(item)))
-					elif own_post(title, username):
-						# Post was made on your own wall
-						post_dic[username] = list(chain(post_dic[username], load_post_row(item)))
-					elif group_page_event_post(title, username):
-						# Post was made on a group, page, or event
-						name = name_extractor(title, "gr", username)
-						if name == "":
-							continue
-						post_dic[name] = list(chain(post_dic[name], load_post_row(item)))
-					else:
-						# Treat these as miscellaneous posts
-						# if title == "Vincent Yang created a private event for KanColle U.S.A":
-						# if title == "Vincent Yang was attending Anime Expo 2018 - Doki Doki Literature Club Gathering":
-						# if title == "Vincent Yang was 🎉 celebrating friendship" or title == "Vincent Yang  recommends 신림마장" or title == "Vincent Yang shared an album: Penguin Base Doggos to the group: KanColle U.S.A." or title == "Vincent Yang contributed to the album: Fall 204 Event Clear in KanColle U.S.A":
-						# 	print(item)
-						# print(title)
-						post_dic["Misc_post"] = list(
-							chain(post_dic["Misc_post"], load_post_row(item))
-						)
-	return post_dic
-
-
-"""
-	load_message_json() from sub directory that contains posts.
-
-	Takes in a list of all json files in the posts directory and selectively
-	parses through json files that contain posts only (i.e. Ignores photos,
-	gifs, or videos).
-
-	Return dictionary is split into single DM or group DM, further split
-	by individual associated with the messaging.
-"""
-
-
-def load_message_json(mess_dir_list, mess_dir, username, target_names):
-	valid_json = []
-	for filename in mess_dir_list:
-		individual_dir = op.join(mess_dir, filename)
-		for file in os.listdir(individual_dir):
-			if "message" in file and op.splitext(file)[1] == ".json":
-				valid_json.append(op.join(individual_dir, file))
 
-	mess_dic = {
-		"NonGroup": defaultdict(lambda: []),
-		"Group": defaultdict(lambda: []),
-	}
-	for filename in valid_json:
-		with open(filename, 'r') as f:
-			data = json.load(f)
-			if invalid_message_json(data):
+"""
+	Parse a single your_posts_N.json into a list of compact (name, timestamp,
+	post, type) records, where name is the person, group, page, or event the
+	post was made for, or "Misc_post" for uncategorized posts.
+"""
+
+
+def parse_post_file(json_file, username, target_names, ts_range=None):
+	records = []
+	with exportfs.open_file(json_file) as f:
+		datarows = json.load(f)
+	for item in datarows:
+		posts = decode_post_record(item, ts_range)
+		if len(posts) == 0:
+			continue
+		if "title" not in item:
+			# Occasionally, posts without titles indicating where they
+			# were posted come up. We classify them as miscellaneous
+			# posts.
+			name = "Misc_post"
+		else:
+			# If title data is found, use it to extract whose wall was
+			# the post made on. Clip off the last period from the title
+			# before using it.
+			title = strprocutil.convert_name(item["title"])[:-1]
+
+			# To ensure that all title data is processed correctly, we only
+			# process comments that are obviously made by the user.
+			# This is why the user must put in their correct username.
+			if username not in title:
 				continue
-			participants = data["participants"]
-			messages = data["messages"]
-			name = strprocutil.convert_str(data["title"])
-			messlist = load_message_row(messages, username)
-			if len(messlist) == 0:
+
+			category, name = titleclassifier.classify_post_title(title, username)
+			if category == "":
 				continue
-			if len(participants) <= 2:
-				# Individual message to either oneself or a friend.
-				if len(participants) == 2:
-					# Message to another friend. Check if we want to include this
-					# message if we have specific names in target_names
-					if target_names is not None and name not in target_names:
-						continue
-				mess_dic["NonGroup"][name] = messlist
-			else:
-				# Group message. Check if all users in the group are in the
-				# target_names. We do not want to include group messages that
-				# include someone not included in the target_names.
-				if target_names is not None:
-					skip = False
-					for participant in participants:
-						if participant["name"] not in target_names:
-							skip = True
-							break
-					if skip:
-						continue
-				mess_dic["Group"][name] = messlist
-	return mess_dic
+			elif category == "Friend":
+				# Post was made on a friend's wall
+				if target_names is not None and name not in target_names:
+					continue
+			# Otherwise the post was made on your own wall, on a group,
+			# page, or event, or it is treated as a miscellaneous post.
+		for post in posts:
+			records.append((name, post["ts"], post["post"], post["type"]))
+	return records
 
 
 """
-	Checks if a comment contains all relevant information (i.e. timestamp,
-	content, and title). Returns True if either is missing.
+	load_message_json() from the list of message_N.json files into table.
+
+	Each message is stored as either a single DM or a group DM, under the
+	title of its thread.
+
+	streaming == True IFF the messages of each message_N.json are to be decoded
+	and filtered one at a time instead of loading the whole file at once.
+
+	If workers is greater than 1, the message files are loaded in a pool of
+	that many worker processes. Messages from all message_N.json files of a
+	thread are combined under the thread's name.
 """
 
 
-def invalid_comment(data_row):
-	ts = data_row.get("timestamp", -1)
-	title = data_row.get("title", "").strip()
-	data_list = data_row.get("data", [])
-	# A creative way to check if all of them are present and make sure that
-	# they are not degenerate data such as empty strings.
-	return (ts * len(title) * len(data_list) <= 0)
+def load_message_json(
+	paths, username, target_names, table=None, streaming=False, workers=0,
+	manifest=None, ts_range=None
+):
+	if table is None:
+		table = posttable.new_table()
+	file_records = load_files(
+		paths, parse_message_file,
+		(username, target_names, streaming, ts_range),
+		"messages", workers, manifest
+	)
+	merge_start = time.perf_counter()
+	for records in file_records:
+		posttable.add_messages(table, records)
+	if workers > 1:
+		print("Merged message files in {:.2f}s".format(
+			time.perf_counter() - merge_start
+		))
+	return table
 
 
 """
-	Checks if a data_row contains all relevant information (i.e. timestamp and
-	content). Returns True if either is missing.
+	Parse a single message_N.json into a list of compact (group, name,
+	timestamp, message) records, where group is either "NonGroup" or "Group" and
+	name is the title of the thread. Returns an empty list if the file holds
+	nothing of interest.
+
+	If ts_range is given, the file is first scanned for the span of its
+	message timestamps, and skipped without being decoded if the span lies
+	outside of ts_range.
+"""
+
+
+def parse_message_file(
+	filename, username, target_names, streaming, ts_range=None
+):
+	if streaming:
+		if ts_range is not None:
+			with exportfs.open_file(filename) as f:
+				span = timestamp_span(iter(partial(f.read, SPAN_CHUNK_SIZE), ""))
+			if not span_in_range(span, ts_range):
+				return []
+		with exportfs.open_file(filename) as f:
+			data = stream_message_json(f, username, ts_range)
+	else:
+		with exportfs.open_file(filename) as f:
+			text = f.read()
+		if ts_range is not None and \
+			not span_in_range(timestamp_span([text]), ts_range):
+			return []
+		data = json.loads(text)
+	if invalid_message_json(data):
+		return []
+	participants = data["participants"]
+	name = strprocutil.convert_name(data["title"])
+	if streaming:
+		messlist = data["messages"]
+	else:
+		messlist = load_message_row(data["messages"], username, ts_range)
+	if len(messlist) == 0:
+		return []
+	if len(participants) <= 2:
+		# Individual message to either oneself or a friend.
+		if len(participants) == 2:
+			# Message to another friend. Check if we want to include this
+			# message if we have specific names in target_names
+			if target_names is not None and name not in target_names:
+				return []
+		g = "NonGroup"
+	else:
+		# Group message. Check if all users in the group are in the
+		# target_names. We do not want to include group messages that
+		# include someone not included in the target_names.
+		if target_names is not None:
+			for participant in participants:
+				if participant["name"] not in target_names:
+					return []
+		g = "Group"
+	return [(g, name, m["ts"], m["post"]) for m in messlist]
+
 
-	Note: A post can either contain a "post" if it is a post on a timeline, or
-	it can be a "description" of a "media" if it's a photo/video post. The
-	load_post_row() will prioritize finding "post" instances, but if none are
-	found, it'll look for "description" instances. The invalid_row() check
-	only checks if either are present.
+"""
+	Incrementally read a message_N.json file. Every entry of the "messages"
+	array goes through load_message_entry() as soon as it is decoded, and only
+	the messages that pass are kept. All other members are returned as they are,
+	so the result has the same shape as a json.load() of the file with the
+	"messages" list already filtered.
+"""
+
+
+def stream_message_json(f, username, ts_range=None):
+	data = {}
+	messlist = []
+	for event, key, value in jsonstream.iter_members(f, ("messages",)):
+		if event == "item":
+			message = load_message_entry(value, username, ts_range)
+			if message is not None:
+				messlist.append(message)
+		else:
+			data[key] = value
+	data["messages"] = messlist
+	return data
+
+
+"""
+	Checks if a comment contains all relevant information (i.e. timestamp,
+	content, and title). Returns True if either is missing.
 """
 
 
-def invalid_row(data_row):
+def invalid_comment(data_row):
 	ts = data_row.get("timestamp", -1)
-	if ts <= 0:
-		return True
+	title = data_row.get("title", "").strip()
 	data_list = data_row.get("data", [])
-	post_found = False
-	for data in data_list:
-		if "post" in data and len(data.get("post", "").strip()) > 0:
-			post_found = True
-			break
-	if not post_found:
-		attachment_list = data_row.get("attachments", [])
-		for data_dic in attachment_list:
-			data_list = data_dic.get("data", [])
-			for data in data_list:
-				if "media" in data and len(data.get("description", "").strip()) > 0:
-					media_data = data["media"]
-					if "description" in media_data:
-						post_found = True
-						break
-	return not post_found
+	# A creative way to check if all of them are present and make sure that
+	# they are not degenerate data such as empty strings.
+	return (ts * len(title) * len(data_list) <= 0)
 
 
 """
@@ -319,70 +522,89 @@ def invalid_message_json(data_row):
 
 
 def load_comment_row(ts, comment, title, username, target_names):
+	# Extract information out of the title before converting the comment, so
+	# that comments we are not interested in are dropped early.
+	comment_nature, comment_target = titleclassifier.classify_comment_title(
+		title, username
+	)
+	if comment_nature == "":
+		return "", "", {}
+	elif comment_nature != "Own":
+		if target_names is not None and comment_target not in target_names:
+			return "", "", {}
 	c_dic = {
 		"ts": ts,
 		"post": strprocutil.convert_str(comment),
 	}
-	# Next step is to extract information out of the title. Default case is
-	# assuming it as a comment to another person's post.
-	comment_nature = "Other"
-	comment_target = ""
-	title_words = title.split()
-	name_w = len(username.split())
-	if "replied" in title_words:
-		comment_nature = "Replies"
-	elif title_words[name_w] == "commented" and title_words[name_w + 3] == "own":
-		comment_nature = "Own"
-	if comment_nature != "Own":
-		comment_target = name_extractor(title, "co", username)
-		if len(comment_target) == 0:
-			return "", "", {}
-		elif target_names is not None and comment_target not in target_names:
-			return "", "", {}
 	return comment_nature, comment_target, c_dic
 
 
 """
-	load_post_row() from json file that contains posts.
+	decode_post_record() from json file that contains posts.
 
-	Takes in the raw data row taken from a json file and preprocesses it to
-	utf-encoded strings, then returns a list of dictionaries containing the
-	timestamp and content of the post.
+	Takes in the raw data row taken from a json file, checks that it contains
+	all relevant information (i.e. timestamp and content), and preprocesses it
+	to utf-encoded strings. Returns a list of dictionaries containing the
+	timestamp and content of the post, or an empty list if the row is missing
+	either. Validation and extraction share a single walk over "data" and
+	"attachments", and strings are only converted for valid rows.
 
 	Note: A post can either contain a "post" if it is a post on a timeline, or
-	it can be a "description" of a "media" if it's a photo/video post. The
-	load_post_row() will prioritize finding "post" instances, but if none are
-	found, it'll look for "description" instances. The invalid_row() check
-	ensures that all data_row are valid entries containing either.
+	it can be a "description" of a "media" if it's a photo/video post. Rows
+	count as valid if either is present, but "post" instances come first in the
+	returned list. Photo posts are only added if they are not duplicates of a
+	post that was already added.
+
+	Rows whose timestamp is outside of ts_range are dropped before anything
+	else is looked at, as are photos whose own timestamp is.
 """
 
 
-def load_post_row(data_row):
-	posts = []
-	data_list = data_row.get("data", [])
-	for data in data_list:
+def decode_post_record(data_row, ts_range=None):
+	ts = data_row.get("timestamp", -1)
+	if ts <= 0 or not in_date_range(ts, ts_range):
+		return []
+	post_found = False
+	raw_posts = []
+	for data in data_row.get("data", []):
 		if "post" in data:
-			posts.append({
-				"ts": data_row["timestamp"],
-				"post": strprocutil.convert_str(data["post"]),
-				"type": "Regular",
-			})
-	# Here we look for photo posts, but we'll only add photo posts that are
-	# not duplicates of the original post.
-	attachment_list = data_row.get("attachments", [])
-	for data_dic in attachment_list:
-		data_list = data_dic.get("data", [])
-		for data in data_list:
+			raw_posts.append(data["post"])
+			if len(data["post"].strip()) > 0:
+				post_found = True
+	raw_photos = []
+	for data_dic in data_row.get("attachments", []):
+		for data in data_dic.get("data", []):
 			if "media" in data:
 				media_data = data["media"]
 				if "description" in media_data:
-					photo_post = strprocutil.convert_str(media_data["description"])
-					if photo_post not in [item["post"] for item in posts]:
-						posts.append({
-							"ts": media_data.get("creation_timestamp", data_row["timestamp"]),
-							"post": photo_post,
-							"type": "Photo",
-						})
+					photo_ts = media_data.get("creation_timestamp", ts)
+					if not in_date_range(photo_ts, ts_range):
+						continue
+					raw_photos.append((photo_ts, media_data["description"]))
+					if len(data.get("description", "").strip()) > 0:
+						post_found = True
+	if not post_found:
+		return []
+
+	posts = []
+	seen = set()
+	for raw_post in raw_posts:
+		post = strprocutil.convert_str(raw_post)
+		seen.add(post)
+		posts.append({
+			"ts": ts,
+			"post": post,
+			"type": "Regular",
+		})
+	for photo_ts, raw_photo in raw_photos:
+		photo_post = strprocutil.convert_str(raw_photo)
+		if photo_post not in seen:
+			seen.add(photo_post)
+			posts.append({
+				"ts": photo_ts,
+				"post": photo_post,
+				"type": "Photo",
+			})
 	return posts
 
 
@@ -391,227 +613,141 @@ def load_post_row(data_row):
 
 	Takes in the raw data row taken from a json file and preprocesses it to
 	utf-encoded strings, then returns a list containing the timestamp and
-	content of the post.
+	content of the post. The content of all messages sent by the user is
+	converted in a single batch.
 
 	NB! message.json files store timestamp in units of milliseconds. This
 	must be corrected to units of seconds, or timestamp conversion will fail.
 """
 
 
-def load_message_row(message_list, username):
-	my_messages = []
+def load_message_row(message_list, username, ts_range=None):
+	timestamps = []
+	raw_messages = []
 	for data in message_list:
-		sender = strprocutil.convert_str(data.get("sender_name", "")).strip()
-		message = strprocutil.convert_str(data.get("content", "")).strip()
-		mtype = data.get("type", "").strip()
-		ts = int(data.get("timestamp_ms", -1) / 1000)  # conversion to seconds
-		# A creative way to check if all of them are present and make sure that
-		# they are not degenerate data such as empty strings.
-		if len(sender) * len(message) * len(mtype) * ts <= 0:
-			continue
-		# Only looking for actual messages, not logs of adding/removing people
-		# in group chats. Also check if they're from username only.
-		if (mtype != "Generic" and mtype != "Share") or sender != username:
-			continue
-		# Last but not least, ignore any messages that say something like
-		# "You set your nickname to xxx."
-		if len(message) >= 24 and message[:24] == "You set your nickname to":
-			continue
-		my_messages.append({
-			"ts": ts,
-			"post": message,
-		})
+		ts = own_message_ts(data, username, ts_range)
+		if ts is not None:
+			timestamps.append(ts)
+			raw_messages.append(data.get("content", ""))
+	my_messages = []
+	messages = strprocutil.convert_strs(raw_messages)
+	for ts, message in zip(timestamps, messages):
+		if legit_message(message):
+			my_messages.append({
+				"ts": ts,
+				"post": message,
+			})
 	return my_messages
 
 
 """
-	Helper method that checks if a post was made on one's own wall.
-"""
-
-
-def own_post(title, username):
-	title_words = title.split()
-	namewc = len(username.split())
-	# Ignore all group/event page posts
-	if not ("group:" in title_words or "event:" in title_words):
-		# First format: John Doe updated his status
-		if title_words[-1] == "status" and title_words[-3] == "updated":
-			return True
-		# Second format: John Doe is feeling emotion
-		if title_words[namewc] == "is" and title_words[namewc + 1] == "feeling":
-				return True
-		if title_words[-2] == "feeling" and title_words[-3] == "is":
-			return True
-		# Third format: John Doe shared a memory
-		if title_words[-1] == "memory" and title_words[-2] == "a":
-			return True
-		# Fourth format: John Doe uploaded a new photo/video(s)
-		if title_words[-2] == "new":
-			if "photo" in title_words[-1] or "video" in title_words[-1]:
-				return True
-		# Fifth format: John Doe answered a question
-		if title_words[-1] == "question" and title_words[-3] == "answered":
-			return True
-		# Sixth format: John Doe was with Mary Jane [and x others] [at y] [in z]
-		# A similar format can be the following:
-		# John Doe was celebrating friendship with Mary Jane
-		# John Doe was looking for recommendations
-		# John Doe was attending Storm Area 69
-		# John Doe was live
-		if title_words[namewc] == "was":
-			tag_another = ["with", "at", "in", "live"]
-			activities = ["celebrating", "looking", "attending", "eating"]
-			if title_words[namewc + 1] in tag_another + activities:
-				return True
-		# Seventh format: Sharing other media
-		# John Doe shared a video from the playlist My Playlist
-		# John Doe shared an episode of Some Scary Movie
-		# John Doe shared a quote
-		# John Doe shared moments from his year
-		if title_words[namewc] == "shared":
-			shared_media = ["video", "quote", "episode"]
-			if title_words[namewc + 2] in shared_media:
-				return True
-			elif title_words[namewc + 1] == "moments":
-				return True
-		# Eighth format: John Doe created a poll
-		if title_words[-1] == "poll" and title_words[-3] == "created":
-			return True
-		# Ninth format: John Doe was 🎉 celebrating friendship
-		if title_words[-1] == "friendship" and title_words[-2] == "celebrating":
-			return True
-	return False
-
-
-"""
-	Helper method that checks if a post was made in a group, page, or an event.
-
-	TODO! Handle these titles:
-	John Doe contributed to the album: <album name> in <group name>
-"""
-
-
-def group_page_event_post(title, username):
-	title_words = title.split()
-	namewc = len(username.split())
-	# First format: John Doe posted in group/event/page
-	if title_words[namewc] == "posted" and title_words[namewc + 1] == "in":
-		return True
-	# Second format: John Doe shared a link to the group/event/page: name
-	# Related: John Doe shared an album: <Album name> to the group: name
-	# Any title containing both "shared an xxx" and "to the group/event/page"
-	# can count as this.
-	grp_evt_pg = ["to the group:", "to the event:"]
-	rep_title = title.replace(username, "").strip()
-	if rep_title[:8] == "shared a":
-		for ke in grp_evt_pg:
-			if ke in rep_title:
-				return True
-	if title_words[namewc] == "shared" and title_words[namewc + 5] in grp_evt_pg:
-		# Check for a degenerate case
-		if title_words[namewc + 2] != "album:":
-			return True
-	# Third format: John Doe created a [private] event for group name
-	if title_words[namewc] == "created":
-		event_keyword = ["event", "private"]
-		if title_words[namewc + 2] in event_keyword:
-			return True
-
-	"""
-	grp_evt_pg_post = ["posted in", "to the group", "to the event"]
-	for exp in grp_evt_pg_post:
-		# First, take care of the degenerate case of someone attempting to
-		# use a name that matches one of the key expressions.
-		if title.find(exp) == 0:
-			title = title.replace(exp, "your name", 1)
-		if exp in title:
-			return True
-	"""
-	return False
-
-
-"""
-	Helper method that extracts friend's name or group's name, depending on the
-	friend_name parameter. It also checks if the title is related to a post or
-	a comment.
-"""
-
-
-def name_extractor(title, friend_name, username):
-	# First two cases involve posts on another user's timeline.
-	if friend_name == "fr":
-		# Titles are in the following format:
-		# Username wrote on John Doe's timeline
-		# Username added a new photo/video to John Doe's timeline
-		# Username shared a memory to John Doe's timeline
-		key_exp = ["wrote on", "memory to", "photo to", "video to"]
-	elif friend_name == "gr":
-		# Format of title will be either one of the following:
-		# John Doe posted in Group Name
-		# John Doe shared a post to the group: Group Name
-		key_exp = ["posted in", "the group:", "the event:"]
-	else:
-		# This case involves a comment with another user.
-		key_exp = ["commented on", "replied to"]
+	load_message_entry() for a single entry of the "messages" list. Returns a
+	dictionary containing the timestamp and content of the message, or None if
+	the message is not a legitimate message sent by the user.
+"""
 
-	# First, take care of the degenerate case of someone attempting to
-	# use a name that matches one of the key expressions.
-	title = keyexp_username_prune(title, key_exp, username)
 
-	if friend_name == "fr":
-		return_name = " ".join(title.split()[2:-1])[:-2]
-	elif friend_name == "gr":
-		return_name = " ".join(title.split()[2:])
-	else:
-		# At this point, all comments are in one of the four following formats.
-		# "commented on John Doe's post"
-		# "commented on John Doe's live video"
-		# "replied to John Doe's comment"
-		# "replied to one's own comment"
-		target_name_list = title.split()[2:-1]
-		if target_name_list[-1] == "live" or target_name_list[-1] == "life":
-			target_name_list = target_name_list[:-1]
-		if target_name_list[-1] == "own":
-			return_name = username
-		else:
-			return_name = " ".join(target_name_list)[:-2]
-	return return_name
+def load_message_entry(data, username, ts_range=None):
+	ts = own_message_ts(data, username, ts_range)
+	if ts is None:
+		return None
+	message = strprocutil.convert_str(data.get("content", "")).strip()
+	if not legit_message(message):
+		return None
+	return {
+		"ts": ts,
+		"post": message,
+	}
+
+
+"""
+	Checks the timestamp, sender, and type of a single entry of the "messages"
+	list. Returns the timestamp in seconds if the entry is an actual message
+	sent by the user within ts_range, None otherwise. The content is checked
+	separately by legit_message(), so that it is only converted for the user's
+	messages.
+"""
 
 
+def own_message_ts(data, username, ts_range=None):
+	ts = int(data.get("timestamp_ms", -1) / 1000)  # conversion to seconds
+	if not in_date_range(ts, ts_range):
+		return None
+	sender = strprocutil.convert_name(data.get("sender_name", "")).strip()
+	mtype = data.get("type", "").strip()
+	# A creative way to check if all of them are present and make sure that
+	# they are not degenerate data such as empty strings.
+	if len(sender) * len(mtype) * ts <= 0:
+		return None
+	# Only looking for actual messages, not logs of adding/removing people
+	# in group chats. Also check if they're from username only.
+	if (mtype != "Generic" and mtype != "Share") or sender != username:
+		return None
+	return ts
+
+
+"""
+	Checks the converted content of a message sent by the user. Returns True
+	IFF it is neither empty nor a notification.
 """
-	Helper method that takes care of degenerate cases from title data where
-	someone attempts to use a user name or page name that matches one of the
-	key expressions we are looking for.
 
-	e.g. key expression of "commented on", and a Facebook page with the name of
-	"I replied to yo mommas phonecall", dealing with the following title:
-	I replied to yo mommas phonecall replied to John Doe's comment.
 
-	The first find() results will match to the username, so we replace those
-	instances until there are no occurrences left before the actual key
-	phrase.
+def legit_message(message):
+	if len(message) == 0:
+		return False
+	# Last but not least, ignore any messages that say something like
+	# "You set your nickname to xxx."
+	if len(message) >= 24 and message[:24] == "You set your nickname to":
+		return False
+	return True
+
+
+"""
+	Checks if the timestamp ts is within ts_range, a [start, end) range as
+	returned by tsconverter.date_range(). Always True if ts_range is None.
 """
 
 
-def keyexp_username_prune(title, keyexp, username):
-	for exp in keyexp:
-		while exp in username:
-			title = title.replace(exp, "your name", 1)
-			username = username.replace(exp, "your name", 1)
-	key_exp_loc = [title.find(ke) for ke in keyexp]
-	if sum(key_exp_loc) == -(len(keyexp)):
-		# All titles at this point must have either one of the above key_exp.
-		# If it contains neither, consider it an illegitimate data row and
-		# return an empty string.
-		title = ""
-	elif key_exp_loc.count(-1) == len(keyexp) - 1:
-		# Only one key expression found. Most titles should fall into this
-		# category.
-		title = title[max(key_exp_loc):]
-	else:
-		# Multiple key expressions found. This is the case in the edge case
-		# scenario where the target's name contains key expressions.
-		# In this case, we want to look at the lowest index of the two
-		# find() results.
-		title = title[min(key_exp_loc):]
-	return title
+def in_date_range(ts, ts_range):
+	if ts_range is None:
+		return True
+	start, end = ts_range
+	return (start is None or ts >= start) and (end is None or ts < end)
+
+
+"""
+	Find the (first, last) message timestamps in the raw text of a
+	message_N.json, given as an iterable of text chunks, without decoding the
+	JSON. Every "timestamp_ms" in the file counts, so the span may be wider than
+	that of the messages, but never narrower. Returns None if there are none.
+"""
+
+
+def timestamp_span(chunks):
+	first = last = None
+	tail = ""
+	for chunk in chunks:
+		window = tail + chunk
+		values = list(map(int, TIMESTAMP_MS_PATTERN.findall(window)))
+		if len(values) > 0:
+			low, high = min(values), max(values)
+			first = low if first is None else min(first, low)
+			last = high if last is None else max(last, high)
+		tail = window[-SPAN_OVERLAP:]
+	if first is None:
+		return None
+	return first, last
+
+
+"""
+	Checks if a span returned by timestamp_span() may hold messages within
+	ts_range. Files without any timestamps are left to the regular checks.
+"""
+
+
+def span_in_range(span, ts_range):
+	if span is None or ts_range is None:
+		return True
+	start, end = ts_range
+	first, last = int(span[0] / 1000), int(span[1] / 1000)
+	return (start is None or last >= start) and (end is None or first < end)
@@ -0,0 +1,138 @@
+import json
+
+"""
+	Incremental JSON reader module for the Social Media Analytics Kit.
+	Reads a JSON document from an open file in fixed-size chunks and hands
+	out its top-level members one at a time, so that large exports such as
+	comments.json or a long Messenger thread never have to be decoded into
+	memory as a whole. Arrays under selected keys are split further into
+	their individual elements.
+
+	@author: DeltaSierra4
+"""
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = " \t\n\r"
+NUMBER_CHARS = "0123456789.eE+-"
+
+decoder = json.JSONDecoder()
+
+
+"""
+	Walk through the top level of a JSON document and yield events in the
+	form of (event, key, value) tuples:
+
+	("member", key, value): A complete top-level member of an object.
+	("item", key, value): A single element of the array stored under key.
+	Only emitted for keys listed in stream_keys.
+
+	If the document itself is an array (e.g. your_posts_1.json), every element
+	is emitted as an "item" event with key set to None.
+"""
+
+
+def iter_members(f, stream_keys=(), chunk_size=CHUNK_SIZE):
+	buf = ""
+	pos = 0
+	eof = False
+
+	# Read at least min_size more characters into the buffer, dropping the
+	# part of the buffer that has already been consumed.
+	def fill(min_size):
+		nonlocal buf, pos, eof
+		if eof:
+			return False
+		chunk = f.read(max(chunk_size, min_size))
+		if not chunk:
+			eof = True
+			return False
+		buf = buf[pos:] + chunk
+		pos = 0
+		return True
+
+	def skip_ws():
+		nonlocal pos
+		while True:
+			while pos < len(buf) and buf[pos] in WHITESPACE:
+				pos += 1
+			if pos < len(buf) or not fill(0):
+				return
+
+	def peek():
+		skip_ws()
+		if pos >= len(buf):
+			raise ValueError("Unexpected end of JSON document.")
+		return buf[pos]
+
+	def expect(chars):
+		nonlocal pos
+		c = peek()
+		if c not in chars:
+			raise ValueError(
+				"Expected one of {} at offset {}, found {}.".format(chars, pos, c)
+			)
+		pos += 1
+		return c
+
+	def value():
+		nonlocal pos
+		skip_ws()
+		while True:
+			try:
+				obj, end = decoder.raw_decode(buf, pos)
+			except json.JSONDecodeError:
+				# The value is cut off at the end of the buffer. Grow the read
+				# size with the pending value so that huge values are not
+				# rescanned once per chunk.
+				if not fill(len(buf) - pos):
+					raise
+				continue
+			cut_off = (end == len(buf) or buf[end] in NUMBER_CHARS)
+			if cut_off and buf[pos] in NUMBER_CHARS and fill(0):
+				# Numbers can be cut off at the end of the buffer while still
+				# decoding successfully, so decode them again once more data is
+				# available.
+				continue
+			pos = end
+			return obj
+
+	def array_items(key):
+		nonlocal pos
+		expect("[")
+		if peek() == "]":
+			pos += 1
+			return
+		while True:
+			yield ("item", key, value())
+			if expect(",]") == "]":
+				return
+
+	if peek() == "[":
+		yield from array_items(None)
+		return
+
+	expect("{")
+	if peek() == "}":
+		return
+	while True:
+		key = value()
+		expect(":")
+		if key in stream_keys and peek() == "[":
+			yield from array_items(key)
+		else:
+			yield ("member", key, value())
+		if expect(",}") == "}":
+			return
+
+
+"""
+	Convenience wrapper around iter_members() that only yields the elements of
+	the array stored under key. If key is None, the document is expected to be
+	an array itself.
+"""
+
+
+def iter_array(f, key=None, chunk_size=CHUNK_SIZE):
+	for event, _, item in iter_members(f, (key,), chunk_size):
+		if event == "item":
+			yield item
@@ -0,0 +1,251 @@
+from collections import OrderedDict, deque
+import hashlib
+import time
+import strprocutil
+
+"""
+	NLP model registry for the Social Media Analytics Kit.
+	Loads each spaCy language model at most once per process, and only when
+	the first stage that needs it runs. textacy and spaCy are imported at that
+	point as well, so that everything before the analysis (config validation,
+	loading the export) starts without them.
+
+	Parsed docs are kept in a per-process LRU cache keyed by a hash of their
+	text, so that a post is only parsed once even though several steps of the
+	analysis need a doc of it.
+
+	@author: DeltaSierra4
+"""
+
+DEFAULT_MODEL = "en_core_web_sm"
+DEFAULT_DISABLE = ("parser",)
+# Number of texts spaCy processes at a time, unless set by "Batch_size".
+DEFAULT_BATCH_SIZE = 64
+# Memory cap of the doc cache in MB, unless set by "Doc_cache_mb".
+DEFAULT_DOC_CACHE_MB = 256
+# Rough memory use of a parsed doc per token, most of which is the token's
+# row of the doc tensor.
+DOC_TOKEN_BYTES = 512
+
+# Models loaded so far, keyed by (model name, disabled pipeline components).
+loaded_models = {}
+# Parsed docs, keyed by text_key(), from least to most recently used.
+doc_cache = {
+	"docs": OrderedDict(),
+	"bytes": 0,
+	"hits": 0,
+	"misses": 0,
+}
+
+
+"""
+	Returns the spaCy language model of the given name with the given pipeline
+	components disabled, loading it on first use.
+"""
+
+
+def get_model(name=DEFAULT_MODEL, disable=DEFAULT_DISABLE):
+	key = (name, tuple(disable))
+	if key not in loaded_models:
+		import textacy
+
+		start = time.perf_counter()
+		loaded_models[key] = textacy.load_spacy_lang(name, disable=disable)
+		print("Loaded spaCy model {} in {:.2f}s".format(
+			name, time.perf_counter() - start
+		))
+	return loaded_models[key]
+
+
+"""
+	Run a short text through every component of nlp, so that the lazily
+	initialized parts of the model (e.g. its lookup tables) are loaded. Used
+	before forking worker processes, so that they share those parts too.
+"""
+
+
+def warm_model(nlp):
+	start = time.perf_counter()
+	list(nlp.pipe(["Warm up the pipeline before the workers are started."]))
+	print("Warmed up spaCy model in {:.2f}s".format(time.perf_counter() - start))
+
+
+"""
+	Run texts through nlp in batches. Returns an iterator over the resulting
+	docs, in the same order as texts. pipe_config is the "Analyzer_config"
+	section of the config file, whose optional "Batch_size" and "N_process"
+	fields set the number of texts per batch and the number of processes.
+
+	texts may be a generator. Only a few batches are held in memory at a time.
+"""
+
+
+def pipe(nlp, texts, pipe_config=None):
+	if pipe_config is None:
+		pipe_config = {}
+	return nlp.pipe(
+		texts, batch_size=pipe_config.get("Batch_size", DEFAULT_BATCH_SIZE),
+		n_process=pipe_config.get("N_process", 1)
+	)
+
+
+"""
+	Returns the cache key of a text.
+"""
+
+
+def text_key(text):
+	return hashlib.blake2b(
+		text.encode("utf-8", "surrogatepass"), digest_size=16
+	).digest()
+
+
+"""
+	Returns the parsed docs of texts in the same order, like pipe(), but takes
+	docs from the doc cache where possible. Only texts that are not cached are
+	run through nlp, and each distinct text only once. New docs are added to
+	the cache, and the least recently used ones are evicted once the cache
+	grows beyond the "Doc_cache_mb" field of pipe_config. A cap of 0 disables
+	the cache.
+
+	All uncached texts go through a single pipe() call, which pulls them from
+	uncached_texts() as it needs them, so that the processes of "N_process"
+	are only started once per call.
+"""
+
+
+def docs(nlp, texts, pipe_config=None):
+	if pipe_config is None:
+		pipe_config = {}
+	max_bytes = pipe_config.get("Doc_cache_mb", DEFAULT_DOC_CACHE_MB) << 20
+	cached = doc_cache["docs"]
+	lookup = {
+		# (key, doc) of every text read so far and not yet returned. doc is
+		# None for texts whose doc is still being parsed.
+		"order": deque(),
+		# Keys of the texts passed to pipe(), in order.
+		"missing": deque(),
+		# Number of entries of order waiting for the doc of each key.
+		"waiting": {},
+		# Parsed docs of the keys in waiting.
+		"parsed": {},
+	}
+	for doc in pipe(nlp, uncached_texts(texts, lookup), pipe_config):
+		key = lookup["missing"].popleft()
+		lookup["parsed"][key] = doc
+		if max_bytes > 0:
+			cached[key] = doc
+			doc_cache["bytes"] += doc_bytes(doc)
+		while doc_cache["bytes"] > max_bytes and len(cached) > 0:
+			_, evicted = cached.popitem(last=False)
+			doc_cache["bytes"] -= doc_bytes(evicted)
+		yield from ready_docs(lookup)
+	yield from ready_docs(lookup)
+
+
+"""
+	Look up every text in the doc cache as pipe() reads it, and yield the
+	texts that need to be parsed. Cached docs are kept in the order of the
+	lookup, so that they are returned even if they are evicted meanwhile.
+"""
+
+
+def uncached_texts(texts, lookup):
+	cached = doc_cache["docs"]
+	for text in texts:
+		key = text_key(text)
+		if key in lookup["waiting"]:
+			lookup["waiting"][key] += 1
+			lookup["order"].append((key, None))
+			doc_cache["hits"] += 1
+		elif key in cached:
+			cached.move_to_end(key)
+			lookup["order"].append((key, cached[key]))
+			doc_cache["hits"] += 1
+		else:
+			lookup["waiting"][key] = 1
+			lookup["order"].append((key, None))
+			lookup["missing"].append(key)
+			doc_cache["misses"] += 1
+			yield text
+
+
+"""
+	Yield the docs at the front of the lookup order that are available, i.e.
+	cached or parsed by now.
+"""
+
+
+def ready_docs(lookup):
+	order = lookup["order"]
+	while len(order) > 0:
+		key, doc = order[0]
+		if doc is None:
+			if key not in lookup["parsed"]:
+				return
+			doc = lookup["parsed"][key]
+			lookup["waiting"][key] -= 1
+			if lookup["waiting"][key] == 0:
+				del lookup["waiting"][key]
+				del lookup["parsed"][key]
+		order.popleft()
+		yield doc
+
+
+def doc_bytes(doc):
+	return len(doc) * DOC_TOKEN_BYTES + len(doc.text)
+
+
+"""
+	Returns the hit and miss counters of the doc cache of this process.
+"""
+
+
+def doc_cache_stats():
+	return {"hits": doc_cache["hits"], "misses": doc_cache["misses"]}
+
+
+"""
+	Add the hits and misses of the doc cache of a worker process, as returned
+	by doc_cache_stats(), to the counters of this process.
+"""
+
+
+def add_doc_cache_stats(stats):
+	doc_cache["hits"] += stats["hits"]
+	doc_cache["misses"] += stats["misses"]
+
+
+"""
+	Print the hit rate and size of the doc cache. The hits and misses include
+	those of the worker processes, but the size is that of the cache of this
+	process only.
+"""
+
+
+def report_doc_cache():
+	lookups = doc_cache["hits"] + doc_cache["misses"]
+	hit_rate = doc_cache["hits"] / lookups if lookups > 0 else 0.0
+	print(
+		"Doc cache: {} hits, {} misses ({:.1%} hit rate), "
+		"{} docs, {:.1f}MB".format(
+			doc_cache["hits"], doc_cache["misses"], hit_rate,
+			len(doc_cache["docs"]), doc_cache["bytes"] / (1 << 20)
+		)
+	)
+
+
+"""
+	Views of a post that only need its tokens, not the tagger and the other
+	components of the pipeline. The views are made by the tokenizer alone.
+	TextStats only looks at the tokens, so its results are the same as on a
+	fully parsed doc.
+"""
+
+
+def lower_view(nlp, doc):
+	return nlp.make_doc(doc.text.lower())
+
+
+def gibberish_view(nlp, doc):
+	return nlp.make_doc(strprocutil.gibberishremove(doc.text).lower())
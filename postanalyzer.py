@@ -1,9 +1,17 @@
-from collections import defaultdict
-
-import textacy
-import textacy.ke
-
+from collections import Counter, defaultdict
+from math import log2
+import re
+import time
+
+import nlpmodels
+import posttable
+import resultcache
+import statacc
 import strprocutil
+import topk
+import tsconverter
+import vocabulary
+import workerpool
 
 """
 	Post analyzer module for the Social Media Analytics Kit.
@@ -28,467 +36,994 @@ import strprocutil
 """
 
 
-def analyze_comments(comm_dic, en, stats_config, username):
-	return_dic = {
-		"monthly_url_count": defaultdict(lambda: defaultdict(lambda: 0)),
-		"monthly_wordcloud": defaultdict(
-			lambda: defaultdict(lambda: defaultdict(lambda: 0))
+"""
+	Returns an empty results dictionary for one category of posts. The term
+	counts of a field with a size in sketch_sizes are kept in top-k sketches
+	of that size (see the topk module) instead of exact counters.
+"""
+
+
+def new_result_dic(sketch_sizes=None):
+	if sketch_sizes is None:
+		sketch_sizes = {}
+	return {
+		"monthly_url_count": defaultdict(
+			counter_factory("monthly_url_count", sketch_sizes, new_term_counts)
+		),
+		# Word counts are Counters of vocabulary ids (see wordcount_generator())
+		"monthly_wordcloud": defaultdict(lambda: defaultdict(
+			counter_factory("monthly_wordcloud", sketch_sizes, Counter)
+		)),
+		"monthly_sgrank": defaultdict(
+			counter_factory("monthly_sgrank", sketch_sizes, new_term_counts)
+		),
+		"monthly_textrank": defaultdict(
+			counter_factory("monthly_textrank", sketch_sizes, new_term_counts)
+		),
+		# Statistics are accumulators, see the statacc module.
+		"monthly_statistics": defaultdict(
+			lambda: defaultdict(statacc.new_accumulator)
 		),
-		"monthly_sgrank": defaultdict(lambda: defaultdict(lambda: 0)),
-		"monthly_textrank": defaultdict(lambda: defaultdict(lambda: 0)),
-		"monthly_statistics": defaultdict(lambda: defaultdict(lambda: [])),
-		"monthly_wordcloud_hl": defaultdict(lambda: defaultdict(lambda: 0)),
-		"monthly_sgrank_hl": defaultdict(lambda: defaultdict(lambda: 0)),
-		"monthly_textrank_hl": defaultdict(lambda: defaultdict(lambda: 0))
+		# Same data as above but only for news headlines
+		"monthly_wordcloud_hl": defaultdict(
+			counter_factory("monthly_wordcloud_hl", sketch_sizes, Counter)
+		),
+		"monthly_sgrank_hl": defaultdict(
+			counter_factory("monthly_sgrank_hl", sketch_sizes, new_term_counts)
+		),
+		"monthly_textrank_hl": defaultdict(
+			counter_factory("monthly_textrank_hl", sketch_sizes, new_term_counts)
+		)
 	}
 
-	for g, gset in comm_dic.items():
-		for target, pset in gset.items():
-			if target == "Own":
-				analyze_comments_helper(
-					pset, username, en, return_dic, stats_config
-				)
-			else:
-				for name, person_posts in pset.items():
-					analyze_comments_helper(
-						person_posts, name, en, return_dic, stats_config
-					)
-	return return_dic
 
+def new_term_counts():
+	return defaultdict(lambda: 0)
+
+
+def counter_factory(field, sketch_sizes, exact_factory):
+	if field in sketch_sizes:
+		return lambda: topk.new_sketch(sketch_sizes[field])
+	return exact_factory
+
+
+# Fields of the results dictionary that count terms: the number of nested
+# levels above their counters, and the field of the "SMAKstats_config" section
+# that limits how many of their terms are reported.
+COUNTER_FIELDS = {
+	"monthly_url_count": (1, "Wordcount_limit"),
+	"monthly_wordcloud": (2, "Wordcount_limit"),
+	"monthly_sgrank": (1, "Keyterm_limit"),
+	"monthly_textrank": (1, "Keyterm_limit"),
+	"monthly_wordcloud_hl": (1, "Wordcount_limit"),
+	"monthly_sgrank_hl": (1, "Keyterm_limit"),
+	"monthly_textrank_hl": (1, "Keyterm_limit"),
+}
 
+
+"""
+	Returns the size of the top-k sketch of each field in COUNTER_FIELDS, which
+	is the "Sketch_factor" field of stats_config times the number of terms
+	reported for the field (see wordcloud_config, the "SMAKstats_config"
+	section of the config file). Returns an empty dictionary, which counts all
+	terms exactly, if either is not set.
 """
-	Extension of the analyze_comments() above for clarity.
 
-	Steps of this function:
-	1. Extract URLs and headlines (if any) from those URLS. Pool those URLs
-	and headlines together in a monthly dictionary for later analysis.
-	2. Obtain a list of posts with said URLs and long words pruned out.
-	3. Obtain a wordcount per user per month (do not count stopwords or
-	symbols, punctuations, and emoji for this step. All words must be
-	lower-case)
-	4. Obtain keywords per month (keyword per user feature is not supported yet)
-	5. Obtain relevant statistical values in monthly format (so that monthly
-	averages and global averages can be computed at the very end).
-	6. Repeat the above for monthly headlines.
-	7. Return the results dictionary.
+
+def sketch_capacities(stats_config, wordcloud_config):
+	factor = stats_config.get("Sketch_factor", 0)
+	if factor == 0 or wordcloud_config is None:
+		return {}
+	return {
+		field: factor * wordcloud_config[limit]
+		for field, (_, limit) in COUNTER_FIELDS.items()
+	}
+
+
+"""
+	Add a dictionary of {term: count} to a counter of the results dictionary,
+	which is either an exact counter or a top-k sketch.
 """
 
 
-def analyze_comments_helper(comm_dic, name, en, r_dic, stats_config):
-	news_headlines_monthly = defaultdict(lambda: [])
-	for year, annual_posts in comm_dic.items():
-		for month, monthly_posts in annual_posts.items():
-			y_m_str = str(year) + "-"
-			if int(month) < 10:
-				y_m_str += ("0" + str(month))
-			else:
-				y_m_str += str(month)
-			for _, daily_posts in monthly_posts.items():
-				for _, post_list in daily_posts.items():
-					# Step 1
-					url_dic, headlines, posts = strprocutil.extract_urls(post_list, False)
-					news_headlines_monthly[y_m_str] += headlines
-					for url, count in url_dic.items():
-						r_dic["monthly_url_count"][y_m_str][url] += count
-					# Step 2
-					preproc_posts = strprocutil.preproc_posts(posts)
-					# Step 3
-					only_legit_words = strprocutil.wordcloud_preproc(preproc_posts)
-					wordcount_generator(
-						only_legit_words, r_dic["monthly_wordcloud"], name, y_m_str
-					)
-					# Steps 4 & 5
-					keyterm_stats_generator(
-						preproc_posts, en, r_dic["monthly_sgrank"],
-						r_dic["monthly_textrank"], r_dic["monthly_statistics"],
-						y_m_str, stats_config
-					)
-	# Step 6
-	for month, headlines in news_headlines_monthly.items():
-		only_legit_words_hl = strprocutil.wordcloud_preproc(headlines)
-		wordcount_generator(
-			only_legit_words_hl, r_dic["monthly_wordcloud_hl"], None, month
-		)
-		keyterm_stats_generator(
-			headlines, en, r_dic["monthly_sgrank_hl"], r_dic["monthly_textrank_hl"],
-			None, month, stats_config
-		)
+def add_counts(counter, counts):
+	if topk.is_sketch(counter):
+		topk.update_counts(counter, counts)
+	else:
+		for term, count in counts.items():
+			counter[term] += count
 
 
 """
-	Steps of this function:
-	1. Extract URLs and headlines (if any) from those URLS. Pool those URLs
-	and headlines together in a monthly dictionary for later analysis.
-	2. Obtain a list of posts with said URLs and long words pruned out.
-	3. Obtain a wordcount per user per month (do not count stopwords or
-	symbols, punctuations, and emoji for this step. All words must be
-	lower-case)
-	4. Obtain keywords per month (keyword per user feature is not supported yet)
-	5. Obtain relevant statistical values in monthly format (so that monthly
-	averages and global averages can be computed at the very end).
-	6. Repeat the above for monthly headlines.
-	7. Return the results dictionary.
+	Returns the given rows of the post table in the {"post": ...} format
+	expected by strprocutil.extract_urls().
 """
 
 
-def analyze_posts(post_dic, en, stats_config, username=""):
-	# URLs don't need to be divided by usernames, but wordclouds do.
-	url_count_monthly = defaultdict(lambda: defaultdict(lambda: 0))
-	news_headlines_monthly = defaultdict(lambda: [])
-	monthly_wordcloud = defaultdict(
-		lambda: defaultdict(
-			lambda: defaultdict(lambda: 0)
-		)
-	)
-	monthly_sgrank = defaultdict(lambda: defaultdict(lambda: 0))
-	monthly_textrank = defaultdict(lambda: defaultdict(lambda: 0))
-	monthly_statistics = defaultdict(lambda: defaultdict(lambda: []))
-	# Same data as above but only for news headlines
-	monthly_wordcloud_hl = defaultdict(lambda: defaultdict(lambda: 0))
-	monthly_sgrank_hl = defaultdict(lambda: defaultdict(lambda: 0))
-	monthly_textrank_hl = defaultdict(lambda: defaultdict(lambda: 0))
-
-	for name, person_posts in post_dic.items():
-		for year, annual_posts in person_posts.items():
-			for month, monthly_posts in annual_posts.items():
-				y_m_str = str(year) + "-"
-				if int(month) < 10:
-					y_m_str += ("0" + str(month))
-				else:
-					y_m_str += str(month)
-				for _, daily_posts in monthly_posts.items():
-					for _, post_list in daily_posts.items():
-						# Step 1
-						url_dic, headlines, posts = strprocutil.extract_urls(post_list, False)
-						news_headlines_monthly[y_m_str] += headlines
-						for url, count in url_dic.items():
-							url_count_monthly[y_m_str][url] += count
-						# Step 2
-						preproc_posts = strprocutil.preproc_posts(posts)
-						# Step 3
-						only_legit_words = strprocutil.wordcloud_preproc(preproc_posts)
-						wordcount_generator(only_legit_words, monthly_wordcloud, name, y_m_str)
-						# Steps 4 & 5
-						keyterm_stats_generator(
-							preproc_posts, en, monthly_sgrank, monthly_textrank,
-							monthly_statistics, y_m_str, stats_config
-						)
-	# Step 6
-	for month, headlines in news_headlines_monthly.items():
-		only_legit_words_hl = strprocutil.wordcloud_preproc(headlines)
-		wordcount_generator(only_legit_words_hl, monthly_wordcloud_hl, None, month)
-		keyterm_stats_generator(
-			headlines, en, monthly_sgrank_hl, monthly_textrank_hl,
-			None, month, stats_config
-		)
-	# Step 7
-	return collect_results(
-		url_count_monthly, monthly_wordcloud, monthly_sgrank, monthly_textrank,
-		monthly_statistics, monthly_wordcloud_hl, monthly_sgrank_hl,
-		monthly_textrank_hl
-	)
+def post_batch(table, rows):
+	return [{"post": posttable.get_text(table, row)} for row in rows]
+
+
+# Number of nested levels of the post counts of each category.
+COUNT_DEPTHS = {
+	"comments": 4,
+	"messages": 3,
+	"posts": 2,
+}
 
 
 """
-	Steps of this function:
-	1. Extract URLs and headlines (if any) from those URLS. Pool those URLs
-	and headlines together in a monthly dictionary for later analysis.
-	2. Obtain a list of posts with said URLs and long words pruned out.
-	3. Obtain a wordcount per user per month (do not count stopwords or
-	symbols, punctuations, and emoji for this step. All words must be
-	lower-case)
-	4. Obtain keywords per month (keyword per user feature is not supported yet)
-	5. Obtain relevant statistical values in monthly format (so that monthly
-	averages and global averages can be computed at the very end).
-	6. Repeat the above for monthly headlines.
-	7. Return the results dictionary.
+	Returns an empty post counts dictionary for one category of posts, sorted
+	both by date and by name. Comments are further split by group name and by
+	comments/replies, and messages by group/individual messages.
 """
 
 
-def analyze_messages(mess_dic, en, stats_config, username=""):
-	# URLs don't need to be divided by usernames, but wordclouds do.
-	url_count_monthly = defaultdict(lambda: defaultdict(lambda: 0))
-	news_headlines_monthly = defaultdict(lambda: [])
-	monthly_wordcloud = defaultdict(
-		lambda: defaultdict(
-			lambda: defaultdict(lambda: 0)
+def new_count_dic(category):
+	return {
+		"sorted_by_date": nested_dic(COUNT_DEPTHS[category]),
+		"sorted_by_name": nested_dic(COUNT_DEPTHS[category]),
+	}
+
+
+def nested_dic(depth):
+	if depth == 0:
+		return {}
+	return defaultdict(lambda: nested_dic(depth - 1))
+
+
+"""
+	Traversal engine of the analyzer. All posts of a category are walked
+	exactly once, one (person, month) shard at a time, through the time index
+	of the post table and in chronological order within each shard. For every
+	shard, the URLs of its posts are extracted and a unit is emitted to each of
+	the registered consumers (see CONSUMERS below):
+
+	{
+		"partner": name of the person (or the group chat),
+		"period": year-month string of the shard,
+		"rows": rows of the posts in the post table,
+		"texts": text of every post with its URLs removed (possibly empty),
+		"urls": {hostname: count} of the URLs of the posts,
+		"headlines": news headlines extracted from the URLs,
+	}
+
+	Further views of a unit, e.g. its preprocessed posts, are computed on
+	first use by unit_view() and shared by all consumers, so that each post is
+	preprocessed only once per run. Once all units are visited, the "finish"
+	hook of every consumer is called, which is where consumers run spaCy on
+	the posts they collected, in large batches.
+
+	context holds the settings and the results of the traversal (see
+	new_context()).
+"""
+
+
+def traverse(context, shards):
+	table = context["table"]
+	consumers = [CONSUMERS[consumer] for consumer in context["consumers"]]
+	for name, period, rows in shards:
+		url_dic, headlines, texts = strprocutil.extract_urls(
+			post_batch(table, rows), True
 		)
+		unit = {
+			"partner": name,
+			"period": tsconverter.period_str(period),
+			"rows": rows,
+			"texts": texts,
+			"urls": url_dic,
+			"headlines": headlines,
+		}
+		for consumer in consumers:
+			if consumer["unit"] is not None:
+				consumer["unit"](context, unit)
+	for consumer in consumers:
+		if consumer["finish"] is not None:
+			consumer["finish"](context)
+	return context
+
+
+"""
+	Returns a fresh traversal context for one category of posts. Its results
+	are "results" (see new_result_dic()), "counts" (see new_count_dic()) and
+	"headlines", the news headlines of each month. The other fields are
+	working state of the consumers.
+"""
+
+
+def new_context(
+	table, category, consumers, en, stats_config, count_config, sketch_sizes=None
+):
+	return {
+		"table": table,
+		"category": category,
+		"consumers": consumers,
+		"en": en,
+		"stats_config": stats_config,
+		"count_config": count_config,
+		"results": new_result_dic(sketch_sizes),
+		"sketch_sizes": sketch_sizes,
+		"counts": new_count_dic(category),
+		"headlines": defaultdict(lambda: []),
+		# Preprocessed posts of each month with their post ids, and their key
+		# terms and text statistics once computed.
+		"posts": defaultdict(lambda: []),
+		"post_rows": defaultdict(lambda: []),
+		"month_results": {},
+		# Posts waiting for their count statistics (see count_stats_generator())
+		"pending": [],
+	}
+
+
+"""
+	Returns the given view of a unit, computing it on first use:
+	"posts": the non-empty posts with their URLs removed.
+	"preproc": the posts preprocessed by strprocutil.preproc_posts().
+	"preproc_rows": the rows of the posts in "preproc", i.e. their post ids.
+	"groups": the positions of the posts within the unit, split by group (and
+	for comments, by comments/replies), as a list of (group key, positions).
+"""
+
+
+def unit_view(context, unit, view):
+	if view not in unit:
+		unit[view] = UNIT_VIEWS[view](context, unit)
+	return unit[view]
+
+
+def posts_view(context, unit):
+	return [text for text in unit["texts"] if len(text) > 0]
+
+
+def preproc_view(context, unit):
+	return [text for _, text in preproc_pairs(unit)]
+
+
+def preproc_rows_view(context, unit):
+	return [row for row, _ in preproc_pairs(unit)]
+
+
+"""
+	Returns the (row, preprocessed text) of every post of a unit that is not
+	empty after preprocessing. Posts are preprocessed one at a time, since
+	strprocutil.preproc_posts() drops the posts that end up empty.
+"""
+
+
+def preproc_pairs(unit):
+	if "preproc_pairs" not in unit:
+		pairs = []
+		for row, text in zip(unit["rows"], unit["texts"]):
+			if len(text) == 0:
+				continue
+			preproc = strprocutil.preproc_posts([text])
+			if len(preproc) > 0:
+				pairs.append((row, preproc[0]))
+		unit["preproc_pairs"] = pairs
+	return unit["preproc_pairs"]
+
+
+def groups_view(context, unit):
+	table = context["table"]
+	group_col = table["group"]
+	kind_col = table["kind"]
+	replies = posttable.KIND_CODES["Replies"]
+	groups = defaultdict(lambda: [])
+	for pos, row in enumerate(unit["rows"]):
+		if context["category"] == "comments":
+			groups[(group_col[row], kind_col[row] == replies)].append(pos)
+		elif context["category"] == "messages":
+			groups[group_col[row]].append(pos)
+		else:
+			groups[None].append(pos)
+	return list(groups.items())
+
+
+UNIT_VIEWS = {
+	"posts": posts_view,
+	"preproc": preproc_view,
+	"preproc_rows": preproc_rows_view,
+	"groups": groups_view,
+}
+
+
+"""
+	Consumers of the traversal engine. Each of them covers one step of the
+	analysis:
+	1. "urls": Count the hostnames of URLs, and pool the headlines extracted
+	from them in a monthly dictionary for later analysis.
+	2. "wordcount": Obtain a wordcount per user per month (do not count
+	stopwords or symbols, punctuations, and emoji for this step. All words must
+	be lower-case)
+	3. "keyterms": Obtain keywords per month (keyword per user feature is not
+	supported yet)
+	4. "readability": Obtain relevant statistical values in monthly format (so
+	that monthly averages and global averages can be computed at the very end).
+	5. "count_stats": Count the posts per person and month, and collect their
+	word count, character count, and entropy.
+	Key terms and readability statistics come from the same spaCy doc of each
+	post, which is parsed once by month_results(). The count statistics need
+	no linguistic annotation, so they are computed without spaCy (see
+	count_text_stats()). The spaCy model is only loaded if one of the
+	consumers of a run needs it (see the "model" field of CONSUMERS).
+"""
+
+
+def urls_unit(context, unit):
+	month = unit["period"]
+	context["headlines"][month] += unit["headlines"]
+	add_counts(context["results"]["monthly_url_count"][month], unit["urls"])
+
+
+def wordcount_unit(context, unit):
+	only_legit_words = strprocutil.wordcloud_preproc(
+		unit_view(context, unit, "preproc")
 	)
-	monthly_sgrank = defaultdict(lambda: defaultdict(lambda: 0))
-	monthly_textrank = defaultdict(lambda: defaultdict(lambda: 0))
-	monthly_statistics = defaultdict(lambda: defaultdict(lambda: []))
-	# Same data as above but only for news headlines
-	monthly_wordcloud_hl = defaultdict(lambda: defaultdict(lambda: 0))
-	monthly_sgrank_hl = defaultdict(lambda: defaultdict(lambda: 0))
-	monthly_textrank_hl = defaultdict(lambda: defaultdict(lambda: 0))
-
-	for g, gset in mess_dic.items():
-		for name, person_posts in gset.items():
-			for year, annual_posts in person_posts.items():
-				for month, monthly_posts in annual_posts.items():
-					y_m_str = str(year) + "-"
-					if int(month) < 10:
-						y_m_str += ("0" + str(month))
-					else:
-						y_m_str += str(month)
-					for _, daily_posts in monthly_posts.items():
-						for _, post_list in daily_posts.items():
-							# Step 1
-							url_dic, headlines, posts = strprocutil.extract_urls(post_list, False)
-							news_headlines_monthly[y_m_str] += headlines
-							for url, count in url_dic.items():
-								url_count_monthly[y_m_str][url] += count
-							# Step 2
-							preproc_posts = strprocutil.preproc_posts(posts)
-							# Step 3
-							only_legit_words = strprocutil.wordcloud_preproc(preproc_posts)
-							wordcount_generator(only_legit_words, monthly_wordcloud, name, y_m_str)
-							# Steps 4 & 5
-							keyterm_stats_generator(
-								preproc_posts, en, monthly_sgrank, monthly_textrank,
-								monthly_statistics, y_m_str, stats_config
-							)
-	# Step 6
-	for month, headlines in news_headlines_monthly.items():
-		only_legit_words_hl = strprocutil.wordcloud_preproc(headlines)
-		wordcount_generator(only_legit_words_hl, monthly_wordcloud_hl, None, month)
-		keyterm_stats_generator(
-			headlines, en, monthly_sgrank_hl, monthly_textrank_hl,
-			None, month, stats_config
-		)
-	# Step 7
-	return collect_results(
-		url_count_monthly, monthly_wordcloud, monthly_sgrank, monthly_textrank,
-		monthly_statistics, monthly_wordcloud_hl, monthly_sgrank_hl,
-		monthly_textrank_hl
+	wordcount_generator(
+		only_legit_words, context["results"]["monthly_wordcloud"],
+		unit["partner"], unit["period"]
 	)
 
 
-def count_comments(comm_dic, en, count_config, username=""):
-	post_count_res_date = defaultdict(
-		lambda: defaultdict(
-			lambda: defaultdict(lambda: defaultdict(lambda: {}))
+def month_posts_unit(context, unit):
+	if "collected" not in unit:
+		unit["collected"] = True
+		context["posts"][unit["period"]] += unit_view(context, unit, "preproc")
+		context["post_rows"][unit["period"]] += \
+			unit_view(context, unit, "preproc_rows")
+
+
+def keyterms_finish(context):
+	r_dic = context["results"]
+	for month, posts in context["posts"].items():
+		add_keyterms(
+			month_results(context, month), r_dic["monthly_sgrank"],
+			r_dic["monthly_textrank"], month
 		)
-	)
-	post_count_res_name = defaultdict(
-		lambda: defaultdict(
-			lambda: defaultdict(lambda: defaultdict(lambda: {}))
+
+
+def readability_finish(context):
+	for month, posts in context["posts"].items():
+		add_statistics(
+			context["post_rows"][month], posts, month_results(context, month),
+			context["results"]["monthly_statistics"], month
 		)
-	)
-	return_dic = {
-		"sorted_by_date": post_count_res_date,
-		"sorted_by_name": post_count_res_name,
-	}
-	for g, gset in comm_dic.items():
-		for target, pset in gset.items():
-			if target == "Own":
-				count_comments_helper(
-					pset, en, return_dic, username, g, count_config
-				)
+
+
+def count_stats_unit(context, unit):
+	counts = context["counts"]
+	texts = unit["texts"]
+	names = context["table"]["names"]
+	group_name_col = context["table"]["group_name"]
+	for key, positions in unit_view(context, unit, "groups"):
+		posts = [texts[pos] for pos in positions]
+		rows = [unit["rows"][pos] for pos in positions]
+		if context["category"] == "comments":
+			g, is_reply = key
+			group = posttable.GROUPS[g]
+			if group == "NonGroup":
+				gstrs = group
 			else:
-				for name, person_posts in pset.items():
-					count_comments_helper(
-						person_posts, en, return_dic, name, g, count_config, t=target
-					)
-	return return_dic
+				gstrs = [
+					names[group_name_col[unit["rows"][pos]]] or "Other Group"
+					for pos in positions
+				]
+			count_stats_generator(
+				posts, rows, context["pending"], counts["sorted_by_date"],
+				counts["sorted_by_name"], len(positions), unit["period"],
+				unit["partner"], context["count_config"], g_name=gstrs,
+				t_name="Replies" if is_reply else "Comments"
+			)
+		elif context["category"] == "messages":
+			count_stats_generator(
+				posts, rows, context["pending"], counts["sorted_by_date"],
+				counts["sorted_by_name"], len(positions), unit["period"],
+				unit["partner"], context["count_config"],
+				isgroup=posttable.GROUPS[key]
+			)
+		else:
+			count_stats_generator(
+				posts, rows, context["pending"], counts["sorted_by_date"],
+				counts["sorted_by_name"], len(positions), unit["period"],
+				unit["partner"], context["count_config"]
+			)
+
+
+def count_stats_finish(context):
+	count_text_stats(context["pending"])
+	context["pending"] = []
+
+
+CONSUMERS = {
+	"urls": {"unit": urls_unit, "finish": None, "model": False},
+	"wordcount": {"unit": wordcount_unit, "finish": None, "model": False},
+	"keyterms": {
+		"unit": month_posts_unit, "finish": keyterms_finish, "model": True
+	},
+	"readability": {
+		"unit": month_posts_unit, "finish": readability_finish, "model": True
+	},
+	"count_stats": {
+		"unit": count_stats_unit, "finish": count_stats_finish, "model": False
+	},
+}
+
+ANALYSIS_CONSUMERS = ["urls", "wordcount", "keyterms", "readability"]
+COUNT_CONSUMERS = ["count_stats"]
 
 
 """
-	Extension of the analyze_comments() above for clarity.
+	Returns the key term and text statistics results of the preprocessed posts
+	of a month, in the same order as the posts, computing them on first use.
+"""
+
 
-	Steps of this function:
-	1. Extract URLs and headlines (if any) from those URLS. Pool those URLs
-	and headlines together in a monthly dictionary for later analysis.
-	2. Obtain a list of posts with said URLs and long words pruned out.
-	3. Obtain a wordcount per user per month (do not count stopwords or
-	symbols, punctuations, and emoji for this step. All words must be
-	lower-case)
-	4. Obtain keywords per month (keyword per user feature is not supported yet)
-	5. Obtain relevant statistical values in monthly format (so that monthly
-	averages and global averages can be computed at the very end).
-	6. Repeat the above for monthly headlines.
-	7. Return the results dictionary.
+def month_results(context, month):
+	if month not in context["month_results"]:
+		context["month_results"][month] = list(post_results(
+			context["posts"][month], context["en"], context["stats_config"],
+			"keyterms", keyterm_settings(context["stats_config"]), keyterm_result
+		))
+	return context["month_results"][month]
+
+
+"""
+	Walk the posts of a category once with the given consumers. Returns the
+	traversal context with the results (see new_context()).
+
+	Finally, the consumers also analyze the news headlines of every month:
+	"wordcount" counts their words and "keyterms" extracts their key terms.
+	This is done once the headlines of all shards have been collected.
+
+	If a pool of worker processes is given (see run()), the shards are split
+	into tasks of consecutive shards that are traversed in parallel, and so
+	are the months of the headlines. The results of all tasks are merged in
+	order, so they are the same as when everything is analyzed in this process.
 """
 
 
-def count_comments_helper(
-	comm_dic, en, r_dic, name, group, count_config, t=None
+def process_category(
+	table, index, category, consumers, en, stats_config, count_config, pool=None,
+	sketch_sizes=None
 ):
-	if t == "Replies":
-		tstr = t
+	shards = list(
+		posttable.iter_partner_buckets(table, index, category, "period")
+	)
+	context = new_context(
+		table, category, consumers, en, stats_config, count_config, sketch_sizes
+	)
+	if pool is None:
+		traverse(context, shards)
 	else:
-		tstr = "Comments"
-	for year, annual_posts in comm_dic.items():
-		for month, monthly_posts in annual_posts.items():
-			y_m_str = str(year) + "-"
-			if int(month) < 10:
-				y_m_str += ("0" + str(month))
-			else:
-				y_m_str += str(month)
-			for _, daily_posts in monthly_posts.items():
-				for _, post_list in daily_posts.items():
-					if group == "NonGroup":
-						gstrs = group
-					else:
-						gstrs = [p.get("Group name", "Other Group") for p in post_list]
-					_, _, posts = strprocutil.extract_urls(post_list, True)
-					count_stats_generator(
-						posts, en, r_dic["sorted_by_date"], r_dic["sorted_by_name"],
-						len(post_list), y_m_str, name, count_config, g_name=gstrs,
-						t_name=tstr
-					)
-
-
-"""
-	Returns two dictionaries - one ordered by date, another ordered by username.
-	First, remove urls and preprocess text, then simply count number of posts
-	and do very basic statistics generation such as word count, character count,
-	or even sentiment detection.
-"""
-
-
-def count_posts(post_dic, en, count_config, username=""):
-	post_count_res_date = defaultdict(lambda: defaultdict(lambda: {}))
-	post_count_res_name = defaultdict(lambda: defaultdict(lambda: {}))
-	for name, person_posts in post_dic.items():
-		for year, annual_posts in person_posts.items():
-			for month, monthly_posts in annual_posts.items():
-				y_m_str = str(year) + "-"
-				if int(month) < 10:
-					y_m_str += ("0" + str(month))
-				else:
-					y_m_str += str(month)
-				for _, daily_posts in monthly_posts.items():
-					for _, post_list in daily_posts.items():
-						_, _, posts = strprocutil.extract_urls(post_list, False)
-						count_stats_generator(
-							posts, en, post_count_res_date, post_count_res_name,
-							len(post_list), y_m_str, name, count_config
-						)
+		tasks = split_tasks(
+			shards, [len(rows) for _, _, rows in shards], stats_config["Workers"]
+		)
+		partials = workerpool.imap(
+			pool, traverse_task, [(category, consumers, task) for task in tasks]
+		)
+		for partial in partials:
+			worker_results(partial)
+			for key in ["results", "counts", "headlines"]:
+				merge_results(context[key], partial[key])
+	months = list(context["headlines"].items())
+	if "urls" not in consumers or len(months) == 0:
+		return context
+	if pool is None:
+		partials = [{"results": analyze_headlines(
+			months, en, stats_config, consumers, sketch_sizes
+		)}]
+	else:
+		tasks = split_tasks(
+			months, [len(headlines) for _, headlines in months], stats_config["Workers"]
+		)
+		partials = workerpool.imap(
+			pool, analyze_headlines_task, [(consumers, task) for task in tasks]
+		)
+	for partial in partials:
+		if pool is not None:
+			worker_results(partial)
+		merge_results(context["results"], partial["results"])
+	return context
+
+
+"""
+	Analyze the news headlines of a list of (month, headlines) pairs. Returns
+	the results dictionary of the headlines.
+"""
+
+
+def analyze_headlines(months, en, stats_config, consumers, sketch_sizes=None):
+	r_dic = new_result_dic(sketch_sizes)
+	for month, headlines in months:
+		if "wordcount" in consumers:
+			only_legit_words_hl = strprocutil.wordcloud_preproc(headlines)
+			wordcount_generator(
+				only_legit_words_hl, r_dic["monthly_wordcloud_hl"], None, month
+			)
+		if "keyterms" in consumers:
+			results = post_results(
+				headlines, en, stats_config, "keyterms",
+				keyterm_settings(stats_config), keyterm_result
+			)
+			add_keyterms(
+				results, r_dic["monthly_sgrank_hl"], r_dic["monthly_textrank_hl"], month
+			)
+	return r_dic
+
+
+"""
+	Split items into about count tasks of consecutive items, each with about
+	the same total size. Since every task covers consecutive items, merging
+	the results of the tasks in order gives the same results, in the same
+	order, as processing all items at once.
+"""
+
+
+def split_tasks(items, sizes, count):
+	total = sum(sizes)
+	tasks = []
+	task = []
+	task_size = 0
+	for item, size in zip(items, sizes):
+		task.append(item)
+		task_size += size
+		if task_size * count >= total:
+			tasks.append(task)
+			task = []
+			task_size = 0
+	if len(task) > 0:
+		tasks.append(task)
+	return tasks
+
+
+"""
+	Add the results dictionary src into dst, e.g. a dictionary as returned by
+	new_result_dic(). Counts are added up, and top-k sketches and statistic
+	accumulators are merged. Fields missing from a regular dictionary in dst are
+	copied over from src.
+"""
+
+
+def merge_results(dst, src):
+	for key, value in src.items():
+		if topk.is_sketch(value) and (key in dst or isinstance(dst, defaultdict)):
+			topk.merge(dst[key], value)
+		elif statacc.is_accumulator(value) and \
+			(key in dst or isinstance(dst, defaultdict)):
+			statacc.merge(dst[key], value)
+		elif isinstance(value, dict) and \
+			(key in dst or isinstance(dst, defaultdict)):
+			merge_results(dst[key], value)
+		elif key in dst:
+			dst[key] += value
+		else:
+			dst[key] = value
+
+
+"""
+	Convert nested defaultdicts into regular dictionaries, which unlike the
+	lambdas of new_result_dic() can be sent back from a worker process.
+"""
+
+
+def plain_dict(dic):
 	return {
-		"sorted_by_date": post_count_res_date,
-		"sorted_by_name": post_count_res_name,
+		key: plain_dict(value) if isinstance(value, dict) else value
+		for key, value in dic.items()
 	}
 
 
 """
-	Returns two dictionaries - one ordered by date, another ordered by username.
-	Both dictionaries will separate results between group messages and individual
-	messages. First, remove urls and preprocess text, then simply count number
-	of posts and do very basic statistics generation such as word count, character
-	count, or even sentiment detection.
+	Map the word ids in the results of a worker task to the ids of the
+	vocabulary of this process, in place, and add the cache hits and misses of
+	the task to the counters of this process.
 """
 
 
-def count_messages(mess_dic, en, count_config, username=""):
-	post_count_res_date = defaultdict(
-		lambda: defaultdict(lambda: defaultdict(lambda: {}))
+def worker_results(partial):
+	ids = vocabulary.id_map(partial["words"])
+	map_word_counts(
+		partial["results"], lambda counter: vocabulary.remap_counts(counter, ids)
 	)
-	post_count_res_name = defaultdict(
-		lambda: defaultdict(lambda: defaultdict(lambda: {}))
+	nlpmodels.add_doc_cache_stats(partial["cache_stats"]["doc_cache"])
+	resultcache.add_result_cache_stats(partial["cache_stats"]["result_cache"])
+
+
+"""
+	Returns the hit and miss counters of the caches of this process.
+"""
+
+
+def cache_stats():
+	return {
+		"doc_cache": nlpmodels.doc_cache_stats(),
+		"result_cache": resultcache.result_cache_stats(),
+	}
+
+
+"""
+	Returns the cache hits and misses since before, the cache_stats() at the
+	start of a worker task. Workers are forked with the counters of the main
+	process, so only the hits and misses of the task itself are sent back.
+"""
+
+
+def cache_stats_since(before):
+	return {
+		cache: {key: count - before[cache][key] for key, count in stats.items()}
+		for cache, stats in cache_stats().items()
+	}
+
+
+# Post table and settings of an analysis worker process, set by
+# init_analysis_worker().
+worker_state = {}
+
+
+"""
+	Initializer of the analysis worker processes. Workers are forked from the
+	main process (see the workerpool module), so the table and the loaded spaCy
+	model are inherited instead of being copied. The model is only needed if
+	load_model is set (see needs_model()).
+"""
+
+
+def init_analysis_worker(
+	table, stats_config, count_config, sketch_sizes, load_model=True
+):
+	worker_state["table"] = table
+	worker_state["stats_config"] = stats_config
+	worker_state["count_config"] = count_config
+	worker_state["sketch_sizes"] = sketch_sizes
+	worker_state["en"] = nlpmodels.get_model() if load_model else None
+
+
+def traverse_task(task):
+	category, consumers, shards = task
+	before = cache_stats()
+	context = traverse(new_context(
+		worker_state["table"], category, consumers, worker_state["en"],
+		worker_state["stats_config"], worker_state["count_config"],
+		worker_state["sketch_sizes"]
+	), shards)
+	return {
+		"results": plain_dict(context["results"]),
+		"counts": plain_dict(context["counts"]),
+		"headlines": plain_dict(context["headlines"]),
+		"words": vocabulary.words(),
+		"cache_stats": cache_stats_since(before),
+	}
+
+
+def analyze_headlines_task(task):
+	consumers, months = task
+	before = cache_stats()
+	results = analyze_headlines(
+		months, worker_state["en"], worker_state["stats_config"], consumers,
+		worker_state["sketch_sizes"]
 	)
-	for g, gset in mess_dic.items():
-		for name, person_posts in gset.items():
-			for year, annual_posts in person_posts.items():
-				for month, monthly_posts in annual_posts.items():
-					y_m_str = str(year) + "-"
-					if int(month) < 10:
-						y_m_str += ("0" + str(month))
-					else:
-						y_m_str += str(month)
-					for _, daily_posts in monthly_posts.items():
-						for _, post_list in daily_posts.items():
-							_, _, posts = strprocutil.extract_urls(post_list, False)
-							count_stats_generator(
-								posts, en, post_count_res_date, post_count_res_name,
-								len(post_list), y_m_str, name, count_config, isgroup=g
-							)
 	return {
-		"sorted_by_date": post_count_res_date,
-		"sorted_by_name": post_count_res_name,
+		"results": plain_dict(results),
+		"words": vocabulary.words(),
+		"cache_stats": cache_stats_since(before),
 	}
 
 
-SUB_DIRECTORIES_FUNC_ANALYZE = {
-	"comments": analyze_comments,
-	"messages": analyze_messages,
-	"posts": analyze_posts,
-}
+"""
+	Comments on the user's own posts are stored under the username in the post
+	table, so they are analyzed together with the user's replies to themselves.
+	Unlike posts and messages, all result fields are returned even if empty.
+"""
 
-SUB_DIRECTORIES_FUNC_COUNT = {
-	"comments": count_comments,
-	"messages": count_messages,
-	"posts": count_posts,
-}
+
+def category_results(category, r_dic):
+	word_results(r_dic)
+	sketch_results(category, r_dic)
+	if category == "comments":
+		return r_dic
+	return collect_results(r_dic)
 
 
 """
-	analyze() through all posts contained in the master_dic. Further divided
-	into analyze_comments(), analyze_posts(), and analyze_messages()
+	Walk all posts of the given categories in the post table once, feeding
+	them to the given consumers (see CONSUMERS). Returns the traversal context
+	of each category (see new_context()).
+
+	stats_config is the "Analyzer_config" section of the config file, which
+	also holds the spaCy batch settings (see nlpmodels.pipe()) and the number
+	of worker processes. count_config is the "Count_config" section, needed
+	by the "count_stats" consumer. The spaCy model is loaded once and shared
+	by all consumers through the nlpmodels registry, unless none of the
+	consumers needs it (e.g. post_counts()). wordcloud_config is the
+	"SMAKstats_config" section, which sizes the top-k sketches if the
+	"Sketch_factor" field of stats_config is set (see sketch_capacities()).
 """
 
 
-def analyze(master_dic, username, stats_config):
-	en = textacy.load_spacy_lang("en_core_web_sm", disable=("parser",))
-	result_dic = {}
-	for sub in SUB_DIRECTORIES_FUNC_ANALYZE.keys():
-		print("Analyzing directory", sub)
-		result_dic[sub] = SUB_DIRECTORIES_FUNC_ANALYZE[sub](
-			master_dic[sub], en, stats_config, username
+def run(
+	table, index, categories, consumers, stats_config, count_config=None,
+	wordcloud_config=None
+):
+	load_model = needs_model(consumers)
+	en = nlpmodels.get_model() if load_model else None
+	sketch_sizes = sketch_capacities(stats_config, wordcloud_config)
+	workers = stats_config.get("Workers", 0)
+	pool = None
+	if workers > 1:
+		# Warm the model up before forking, so that the workers share its
+		# pages instead of each one loading and initializing its own copy.
+		if load_model:
+			nlpmodels.warm_model(en)
+		start = time.perf_counter()
+		pool = workerpool.start_pool(
+			workers, init_analysis_worker,
+			(table, stats_config, count_config, sketch_sizes, load_model)
 		)
-	return result_dic
+		print("Started {} analysis workers in {:.2f}s".format(
+			workers, time.perf_counter() - start
+		))
+	contexts = {}
+	try:
+		for sub in categories:
+			print("Analyzing directory", sub)
+			start = time.perf_counter()
+			contexts[sub] = process_category(
+				table, index, sub, consumers, en, stats_config, count_config, pool,
+				sketch_sizes
+			)
+			report_throughput(index, sub, start)
+	finally:
+		if pool is not None:
+			workerpool.stop_pool(pool)
+	if load_model:
+		nlpmodels.report_doc_cache()
+		resultcache.report_result_cache()
+	return contexts
+
+
+"""
+	Returns True iff any of the given consumers needs the spaCy model.
+"""
+
+
+def needs_model(consumers):
+	return any(CONSUMERS[consumer]["model"] for consumer in consumers)
+
+
+"""
+	analyze() through all posts of the given categories in the post table.
+	Returns the key terms, word counts, URL counts and text statistics of
+	each category.
+"""
+
+
+def analyze(
+	table, index, username, stats_config, categories, wordcloud_config=None
+):
+	contexts = run(
+		table, index, categories, ANALYSIS_CONSUMERS, stats_config,
+		wordcloud_config=wordcloud_config
+	)
+	return {
+		sub: category_results(sub, context["results"])
+		for sub, context in contexts.items()
+	}
 
 
 """
-	Parse through master_dic to do basic post counting and/or basic word-related
-	statistics analysis for each entity interacted with. Returns a dictionary
-	with data such as person whom the user interacted with the most in a given
-	month, user with most word/character count, or global statistics across
-	all users in a group, etc. All results are sorted by year-month units.
+	Parse through the post table to do basic post counting and/or basic
+	word-related statistics analysis for each entity interacted with. Returns a
+	dictionary with data such as person whom the user interacted with the most
+	in a given month, user with most word/character count, or global statistics
+	across all users in a group, etc. All results are sorted by year-month
+	units. Comments are further split by group and by comments/replies, and
+	messages by group/individual messages.
+
+	pipe_config is the "Analyzer_config" section of the config file, which
+	holds the number of worker processes. The counts need no spaCy model.
 
 	TODO: Future implement - sentiment detection.
 """
 
 
-def post_counts(master_dic, username, sub_directories, count_config):
-	en = textacy.load_spacy_lang("en_core_web_sm", disable=("parser",))
+def post_counts(
+	table, index, username, categories, count_config, pipe_config=None
+):
+	if pipe_config is None:
+		pipe_config = {}
+	contexts = run(
+		table, index, categories, COUNT_CONSUMERS, pipe_config, count_config
+	)
+	return {sub: context["counts"] for sub, context in contexts.items()}
+
+
+"""
+	Both analyze() and post_counts() in a single walk through the post table.
+	Returns the analysis results and the post counts.
+"""
+
+
+def analyze_and_count(
+	table, index, username, categories, stats_config, count_config,
+	wordcloud_config=None
+):
+	contexts = run(
+		table, index, categories, ANALYSIS_CONSUMERS + COUNT_CONSUMERS,
+		stats_config, count_config, wordcloud_config
+	)
 	result_dic = {}
-	for sub in SUB_DIRECTORIES_FUNC_COUNT.keys():
-		print("Counting in directory", sub)
-		result_dic[sub] = SUB_DIRECTORIES_FUNC_COUNT[sub](
-			master_dic[sub], en, count_config, username
-		)
-	return result_dic
+	count_dic = {}
+	for sub, context in contexts.items():
+		result_dic[sub] = category_results(sub, context["results"])
+		count_dic[sub] = context["counts"]
+	return result_dic, count_dic
+
+
+# Suffixes of the statistics that refer to a single post, as a (post id,
+# value) pair (see statacc.summary()).
+POST_STAT_SUFFIXES = ("_max", "_min", "_only")
 
 
 """
-	Helper method to generate word count in a list of posts.
+	Returns a copy of dic, the results of analyze() or post_counts() as parsed
+	by smakstats, with the post ids of its statistics replaced by the text of
+	the posts, as it was analyzed. Post ids are rows of table. view is
+	"analysis" for the results of analyze() and "count" for the results of
+	post_counts(), since the analysis also preprocesses the posts.
+
+	Only the statistics that show a post are resolved, once the results are
+	written, so that the text of a post is never copied into the results.
+"""
+
+
+def resolve_posts(table, dic, view):
+	resolved = {}
+	for key, value in dic.items():
+		if isinstance(value, dict):
+			resolved[key] = resolve_posts(table, value, view)
+		elif isinstance(key, str) and key.endswith(POST_STAT_SUFFIXES) and \
+			isinstance(value, tuple):
+			resolved[key] = (post_text(table, value[0], view), value[1])
+		else:
+			resolved[key] = value
+	return resolved
+
+
+def post_text(table, row, view):
+	_, _, texts = strprocutil.extract_urls(
+		[{"post": posttable.get_text(table, row)}], True
+	)
+	if view == "count":
+		return texts[0]
+	return strprocutil.preproc_posts(texts)[0]
+
+
+"""
+	Print the number of posts of a category processed per second since start.
+"""
+
+
+def report_throughput(index, category, start):
+	elapsed = time.perf_counter() - start
+	count = posttable.category_row_count(index, category)
+	rate = count / elapsed if elapsed > 0 else float("inf")
+	print("Processed {} {} in {:.2f}s ({:.0f} posts/s)".format(
+		count, category, elapsed, rate
+	))
+
+
+"""
+	Helper method to generate word count in a list of posts. Words are counted
+	by their ids in the vocabulary module, and only mapped back to words once
+	the analysis is done (see word_results()).
 """
 
 
 def wordcount_generator(posts, monthly_wordcloud, name, y_m_str):
-	for post in posts:
-		wordlist = post.split()
-		wordset = set(wordlist)
-		for individual_word in wordset:
-			if name is not None:
-				monthly_wordcloud[name][y_m_str][individual_word] += \
-					wordlist.count(individual_word)
-			else:
-				monthly_wordcloud[y_m_str][individual_word] += \
-					wordlist.count(individual_word)
+	if name is not None:
+		counter = monthly_wordcloud[name][y_m_str]
+	else:
+		counter = monthly_wordcloud[y_m_str]
+	# Splitting the joined posts gives the words of all posts at once.
+	words = " ".join(posts).split()
+	if topk.is_sketch(counter):
+		shard_counter = Counter()
+		vocabulary.count_words(shard_counter, words)
+		topk.update_counts(counter, shard_counter)
+	else:
+		vocabulary.count_words(counter, words)
+
+
+# Fields of the results dictionary whose counters are keyed by vocabulary ids.
+WORDCLOUD_FIELDS = ["monthly_wordcloud", "monthly_wordcloud_hl"]
 
 
 """
-	Helper method to collect key terms from a list of posts
+	Apply func to every word counter of a results dictionary, in place.
 """
 
 
-def keyterm_stats_generator(
-	posts, en, monthly_sgrank, monthly_textrank, monthly_statistics, y_m_str,
-	stats_config
-):
-	sgrank_ngram = tuple(stats_config["SGrank_ngram"])
+def map_word_counts(r_dic, func):
+	for field in WORDCLOUD_FIELDS:
+		if field in r_dic:
+			r_dic[field] = map_leaves(r_dic[field], COUNTER_FIELDS[field][0], func)
+
+
+def map_leaves(dic, depth, func):
+	if depth == 0:
+		if topk.is_sketch(dic):
+			return topk.map_counts(dic, func)
+		return func(dic)
+	return {key: map_leaves(value, depth - 1, func) for key, value in dic.items()}
+
+
+"""
+	Returns a results dictionary with its word counts mapped from vocabulary
+	ids back to words. Top-k sketches keep their error bounds.
+"""
+
+
+def word_results(r_dic):
+	map_word_counts(r_dic, vocabulary.word_counts)
+	return r_dic
+
+
+"""
+	Replace the top-k sketches of a results dictionary with their counts, in
+	place, and add the error bound of the counts of every field and month as
+	"monthly_sketch_error" ({month: {field: bound}}). The bounds of all people
+	are added up, so they also bound the counts of every single person, and
+	the counts of any longer period. Prints the largest bounds of the
+	category. Does nothing if no sketches are used.
+"""
+
+
+def sketch_results(category, r_dic):
+	errors = defaultdict(lambda: defaultdict(lambda: 0))
+	largest = {}
+	for field, (depth, _) in COUNTER_FIELDS.items():
+		if field not in r_dic:
+			continue
+		name = field[len("monthly_"):]
+		for path, counter in iter_leaves(r_dic[field], depth):
+			if not topk.is_sketch(counter):
+				continue
+			bound = topk.error_bound(counter)
+			errors[path[-1]][name] += bound
+			largest[name] = max(largest.get(name, 0), bound)
+		if name in largest:
+			r_dic[field] = sketch_counts(r_dic[field], depth)
+	if len(largest) == 0:
+		return
+	r_dic["monthly_sketch_error"] = errors
+	print("Top-k sketches of {}, largest error bound per bucket: {}".format(
+		category, ", ".join(
+			"{} {}".format(name, bound) for name, bound in largest.items()
+		)
+	))
+
+
+def sketch_counts(dic, depth):
+	if depth == 0:
+		return dic.counts
+	return {key: sketch_counts(value, depth - 1) for key, value in dic.items()}
+
+
+def iter_leaves(dic, depth, path=()):
+	if depth == 0:
+		yield path, dic
+		return
+	for key, value in dic.items():
+		yield from iter_leaves(value, depth - 1, path + (key,))
+
+
+"""
+	Returns the settings of the key term extraction, read from stats_config.
+"""
+
+
+def keyterm_settings(stats_config):
+	sgrank_ngram = list(stats_config["SGrank_ngram"])
 	sgrank_norm = stats_config["SGrank_norm"]
 	sgrank_top_count = stats_config["SGrank_top_count"]
 	sgrank_top_ratio = stats_config["SGrank_top_ratio"]
@@ -507,76 +1042,152 @@ def keyterm_stats_generator(
 		sgrank_norm = None
 	if textrank_norm == "":
 		textrank_norm = None
+	return {
+		"sgrank_ngram": sgrank_ngram,
+		"sgrank_norm": sgrank_norm,
+		"sgtopn": sgtopn,
+		"textrank_norm": textrank_norm,
+		"trtopn": trtopn,
+	}
+
+
+"""
+	Helper methods to add the results of keyterm_result() for a list of posts
+	to the monthly dictionaries, post by post: the key terms, and the text
+	statistics. Statistics refer to posts by their ids (rows of the post
+	table), see resolve_posts().
+"""
+
+
+def add_keyterms(results, monthly_sgrank, monthly_textrank, y_m_str):
 	stopword_list = strprocutil.load_stopwords()
-	for i in range(len(posts)):
-		post = posts[i]
-		# Use only lower case for keyterm extraction. Leave case alone for
-		# everything else.
-		curdoc = textacy.make_spacy_doc(post.lower(), lang=en)
-		curdoc_kt = textacy.make_spacy_doc(post, lang=en)
-		curdoc_ranks_sg = textacy.ke.sgrank(
-			curdoc_kt, ngrams=sgrank_ngram, normalize=sgrank_norm, topn=sgtopn
-		)
-		curdoc_ranks_tr = textacy.ke.textrank(
-			curdoc_kt, normalize=textrank_norm, topn=trtopn
-		)
-		for word in curdoc_ranks_sg:
-			if word[0] not in stopword_list:
-				monthly_sgrank[y_m_str][word[0]] += 1
-		for word in curdoc_ranks_tr:
-			if word[0] not in stopword_list:
-				monthly_textrank[y_m_str][word[0]] += 1
-
-		if monthly_statistics is None:
-			continue
+	sgrank_counts = Counter()
+	textrank_counts = Counter()
+	for result in results:
+		for word in result["sgrank"]:
+			if word not in stopword_list:
+				sgrank_counts[word] += 1
+		for word in result["textrank"]:
+			if word not in stopword_list:
+				textrank_counts[word] += 1
+	if len(sgrank_counts) > 0:
+		add_counts(monthly_sgrank[y_m_str], sgrank_counts)
+	if len(textrank_counts) > 0:
+		add_counts(monthly_textrank[y_m_str], textrank_counts)
+
+
+def add_statistics(rows, posts, results, monthly_statistics, y_m_str):
+	for row, post, result in zip(rows, posts, results):
+		stats = monthly_statistics[y_m_str]
+		statacc.add(stats["wordcount"], row, result["wordcount"])
+		statacc.add(stats["sylcount"], row, result["sylcount"])
+		statacc.add(stats["charcount"], row, len(post))
+		statacc.add(stats["entropy"], row, result["entropy"])
+		# These statistics are only meaningful on longer sentences.
+		for stat in ["fkgl", "fre", "clix", "lixl"]:
+			if stat in result:
+				statacc.add(stats[stat], row, result[stat])
 
-		ts = textacy.TextStats(curdoc)
-		monthly_statistics[y_m_str]["wordcount"].append((post, ts.n_words))
-		monthly_statistics[y_m_str]["sylcount"].append((post, ts.n_syllables))
-		monthly_statistics[y_m_str]["charcount"].append((post, len(post)))
-		monthly_statistics[y_m_str]["entropy"].append((post, ts.entropy))
-
-		meaningful_words = strprocutil.gibberishremove(post)
-		newdoc = textacy.make_spacy_doc(meaningful_words.lower(), lang=en)
-		ns = textacy.TextStats(newdoc)
-		if len(newdoc) > 2:
-			# These statistics are only meaningful on longer sentences.
-			try:
-				monthly_statistics[y_m_str]["fkgl"].append(
-					(post, ns.flesch_kincaid_grade_level)
-				)
-			except ZeroDivisionError:
-				pass
-			try:
-				monthly_statistics[y_m_str]["fre"].append(
-					(post, ns.flesch_reading_ease)
-				)
-			except ZeroDivisionError:
-				pass
-			try:
-				monthly_statistics[y_m_str]["clix"].append(
-					(post, ns.coleman_liau_index)
-				)
-			except ZeroDivisionError:
-				pass
-			try:
-				monthly_statistics[y_m_str]["lixl"].append((post, ns.lix))
-			except ZeroDivisionError:
-				pass
-
-
-"""
-	Similar to the keyterm_stats_generator() method above, this is a helper
-	method to collect basic count stats from a list of posts.
+
+"""
+	Compute the key terms and text statistics of a single post from its doc.
+	Readability statistics are left out if the post is too short for them.
+"""
+
+
+def keyterm_result(curdoc_kt, en, settings):
+	import textacy
+	import textacy.ke
+
+	curdoc_ranks_sg = textacy.ke.sgrank(
+		curdoc_kt, ngrams=tuple(settings["sgrank_ngram"]),
+		normalize=settings["sgrank_norm"], topn=settings["sgtopn"]
+	)
+	curdoc_ranks_tr = textacy.ke.textrank(
+		curdoc_kt, normalize=settings["textrank_norm"], topn=settings["trtopn"]
+	)
+	# Use only lower case for keyterm extraction. Leave case alone for
+	# everything else.
+	curdoc = nlpmodels.lower_view(en, curdoc_kt)
+	ts = textacy.TextStats(curdoc)
+	result = {
+		"sgrank": [word[0] for word in curdoc_ranks_sg],
+		"textrank": [word[0] for word in curdoc_ranks_tr],
+		"wordcount": ts.n_words,
+		"sylcount": ts.n_syllables,
+		"entropy": ts.entropy,
+	}
+
+	newdoc = nlpmodels.gibberish_view(en, curdoc_kt)
+	ns = textacy.TextStats(newdoc)
+	if len(newdoc) > 2:
+		try:
+			result["fkgl"] = ns.flesch_kincaid_grade_level
+		except ZeroDivisionError:
+			pass
+		try:
+			result["fre"] = ns.flesch_reading_ease
+		except ZeroDivisionError:
+			pass
+		try:
+			result["clix"] = ns.coleman_liau_index
+		except ZeroDivisionError:
+			pass
+		try:
+			result["lixl"] = ns.lix
+		except ZeroDivisionError:
+			pass
+	return result
+
+
+"""
+	Returns the results of result_func(doc, en, settings) for every post, in
+	the same order. If a result cache is set in pipe_config (see the
+	resultcache module), results of the given kind are taken from the cache
+	where possible, and only the remaining posts are parsed. Their results are
+	added to the cache.
+"""
+
+
+def post_results(posts, en, pipe_config, kind, settings, result_func):
+	cache = resultcache.get_cache(pipe_config)
+	if cache is None:
+		for doc in nlpmodels.docs(en, posts, pipe_config):
+			yield result_func(doc, en, settings)
+		return
+	keys = resultcache.result_keys(posts, kind, settings, en)
+	results = resultcache.lookup(cache, keys)
+	missing = {}
+	for key, post in zip(keys, posts):
+		if key not in results:
+			missing[key] = post
+	new_results = {}
+	docs = nlpmodels.docs(en, missing.values(), pipe_config)
+	for key, doc in zip(missing.keys(), docs):
+		new_results[key] = result_func(doc, en, settings)
+	if len(new_results) > 0:
+		resultcache.store(cache, new_results)
+	results.update(new_results)
+	for key in keys:
+		yield results[key]
+
+
+"""
+	This is a helper method to collect basic count stats from a list of posts.
+
+	Posts are counted right away. Each post within the length limits is
+	appended to pending along with its id (its row in rows) and the "stats"
+	dictionaries it belongs to, and the text statistics of all pending posts
+	are computed at once by count_text_stats().
 """
 
 
 def count_stats_generator(
-	posts_all, en, count_date, count_name, post_count, y_m_str, name,
+	posts_all, rows, pending, count_date, count_name, post_count, y_m_str, name,
 	count_config, isgroup=None, g_name=None, t_name=None
 ):
 	if g_name is None or isinstance(g_name, str):
-		posts = [p for p in posts_all if len(p) > 0]
+		posts = [(row, p) for row, p in zip(rows, posts_all) if len(p) > 0]
 		if isgroup is not None:
 			order_by_date = count_date[isgroup][y_m_str][name]
 			order_by_name = count_name[isgroup][name][y_m_str]
@@ -590,22 +1201,14 @@ def count_stats_generator(
 
 		order_by_date["count"] = order_by_date.get("count", 0) + post_count
 		order_by_name["count"] = order_by_name.get("count", 0) + post_count
-		order_by_date["stats"] = order_by_date.get("stats", defaultdict(lambda: []))
-		order_by_name["stats"] = order_by_name.get("stats", defaultdict(lambda: []))
-		for post in posts:
+		order_by_date["stats"] = order_by_date.get("stats", new_stats_dic())
+		order_by_name["stats"] = order_by_name.get("stats", new_stats_dic())
+		for row, post in posts:
 			if length_limit_check(post, count_config):
 				continue
-			curdoc = textacy.make_spacy_doc(post, lang=en)
-			ts = textacy.TextStats(curdoc)
-			wc = (post, ts.n_words)
-			cc = (post, len(post))
-			ey = (post, ts.entropy)
-			order_by_date["stats"]["wordcount"].append(wc)
-			order_by_date["stats"]["charcount"].append(cc)
-			order_by_date["stats"]["entropy"].append(ey)
-			order_by_name["stats"]["wordcount"].append(wc)
-			order_by_name["stats"]["charcount"].append(cc)
-			order_by_name["stats"]["entropy"].append(ey)
+			pending.append(
+				(row, post, (order_by_date["stats"], order_by_name["stats"]))
+			)
 
 	else:
 		# g_name is in the form of a list. We'll need to carefully sort through
@@ -619,19 +1222,61 @@ def count_stats_generator(
 			order_by_name["count"] = order_by_name.get("count", 0) + 1
 			if length_limit_check(post, count_config):
 				continue
-			order_by_date["stats"] = order_by_date.get("stats", defaultdict(lambda: []))
-			order_by_name["stats"] = order_by_name.get("stats", defaultdict(lambda: []))
-			curdoc = textacy.make_spacy_doc(post, lang=en)
-			ts = textacy.TextStats(curdoc)
-			wc = (post, ts.n_words)
-			cc = (post, len(post))
-			ey = (post, ts.entropy)
-			order_by_date["stats"]["wordcount"].append(wc)
-			order_by_date["stats"]["charcount"].append(cc)
-			order_by_date["stats"]["entropy"].append(ey)
-			order_by_name["stats"]["wordcount"].append(wc)
-			order_by_name["stats"]["charcount"].append(cc)
-			order_by_name["stats"]["entropy"].append(ey)
+			order_by_date["stats"] = order_by_date.get("stats", new_stats_dic())
+			order_by_name["stats"] = order_by_name.get("stats", new_stats_dic())
+			pending.append(
+				(rows[id], post, (order_by_date["stats"], order_by_name["stats"]))
+			)
+
+
+def new_stats_dic():
+	return defaultdict(statacc.new_accumulator)
+
+
+# A word of the count statistics: a run of letters and digits, including
+# inner apostrophes and hyphens (e.g. "don't", "e-mail"). Punctuation and
+# whitespace are not words, as in textacy.TextStats.
+COUNT_WORD_RE = re.compile(r"\w+(?:['\u2019-]\w+)*")
+
+
+"""
+	Compute the word count, character count, and entropy of every post
+	collected by count_stats_generator() and add them to its "stats"
+	dictionaries, in the order the posts were collected.
+
+	These statistics need no tagging or named entities, so the posts are not
+	run through spaCy. Words are found with COUNT_WORD_RE instead of spaCy's
+	tokenizer, which counts contractions such as "don't" as two words.
+"""
+
+
+def count_text_stats(pending):
+	findall = COUNT_WORD_RE.findall
+	for row, post, stats_dics in pending:
+		words = findall(post)
+		entropy = word_entropy(words)
+		for stats in stats_dics:
+			statacc.add(stats["wordcount"], row, len(words))
+			statacc.add(stats["charcount"], row, len(post))
+			statacc.add(stats["entropy"], row, entropy)
+
+
+"""
+	Returns the Shannon entropy in bits of the frequencies of the given words,
+	like textacy.TextStats.entropy.
+"""
+
+
+def word_entropy(words):
+	n_words = len(words)
+	if n_words == 0:
+		return 0.0
+	if len(set(words)) == n_words:
+		# Every word occurs once, which is the case for most short posts.
+		return log2(n_words)
+	return log2(n_words) - sum(
+		count * log2(count) for count in Counter(words).values()
+	) / n_words
 
 
 """
@@ -641,28 +1286,11 @@ def count_stats_generator(
 """
 
 
-def collect_results(
-	url_count_monthly, monthly_wordcloud, monthly_sgrank, monthly_textrank,
-	monthly_statistics, monthly_wordcloud_hl, monthly_sgrank_hl,
-	monthly_textrank_hl
-):
+def collect_results(r_dic):
 	return_dic = {}
-	if len(url_count_monthly.keys()) > 0:
-		return_dic["monthly_url_count"] = url_count_monthly
-	if len(monthly_wordcloud.keys()) > 0:
-		return_dic["monthly_wordcloud"] = monthly_wordcloud
-	if len(monthly_sgrank.keys()) > 0:
-		return_dic["monthly_sgrank"] = monthly_sgrank
-	if len(monthly_textrank.keys()) > 0:
-		return_dic["monthly_textrank"] = monthly_textrank
-	if len(monthly_statistics.keys()) > 0:
-		return_dic["monthly_statistics"] = monthly_statistics
-	if len(monthly_wordcloud_hl.keys()) > 0:
-		return_dic["monthly_wordcloud_hl"] = monthly_wordcloud_hl
-	if len(monthly_sgrank_hl.keys()) > 0:
-		return_dic["monthly_sgrank_hl"] = monthly_sgrank_hl
-	if len(monthly_textrank_hl.keys()) > 0:
-		return_dic["monthly_textrank_hl"] = monthly_textrank_hl
+	for key, value in r_dic.items():
+		if len(value.keys()) > 0:
+			return_dic[key] = value
 	return return_dic
 
 
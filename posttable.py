@@ -0,0 +1,223 @@
+from array import array
+from bisect import bisect_left
+from itertools import chain, groupby
+
+"""
+	Post table module for the Social Media Analytics Kit.
+	Holds every loaded post, comment, and message in a columnar table instead
+	of millions of small dictionaries. Each column is a compact array with one
+	entry per row:
+
+	ts: Timestamp in seconds (int64).
+	category, group, kind: Small integer codes into CATEGORIES, GROUPS, and
+	KINDS, respectively.
+	partner: Code of the person, group, page, or event the user interacted
+	with. Codes index into the table's list of interned names.
+	group_name: Code of the group a comment was made in (0 if none).
+	text: The content of the post itself.
+
+	Derived columns such as "period" are added by the tsconverter module.
+	Analyzers reach rows through a time index keyed by (category, partner),
+	which holds the rows of every key sorted by timestamp so that any window
+	of time can be looked up by bisection.
+
+	@author: DeltaSierra4
+"""
+
+CATEGORIES = ["comments", "messages", "posts"]
+GROUPS = ["NonGroup", "Group"]
+KINDS = ["", "Own", "Other", "Replies", "Regular", "Photo"]
+
+CATEGORY_CODES = {cat: code for code, cat in enumerate(CATEGORIES)}
+GROUP_CODES = {g: code for code, g in enumerate(GROUPS)}
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# Names of the export subdirectories (i.e. the "Post_types" config field) and
+# the categories their rows are stored under.
+SUBDIR_CATEGORIES = {
+	"comments_and_reactions": "comments",
+	"messages": "messages",
+	"posts": "posts",
+}
+
+
+def new_table():
+	return {
+		"ts": array("q"),
+		"category": array("B"),
+		"group": array("B"),
+		"kind": array("B"),
+		"partner": array("l"),
+		"group_name": array("l"),
+		"text": [],
+		# Interned names shared by the partner and group_name columns. Code 0
+		# is reserved for the empty string.
+		"names": [""],
+		"name_codes": {"": 0},
+	}
+
+
+def row_count(table):
+	return len(table["ts"])
+
+
+"""
+	Returns the text of a row. Tables memory-mapped from a snapshot (see the
+	tablesnapshot module) hold all text in one UTF-8 blob instead of a "text"
+	column, and each row is only decoded when it is asked for.
+"""
+
+
+def get_text(table, row):
+	if "text_blob" in table:
+		offsets = table["text_offsets"]
+		return str(
+			table["text_blob"][offsets[row]:offsets[row + 1]], "utf-8", "surrogatepass"
+		)
+	return table["text"][row]
+
+
+"""
+	Returns the code of a name, adding it to the list of names if needed.
+"""
+
+
+def intern_name(table, name):
+	code = table["name_codes"].get(name)
+	if code is None:
+		code = len(table["names"])
+		table["names"].append(name)
+		table["name_codes"][name] = code
+	return code
+
+
+def add_row(table, ts, category, group, kind, partner, group_name, text):
+	table["ts"].append(ts)
+	table["category"].append(CATEGORY_CODES[category])
+	table["group"].append(GROUP_CODES[group])
+	table["kind"].append(KIND_CODES[kind])
+	table["partner"].append(intern_name(table, partner))
+	table["group_name"].append(intern_name(table, group_name))
+	table["text"].append(text)
+
+
+"""
+	Add the compact records produced by jsonloader.parse_comment_file(). Comments
+	on the user's own posts are stored with the username as their partner.
+"""
+
+
+def add_comments(table, records, username):
+	for g, c_type, o_name, ts, post, group_name in records:
+		partner = o_name if o_name else username
+		add_row(table, ts, "comments", g, c_type, partner, group_name, post)
+
+
+"""
+	Add the compact records produced by jsonloader.parse_post_file().
+"""
+
+
+def add_posts(table, records):
+	for name, ts, post, p_type in records:
+		add_row(table, ts, "posts", "NonGroup", p_type, name, "", post)
+
+
+"""
+	Add the compact records produced by jsonloader.parse_message_file().
+"""
+
+
+def add_messages(table, records):
+	for g, name, ts, post in records:
+		add_row(table, ts, "messages", g, "", name, "", post)
+
+
+"""
+	Build the time index of the table, which maps (category, partner) codes to
+	a (timestamps, rows) pair: the rows of that category and partner sorted by
+	timestamp, and their timestamps in the same order. Rows with the same
+	timestamp stay in table order.
+"""
+
+
+def build_index(table):
+	ts_col = table["ts"]
+	category = table["category"]
+	partner = table["partner"]
+	grouped = {}
+	# Sorting once and grouping afterwards keeps the rows of every key sorted.
+	for row in sorted(range(row_count(table)), key=ts_col.__getitem__):
+		key = (category[row], partner[row])
+		rows = grouped.get(key)
+		if rows is None:
+			rows = grouped[key] = array("l")
+		rows.append(row)
+	return {
+		key: (array("q", map(ts_col.__getitem__, rows)), rows)
+		for key, rows in grouped.items()
+	}
+
+
+"""
+	Returns the number of rows of a category in the index.
+"""
+
+
+def category_row_count(index, category):
+	cat_code = CATEGORY_CODES[category]
+	return sum(
+		len(rows) for key, (_, rows) in index.items() if key[0] == cat_code
+	)
+
+
+"""
+	Returns the rows of a given category and partner with timestamps in the
+	[start, end) window, in chronological order. Either end of the window is
+	left open if None. Returns an empty list if there are none.
+"""
+
+
+def window_rows(table, index, category, partner, start=None, end=None):
+	partner_code = table["name_codes"].get(partner)
+	entry = index.get((CATEGORY_CODES[category], partner_code))
+	if entry is None:
+		return []
+	timestamps, rows = entry
+	first = 0 if start is None else bisect_left(timestamps, start)
+	last = len(timestamps) if end is None else bisect_left(timestamps, end)
+	return rows[first:last]
+
+
+"""
+	Iterate through all (partner name, bucket, rows) entries of a category,
+	ordered by partner and bucket, where bucket is the value of one of the date
+	columns added by tsconverter.ts_dt_conv(), e.g. "period" for monthly or
+	"iso_week" for weekly batches. The rows of each batch are in chronological
+	order.
+
+	Columns such as "year", "period", or "iso_week" hardly ever go back in time,
+	so every batch is usually a single slice of the partner's sorted rows.
+"""
+
+
+def iter_partner_buckets(table, index, category, column="period"):
+	cat_code = CATEGORY_CODES[category]
+	names = table["names"]
+	bucket_col = table[column]
+	for key in sorted(key for key in index.keys() if key[0] == cat_code):
+		rows = index[key][1]
+		runs = {}
+		start = 0
+		for bucket, run in groupby(map(bucket_col.__getitem__, rows)):
+			end = start + len(list(run))
+			runs.setdefault(bucket, []).append(rows[start:end])
+			start = end
+		for bucket in sorted(runs.keys()):
+			slices = runs[bucket]
+			if len(slices) == 1:
+				yield names[key[1]], bucket, slices[0]
+			else:
+				# e.g. a DST change that moves the clock back across midnight
+				# at the end of a month.
+				yield names[key[1]], bucket, array("l", chain(*slices))
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+"""
+	Result cache module for the Social Media Analytics Kit.
+	Keeps the NLP results of every post (key terms and text statistics) in a
+	SQLite file, so that later runs only need to run spaCy on posts they have
+	not seen before. Results are keyed by the hash of the post's text, salted
+	with the kind of result, the analyzer settings it depends on, and the
+	versions of the spaCy model and textacy, so that changing any of them
+	simply misses the cache.
+
+	@author: DeltaSierra4
+"""
+
+# Number of keys looked up per query. SQLite limits the number of parameters
+# of a single statement.
+LOOKUP_CHUNK_SIZE = 500
+
+# Caches opened so far, keyed by (process id, path). A connection must not be
+# shared with worker processes forked after it was opened.
+open_caches = {}
+cache_stats = {
+	"hits": 0,
+	"misses": 0,
+}
+
+
+"""
+	Returns the result cache at the "Result_cache_path" field of
+	analyzer_config (the "Analyzer_config" section of the config file),
+	opening it on first use. Returns None if no path is set.
+"""
+
+
+def get_cache(analyzer_config):
+	if analyzer_config is None:
+		return None
+	path = analyzer_config.get("Result_cache_path", "")
+	if path == "":
+		return None
+	key = (os.getpid(), path)
+	if key not in open_caches:
+		# Worker processes write to the same file, so wait for each other's
+		# writes instead of failing.
+		conn = sqlite3.connect(path, timeout=60)
+		conn.execute("PRAGMA journal_mode=WAL")
+		conn.execute(
+			"CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, value TEXT)"
+		)
+		conn.commit()
+		open_caches[key] = conn
+	return open_caches[key]
+
+
+"""
+	Returns the version string of a spaCy model and of textacy, which both
+	affect the cached results.
+"""
+
+
+def model_version(nlp):
+	import textacy
+
+	meta = getattr(nlp, "meta", {})
+	return "{}_{}-{} textacy-{}".format(
+		meta.get("lang", ""), meta.get("name", ""), meta.get("version", ""),
+		getattr(textacy, "__version__", "")
+	)
+
+
+"""
+	Returns the cache keys of texts for results of the given kind (e.g.
+	"keyterms"), which depend on the given settings and on nlp.
+"""
+
+
+def result_keys(texts, kind, settings, nlp):
+	salt = hashlib.blake2b(
+		json.dumps([kind, settings, model_version(nlp)], sort_keys=True).encode(
+			"utf-8"
+		),
+		digest_size=16
+	).digest()
+	return [
+		hashlib.blake2b(
+			text.encode("utf-8", "surrogatepass"), digest_size=16, key=salt
+		).digest()
+		for text in texts
+	]
+
+
+"""
+	Look up keys in cache. Returns a dictionary of the cached results of the
+	keys that were found. Every key counts as either a hit or a miss.
+"""
+
+
+def lookup(cache, keys):
+	found = {}
+	unique_keys = list(set(keys))
+	for start in range(0, len(unique_keys), LOOKUP_CHUNK_SIZE):
+		chunk = unique_keys[start:start + LOOKUP_CHUNK_SIZE]
+		rows = cache.execute(
+			"SELECT key, value FROM results WHERE key IN ({})".format(
+				",".join("?" * len(chunk))
+			),
+			chunk
+		)
+		for key, value in rows:
+			found[key] = json.loads(value)
+	hits = sum(1 for key in keys if key in found)
+	cache_stats["hits"] += hits
+	cache_stats["misses"] += len(keys) - hits
+	return found
+
+
+"""
+	Store a dictionary of results (key: JSON-serializable result) in cache.
+"""
+
+
+def store(cache, results):
+	cache.executemany(
+		"INSERT OR REPLACE INTO results (key, value) VALUES (?, ?)",
+		[(key, json.dumps(value)) for key, value in results.items()]
+	)
+	cache.commit()
+
+
+"""
+	Returns the hit and miss counters of the result cache of this process.
+"""
+
+
+def result_cache_stats():
+	return {"hits": cache_stats["hits"], "misses": cache_stats["misses"]}
+
+
+"""
+	Add the hits and misses of the result cache of a worker process, as
+	returned by result_cache_stats(), to the counters of this process.
+"""
+
+
+def add_result_cache_stats(stats):
+	cache_stats["hits"] += stats["hits"]
+	cache_stats["misses"] += stats["misses"]
+
+
+"""
+	Print the hit rate of the result cache, including the hits and misses of
+	the worker processes.
+"""
+
+
+def report_result_cache():
+	lookups = cache_stats["hits"] + cache_stats["misses"]
+	if lookups == 0:
+		return
+	print("Result cache: {} hits, {} misses ({:.1%} hit rate)".format(
+		cache_stats["hits"], cache_stats["misses"],
+		cache_stats["hits"] / lookups
+	))
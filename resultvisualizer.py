@@ -1,6 +1,4 @@
-from wordcloud import WordCloud, STOPWORDS
 from collections import defaultdict
-import matplotlib.pyplot as plt
 # from PIL import Image
 # import numpy as np
 # import pandas as pd
@@ -13,6 +11,9 @@ import os
 	tables into word clouds depending on the frequency of tokens and creates
 	charts based on frequency of URL citations.
 
+	matplotlib and wordcloud are imported by the functions that draw with
+	them, so they are only loaded once the results are ready to be drawn.
+
 	@author: DeltaSierra4
 """
 
@@ -32,10 +33,13 @@ def wordcloud_gen(result_dic, wordcloud_config, results_dir):
 
 
 def wordcloud_gen_cross(result_dic, set_type, init_path, wordcloud_config):
+	from wordcloud import WordCloud, STOPWORDS
+
 	for stat, stat_results in result_dic.items():
 		width = wordcloud_config["Wordcloud_width"]
 		height = wordcloud_config["Wordcloud_height"]
-		if "count" in stat or "statistics" in stat:
+		# Error bounds of top-k sketches are listed in the results only.
+		if "count" in stat or "statistics" in stat or "sketch_error" in stat:
 			continue
 		elif "wordcloud" in stat:
 			width *= 2
@@ -89,6 +93,8 @@ def url_chart_gen(result_dic, chart_config, results_dir):
 
 
 def urlchart_gen_cross(result_dic, set_type, init_path, chart_config):
+	import matplotlib.pyplot as plt
+
 	for stat, stat_results in result_dic.items():
 		if "count" not in stat:
 			continue
@@ -135,6 +141,8 @@ def stat_chart_gen(result_dic, results_dir):
 # TODO: Find a way to display the longest posts and/or the most random
 # posts?
 def statchart_gen_cross(result_dic, set_type, init_path):
+	import matplotlib.pyplot as plt
+
 	for stat, stat_results in result_dic.items():
 		if "statistics" not in stat:
 			continue
@@ -212,6 +220,8 @@ def stat_chat_gen_count_recursion(
 # TODO: Find a way to display the longest posts and/or the most random
 # posts?
 def stat_chat_gen_count_final(key, dic, dirname, sort_by, count_vis_config):
+	import matplotlib.pyplot as plt
+
 	# At this point, key can either be a timeframe or a username.
 	# If sort_by == "sorted_by_date", then key is a timeframe.
 	# If sort_by == "sorted_by_name", then key is a username.
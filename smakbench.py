@@ -0,0 +1,477 @@
+import jsonloader
+import postanalyzer
+import posttable
+import strprocutil
+import tsconverter
+
+from collections import defaultdict
+from datetime import datetime
+from itertools import chain
+import json
+import os
+import os.path as op
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import plac
+
+"""
+	Benchmark module for the Social Media Analytics Kit.
+	Generates synthetic Facebook export data and times the loading and
+	analysis steps on it. Run as follows:
+
+	$ python3 smakbench.py <benchmark name> [-s <number of records>]
+
+	@author: DeltaSierra4
+"""
+
+BENCH_USERNAME = "John Doe"
+BENCH_FRIENDS = [
+	"Jane Doe", "Joe Blow", "Foo Bar", "Mary Jane", "Max Mustermann",
+	"Erika Mustermann", "Juan PÃ©rez", "Kim Chulsoo",
+]
+# Libraries that should only be imported once the analysis runs.
+HEAVY_MODULES = ["textacy", "spacy", "matplotlib", "wordcloud"]
+BENCH_WORDS = (
+	"the quick brown fox jumps over lazy dog we went to see a movie last "
+	"night and it was great cafÃ© food pizza coffee weekend trip "
+	"photo friends family happy birthday congrats lol haha see you soon"
+).split()
+
+
+"""
+	Print a single line of benchmark results.
+"""
+
+
+def report(label, count, elapsed):
+	rate = count / elapsed if elapsed > 0 else float("inf")
+	print("{:<40} {:>10} records {:>9.2f}s {:>12.0f} records/s".format(
+		label, count, elapsed, rate
+	))
+
+
+def random_text(rng, min_words=3, max_words=25):
+	return " ".join(
+		rng.choice(BENCH_WORDS) for _ in range(rng.randint(min_words, max_words))
+	)
+
+
+"""
+	Generate a single synthetic entry of your_posts_*.json. Titles are drawn
+	from the formats handled by jsonloader.load_post_json(), and some entries
+	carry photo attachments that duplicate the post text.
+"""
+
+
+def synthetic_post(rng, ts):
+	friend = rng.choice(BENCH_FRIENDS)
+	titles = [
+		"{} updated his status.".format(BENCH_USERNAME),
+		"{} wrote on {}'s timeline.".format(BENCH_USERNAME, friend),
+		"{} posted in Bench Group {}.".format(BENCH_USERNAME, rng.randint(1, 20)),
+		"{} shared a memory.".format(BENCH_USERNAME),
+		"{} is feeling happy.".format(BENCH_USERNAME),
+	]
+	text = random_text(rng)
+	item = {
+		"timestamp": ts,
+		"data": [{"post": text}, {"update_timestamp": ts}],
+		"title": rng.choice(titles),
+	}
+	if rng.random() < 0.3:
+		item["attachments"] = [{"data": [{"media": {
+			"uri": "photos_and_videos/bench.jpg",
+			"creation_timestamp": ts,
+			"description": rng.choice([text, random_text(rng)]),
+		}}]}]
+	return item
+
+
+"""
+	Write size synthetic posts split into your_posts_N.json files of at most
+	per_file posts each.
+"""
+
+
+def write_synthetic_posts(post_dir, size, per_file=100000, seed=0):
+	rng = random.Random(seed)
+	ts = 1300000000
+	for file_no in range(0, size, per_file):
+		items = []
+		for _ in range(min(per_file, size - file_no)):
+			ts += rng.randint(60, 3600)
+			items.append(synthetic_post(rng, ts))
+		filename = "your_posts_{}.json".format(file_no // per_file + 1)
+		with open(op.join(post_dir, filename), "w") as f:
+			json.dump(items, f)
+
+
+"""
+	Reference implementation of the post loader as it was before the single
+	pass decoder was introduced, kept for comparison. Every append copies the
+	whole per-person list, so this is quadratic in the number of posts.
+"""
+
+
+def legacy_load_posts(post_dir, username):
+	post_dic = defaultdict(lambda: [])
+	for filename in sorted(os.listdir(post_dir)):
+		with open(op.join(post_dir, filename), "r") as f:
+			for item in json.load(f):
+				if item.get("timestamp", -1) <= 0:
+					continue
+				rows = []
+				for data in item.get("data", []):
+					if "post" in data:
+						rows.append({
+							"ts": item["timestamp"],
+							"post": strprocutil.convert_str(data["post"]),
+							"type": "Regular",
+						})
+				for data_dic in item.get("attachments", []):
+					for data in data_dic.get("data", []):
+						media_data = data.get("media", {})
+						if "description" in media_data:
+							photo_post = strprocutil.convert_str(media_data["description"])
+							if photo_post not in [row["post"] for row in rows]:
+								rows.append({
+									"ts": media_data.get("creation_timestamp", item["timestamp"]),
+									"post": photo_post,
+									"type": "Photo",
+								})
+				title = strprocutil.convert_str(item.get("title", ""))[:-1]
+				name = username if username in title else "Misc_post"
+				post_dic[name] = list(chain(post_dic[name], rows))
+	return post_dic
+
+
+"""
+	Benchmark jsonloader.load_post_json() on size synthetic posts. The legacy
+	quadratic loader is only run on the first legacy_size posts, since it does
+	not finish in reasonable time on large inputs.
+"""
+
+
+def bench_post_decoder(size, legacy_size=20000):
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		post_dir = op.join(tmp_dir, "posts")
+		os.mkdir(post_dir)
+		write_synthetic_posts(post_dir, size)
+		start = time.perf_counter()
+		table = jsonloader.load_post_json(
+			jsonloader.find_export_files(tmp_dir, "posts"), BENCH_USERNAME, None
+		)
+		report(
+			"load_post_json (single pass)",
+			posttable.row_count(table),
+			time.perf_counter() - start
+		)
+
+		if legacy_size <= 0:
+			return
+		legacy_root = op.join(tmp_dir, "legacy")
+		legacy_dir = op.join(legacy_root, "posts")
+		os.makedirs(legacy_dir)
+		write_synthetic_posts(legacy_dir, min(size, legacy_size))
+		start = time.perf_counter()
+		table = jsonloader.load_post_json(
+			jsonloader.find_export_files(legacy_root, "posts"), BENCH_USERNAME, None
+		)
+		report(
+			"load_post_json (single pass, subset)",
+			posttable.row_count(table),
+			time.perf_counter() - start
+		)
+		start = time.perf_counter()
+		post_dic = legacy_load_posts(legacy_dir, BENCH_USERNAME)
+		report(
+			"legacy chain() loader (subset)",
+			sum(len(posts) for posts in post_dic.values()),
+			time.perf_counter() - start
+		)
+
+
+"""
+	Reference implementations of strprocutil.convert_unicode() and
+	strprocutil.convert_name_tag() as they were before the bulk conversion was
+	introduced, kept for comparison.
+"""
+
+
+def legacy_convert_unicode(input_str):
+	return re.sub(
+		r'[\xc2-\xf4][\x80-\xbf]+',
+		lambda m: m.group(0).encode('latin1').decode('utf8'),
+		input_str
+	)
+
+
+def legacy_convert_name_tag(input_str):
+	name_tags = re.findall(r'\@\[[0-9]+\:[0-9]+\:[A-Za-z0-9 ]+\]', input_str)
+	actual_names = [nt.split(":")[2][:-1] for nt in name_tags]
+	for i in range(len(name_tags)):
+		input_str = input_str.replace(name_tags[i], actual_names[i])
+	return input_str
+
+
+def legacy_convert_str(input_str):
+	return legacy_convert_name_tag(legacy_convert_unicode(input_str)).strip()
+
+
+"""
+	Generate size synthetic strings as they appear in the export: UTF-8 text
+	escaped as latin1 characters (see strprocutil.convert_unicode()), with
+	some name tags and some plain ASCII strings mixed in.
+"""
+
+
+def synthetic_mojibake(size, seed=0):
+	rng = random.Random(seed)
+	extras = [
+		"caf\u00e9", "na\u00efve", "\u2764\ufe0f", "\U0001f602", "\u00fcber"
+	]
+	strs = []
+	for _ in range(size):
+		words = random_text(rng).split()
+		if rng.random() < 0.5:
+			words.insert(rng.randint(0, len(words)), rng.choice(extras))
+		if rng.random() < 0.1:
+			words.insert(0, "@[{}:{}:{}]".format(
+				rng.randint(1, 10 ** 9), rng.randint(1, 9999), rng.choice(BENCH_FRIENDS)
+			))
+		strs.append(" ".join(words).encode("utf8").decode("latin1"))
+	return strs
+
+
+"""
+	Benchmark the per-string legacy conversion against strprocutil.convert_str()
+	and the batched strprocutil.convert_strs() on size synthetic strings.
+"""
+
+
+def bench_mojibake(size):
+	strs = synthetic_mojibake(size)
+	start = time.perf_counter()
+	expected = [legacy_convert_str(input_str) for input_str in strs]
+	report("legacy convert_str", size, time.perf_counter() - start)
+	start = time.perf_counter()
+	converted = [strprocutil.convert_str(input_str) for input_str in strs]
+	report("convert_str", size, time.perf_counter() - start)
+	if converted != expected:
+		raise ValueError("convert_str() does not match the legacy conversion")
+	start = time.perf_counter()
+	converted = strprocutil.convert_strs(strs)
+	report("convert_strs (single batch)", size, time.perf_counter() - start)
+	if converted != expected:
+		raise ValueError("convert_strs() does not match the legacy conversion")
+
+
+"""
+	Benchmark tsconverter.ts_dt_conv() on size synthetic timestamps against
+	the previous conversion, which built four datetimes per post.
+"""
+
+
+def bench_timestamps(size):
+	rng = random.Random(0)
+	table = posttable.new_table()
+	ts = 1300000000
+	for _ in range(size):
+		ts += rng.randint(1, 600)
+		table["ts"].append(ts)
+	start = time.perf_counter()
+	legacy = [
+		(
+			int(datetime.fromtimestamp(ts).year),
+			int(datetime.fromtimestamp(ts).month),
+			int(datetime.fromtimestamp(ts).day),
+			int(datetime.fromtimestamp(ts).hour),
+		) for ts in table["ts"]
+	]
+	report("legacy datetime conversion", size, time.perf_counter() - start)
+	start = time.perf_counter()
+	tsconverter.ts_dt_conv(table)
+	report("ts_dt_conv", size, time.perf_counter() - start)
+	converted = list(zip(
+		table["year"], table["month"], table["day"], table["hour"]
+	))
+	if converted != legacy:
+		raise ValueError("ts_dt_conv() does not match the legacy conversion")
+
+
+"""
+	Reference implementation of postanalyzer.wordcount_generator() as it was
+	before words were counted by vocabulary ids, kept for comparison. Every
+	distinct word of a post is counted with list.count(), so this is quadratic
+	in the length of the post.
+"""
+
+
+def legacy_wordcount_generator(posts, monthly_wordcloud, name, y_m_str):
+	for post in posts:
+		wordlist = post.split()
+		wordset = set(wordlist)
+		for individual_word in wordset:
+			monthly_wordcloud[name][y_m_str][individual_word] += \
+				wordlist.count(individual_word)
+
+
+"""
+	Benchmark postanalyzer.wordcount_generator() against the legacy word
+	count on size synthetic messages, split into shards by friend and month
+	as the analysis does. Besides the common words, messages draw from a long
+	tail of rare words, so that the vocabulary grows as it does on real data.
+"""
+
+
+def bench_wordcount(size, shard_size=200):
+	rng = random.Random(0)
+	rare_words = ["word{}".format(i) for i in range(100000)]
+	shards = []
+	for shard_no in range(0, size, shard_size):
+		posts = []
+		for _ in range(min(shard_size, size - shard_no)):
+			words = random_text(rng, 1, 40).split()
+			words += rng.sample(rare_words, rng.randint(0, 5))
+			posts.append(" ".join(words))
+		y_m_str = "{}-{}".format(2010 + shard_no % 10, shard_no % 12 + 1)
+		shards.append((rng.choice(BENCH_FRIENDS), y_m_str, posts))
+
+	legacy = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: 0)))
+	start = time.perf_counter()
+	for name, y_m_str, posts in shards:
+		legacy_wordcount_generator(posts, legacy, name, y_m_str)
+	report("legacy wordcount_generator", size, time.perf_counter() - start)
+
+	r_dic = postanalyzer.new_result_dic()
+	start = time.perf_counter()
+	for name, y_m_str, posts in shards:
+		postanalyzer.wordcount_generator(
+			posts, r_dic["monthly_wordcloud"], name, y_m_str
+		)
+	report(
+		"wordcount_generator (vocabulary ids)", size, time.perf_counter() - start
+	)
+	start = time.perf_counter()
+	postanalyzer.word_results(r_dic)
+	report("mapping ids back to words", size, time.perf_counter() - start)
+	if r_dic["monthly_wordcloud"] != legacy:
+		raise ValueError(
+			"wordcount_generator() does not match the legacy word count"
+		)
+
+
+"""
+	Reference implementation of the count statistics as they were computed
+	before postanalyzer.count_text_stats() stopped using spaCy, kept for
+	comparison. Every post is parsed by the full spaCy pipeline.
+"""
+
+
+def legacy_count_text_stats(pending, en):
+	import textacy
+	import nlpmodels
+	import statacc
+
+	docs = nlpmodels.pipe(en, [post for _, post, _ in pending])
+	for (row, post, stats_dics), doc in zip(pending, docs):
+		ts = textacy.TextStats(doc)
+		for stats in stats_dics:
+			statacc.add(stats["wordcount"], row, ts.n_words)
+			statacc.add(stats["charcount"], row, len(post))
+			statacc.add(stats["entropy"], row, ts.entropy)
+
+
+"""
+	Benchmark postanalyzer.count_text_stats() against the legacy spaCy count
+	statistics on size synthetic messages. The legacy version only runs on the
+	first legacy_size messages, since it is much slower.
+"""
+
+
+def bench_count_stats(size, legacy_size=20000):
+	import nlpmodels
+
+	rng = random.Random(0)
+	posts = [random_text(rng, 1, 40) for _ in range(size)]
+
+	en = nlpmodels.get_model()
+	legacy_size = min(size, legacy_size)
+	stats = postanalyzer.new_stats_dic()
+	pending = [
+		(row, post, (stats,)) for row, post in enumerate(posts[:legacy_size])
+	]
+	start = time.perf_counter()
+	legacy_count_text_stats(pending, en)
+	report("legacy count stats (spaCy)", legacy_size, time.perf_counter() - start)
+
+	stats = postanalyzer.new_stats_dic()
+	pending = [(row, post, (stats,)) for row, post in enumerate(posts)]
+	start = time.perf_counter()
+	postanalyzer.count_text_stats(pending)
+	report("count_text_stats (regex)", size, time.perf_counter() - start)
+
+
+"""
+	Benchmark the startup of socialmediaanalysis.py by running it size times on
+	a config file that fails validation, and list the heavy libraries that are
+	imported before the config file is even read.
+"""
+
+
+def bench_startup(size):
+	script_dir = op.dirname(op.abspath(__file__))
+	with tempfile.TemporaryDirectory() as tmp_dir:
+		config_path = op.join(tmp_dir, "config.json")
+		with open(config_path, "w") as f:
+			json.dump({"Language": "en"}, f)
+		start = time.perf_counter()
+		for _ in range(size):
+			subprocess.run(
+				[
+					sys.executable, op.join(script_dir, "socialmediaanalysis.py"),
+					config_path
+				],
+				stdout=subprocess.DEVNULL, check=True
+			)
+		report("config error (whole process)", size, time.perf_counter() - start)
+	imported = subprocess.run(
+		[
+			sys.executable, "-c",
+			"import sys, socialmediaanalysis; "
+			"print(*[m for m in {} if m in sys.modules])".format(HEAVY_MODULES)
+		],
+		cwd=script_dir, stdout=subprocess.PIPE, universal_newlines=True, check=True
+	).stdout.strip()
+	print("Heavy libraries imported at startup: {}".format(imported or "none"))
+
+
+BENCHMARKS = {
+	"post_decoder": (bench_post_decoder, 500000),
+	"mojibake": (bench_mojibake, 1000000),
+	"timestamps": (bench_timestamps, 2000000),
+	"startup": (bench_startup, 10),
+	"wordcount": (bench_wordcount, 1000000),
+	"count_stats": (bench_count_stats, 1000000),
+}
+
+
+@plac.annotations(
+	benchmark=("Name of the benchmark to run", "positional", None, str),
+	size=("Number of synthetic records (0 for default)", "option", "s", int),
+)
+def main(benchmark, size=0):
+	if benchmark not in BENCHMARKS:
+		raise ValueError("Unknown benchmark {}. Choose from: {}".format(
+			benchmark, ", ".join(BENCHMARKS.keys())
+		))
+	bench_func, default_size = BENCHMARKS[benchmark]
+	bench_func(size if size > 0 else default_size)
+
+
+if __name__ == "__main__":
+	plac.call(main)
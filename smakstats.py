@@ -1,5 +1,6 @@
 from collections import defaultdict
-from statistics import mean, median, stdev
+
+import statacc
 
 """
 	Statistics module for Social Media Analytics Kit.
@@ -28,7 +29,10 @@ def parse_results(
 		"_sgrank_hl",
 		"_textrank_hl",
 	]
-	
+	# Error bounds of the counts, only present if top-k sketches were used.
+	if any("monthly_sketch_error" in result_dic[sub] for sub in subdirectories):
+		keys.append("_sketch_error")
+
 	for sub in subdirectories:
 		for per in analysis_period:
 			res_dic[(per + "_cat")][sub] = parse_results_helper(
@@ -59,7 +63,9 @@ def parse_results_helper(result_dic, per, keys, is_cross, wordcloud_config):
 	for key in keys:
 		pk = per + key
 		if "statistics" in key:
-			combine_dic[pk] = defaultdict(lambda: defaultdict(lambda: []))
+			combine_dic[pk] = defaultdict(
+				lambda: defaultdict(statacc.new_accumulator)
+			)
 			res_dic[pk] = defaultdict(lambda: {})
 		else:
 			combine_dic[pk] = defaultdict(lambda: defaultdict(lambda: 0))
@@ -99,7 +105,10 @@ def combiner(result_dic, per, combine_dic, wordcloud_com_user):
 				elif per == "global":
 					pk = per
 				for term, count in month_dic.items():
-					combine_dic[new_k][pk][term] += count
+					if statacc.is_accumulator(count):
+						statacc.merge(combine_dic[new_k][pk][term], count)
+					else:
+						combine_dic[new_k][pk][term] += count
 		else:
 			# Combine word counts for wordcloud only
 			for name, person_posts in sub_dic.items():
@@ -136,17 +145,8 @@ def stat_analysis(
 					terms_sorted = terms_sorted[:wordcloud_config_regular]
 				res_dic[k][t] = terms_sorted
 			else:
-				for stat_type, stat_list in t_dic.items():
-					stat_num_only = [score[1] for score in stat_list]
-					stat_sorted = sorted(stat_list, key=lambda val: val[1], reverse=True)
-					if len(stat_num_only) > 1:
-						res_dic[k][t][(stat_type + "_avg")] = mean(stat_num_only)
-						res_dic[k][t][(stat_type + "_med")] = median(stat_num_only)
-						res_dic[k][t][(stat_type + "_std")] = stdev(stat_num_only)
-						res_dic[k][t][(stat_type + "_max")] = stat_sorted[0]
-						res_dic[k][t][(stat_type + "_min")] = stat_sorted[-1]
-					else:
-						res_dic[k][t][(stat_type + "_only")] = stat_sorted[0]
+				for stat_type, acc in t_dic.items():
+					res_dic[k][t].update(statacc.summary(acc, stat_type))
 
 	wordcloud_per_user = defaultdict(lambda: defaultdict(lambda: []))
 	for name, dic in wordcloud_com_user.items():
@@ -280,7 +280,9 @@ def aggregate_counts_recursive(dic, res_dic, per=None):
 			res_dic[k] = res_dic.get(k, 0) + v
 		else:
 			for k_stats, stats in v.items():
-				res_dic[k_stats] = res_dic.get(k_stats, []) + stats
+				if k_stats not in res_dic:
+					res_dic[k_stats] = statacc.new_accumulator()
+				statacc.merge(res_dic[k_stats], stats)
 
 
 def stats_counts_recursive(dic, res_dic):
@@ -288,15 +290,6 @@ def stats_counts_recursive(dic, res_dic):
 		if "count" not in dic.keys():
 			stats_counts_recursive(v, res_dic[k])
 		elif k != "count":
-			stat_num_only = [score[1] for score in v]
-			stat_sorted = sorted(v, key=lambda val: val[1], reverse=True)
-			if len(stat_num_only) > 1:
-				res_dic[(k + "_avg")] = mean(stat_num_only)
-				res_dic[(k + "_med")] = median(stat_num_only)
-				res_dic[(k + "_std")] = stdev(stat_num_only)
-				res_dic[(k + "_max")] = stat_sorted[0]
-				res_dic[(k + "_min")] = stat_sorted[-1]
-			else:
-				res_dic[(k + "_only")] = stat_sorted[0]
+			res_dic.update(statacc.summary(v, k))
 		else:
 			res_dic[k] = v
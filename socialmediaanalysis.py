@@ -1,9 +1,12 @@
 import config_load
+import ingestmanifest
 import jsonloader
 import postanalyzer
+import posttable
 import resultvisualizer
 import smakstats
 import strprocutil
+import tablesnapshot
 import tsconverter
 
 import json
@@ -40,22 +43,54 @@ def main(config_path):
 		for nidx in range(len(target_names)):
 			target_names[nidx] = strprocutil.convert_unicode(target_names[nidx])
 
-	master_dic = {}
-	for subdir in sub_directories:
-		master_dic[subdir] = jsonloader.load_json(data_dir, subdir, username, target_names)
-
-	tsconverter.ts_dt_conv(master_dic, sub_directories)
-
-	tsconverter.sort_by_date(master_dic, sub_directories)
+	loader_config = config.get("Loader_config", {})
+	time_config = config.get("Time_config", {})
+	ts_range = tsconverter.date_range(
+		config.get("Start_date", ""), config.get("End_date", ""),
+		time_config.get("Timezone", "")
+	)
+	# Everything that changes the parsed records must invalidate the cache.
+	loader_settings = {
+		"Username": username,
+		"Target_names": target_names,
+		"Date_range": ts_range,
+	}
+	snapshot_path = loader_config.get("Snapshot_path", "")
+	table = None
+	if snapshot_path:
+		fingerprint = tablesnapshot.export_fingerprint(
+			data_dir, sub_directories, dict(loader_settings, Time_config=time_config)
+		)
+		table, index = tablesnapshot.load_snapshot(snapshot_path, fingerprint)
+	if table is None:
+		manifest = None
+		if loader_config.get("Manifest_dir", ""):
+			manifest = ingestmanifest.open_manifest(
+				loader_config["Manifest_dir"], loader_settings
+			)
+		table = posttable.new_table()
+		for subdir in sub_directories:
+			jsonloader.load_json(
+				data_dir, subdir, username, target_names, loader_config, manifest,
+				table, ts_range
+			)
+		ingestmanifest.save_manifest(manifest)
+
+		tsconverter.ts_dt_conv(table, time_config)
+		index = posttable.build_index(table)
+		if snapshot_path:
+			tablesnapshot.save_snapshot(snapshot_path, table, index, fingerprint)
+
+	# Results are keyed by category, e.g. "comments" for the rows loaded from
+	# the "comments_and_reactions" directory.
+	categories = [posttable.SUBDIR_CATEGORIES[sub] for sub in sub_directories]
 
 	count_config = config["Count_config"]
-	post_count_dic = postanalyzer.post_counts(
-		master_dic, username, sub_directories, count_config
-	)
+	analyzer_config = config["Analyzer_config"]
 
 	"""
-		Now we have a dictionary of all posts divided into comments, posts, and
-		messages, all with associated dates and hours.
+		Now we have a table of all posts divided into comments, posts, and
+		messages, all with associated dates.
 		Analytics will be performed on multiple different levels: Each category,
 		each individual involved, and each month.
 		To be implemented: Analytics based on specific days of month, time of the
@@ -68,26 +103,35 @@ def main(config_path):
 		dictionary.
 	"""
 
-	analyzer_config = config["Analyzer_config"]
-	result_dic = postanalyzer.analyze(master_dic, username, analyzer_config)
-
+	# Posts are analyzed and counted in a single walk through the table.
 	smakstats_config = config["SMAKstats_config"]
+	result_dic, post_count_dic = postanalyzer.analyze_and_count(
+		table, index, username, categories, analyzer_config, count_config,
+		smakstats_config
+	)
+
 	analysis_period = config["Analysis_period"]
 	pruned_result_dic = smakstats.parse_results(
-		result_dic, sub_directories, smakstats_config, analysis_period
+		result_dic, categories, smakstats_config, analysis_period
 	)
 
 	# Save parse results as JSON file.
 	with open("./parse_results.json", 'w+') as f2:
-		json.dump(pruned_result_dic, f2, indent=4, sort_keys=True)
+		json.dump(
+			postanalyzer.resolve_posts(table, pruned_result_dic, "analysis"), f2,
+			indent=4, sort_keys=True
+		)
 
 	pruned_count_dic = smakstats.parse_counts(
-		post_count_dic, sub_directories, analysis_period
+		post_count_dic, categories, analysis_period
 	)
 
 	# Save count results as JSON file.
 	with open("./count_results.json", 'w+') as f2:
-		json.dump(pruned_count_dic, f2, indent=4, sort_keys=True)
+		json.dump(
+			postanalyzer.resolve_posts(table, pruned_count_dic, "count"), f2,
+			indent=4, sort_keys=True
+		)
 
 	visualizer_config = config["Visualizer_config"]
 	results_dir = config["Resultsdir"]
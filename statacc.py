@@ -0,0 +1,101 @@
+from array import array
+from math import sqrt
+from statistics import median
+from types import SimpleNamespace
+
+"""
+	Statistic accumulator module for the Social Media Analytics Kit.
+	Collects a statistic of many posts (e.g. their word counts) without keeping
+	a (post, value) pair per post. An accumulator keeps the running mean and
+	variance (Welford's algorithm), the values themselves as plain floats for
+	the exact median, and the posts with the largest and smallest value.
+
+	Accumulators of different months, people, or worker processes are
+	combined with merge(), which gives the same results as adding all their
+	values to a single accumulator in order.
+
+	@author: DeltaSierra4
+"""
+
+
+def new_accumulator():
+	return SimpleNamespace(
+		n=0, mean=0.0, m2=0.0, values=array("d"), max=None, min=None
+	)
+
+
+def is_accumulator(value):
+	return isinstance(value, SimpleNamespace) and hasattr(value, "m2")
+
+
+"""
+	Add the value of a post to acc. On ties, the first post with the largest
+	value and the last post with the smallest value are kept, like sorting the
+	(post, value) pairs by value in descending order would.
+"""
+
+
+def add(acc, post, value):
+	acc.n += 1
+	delta = value - acc.mean
+	acc.mean += delta / acc.n
+	acc.m2 += delta * (value - acc.mean)
+	acc.values.append(value)
+	if acc.max is None or value > acc.max[1]:
+		acc.max = (post, value)
+	if acc.min is None or value <= acc.min[1]:
+		acc.min = (post, value)
+
+
+"""
+	Add the accumulator src into dst, as if the values of src were added to dst
+	after its own values.
+"""
+
+
+def merge(dst, src):
+	if src.n == 0:
+		return
+	n = dst.n + src.n
+	delta = src.mean - dst.mean
+	dst.m2 += src.m2 + delta * delta * dst.n * src.n / n
+	dst.mean += delta * src.n / n
+	dst.n = n
+	dst.values.extend(src.values)
+	if dst.max is None or src.max[1] > dst.max[1]:
+		dst.max = src.max
+	if dst.min is None or src.min[1] <= dst.min[1]:
+		dst.min = src.min
+
+
+"""
+	Returns a new accumulator of all values of the given accumulators, in
+	order. The accumulators themselves are left unchanged.
+"""
+
+
+def combined(accs):
+	acc = new_accumulator()
+	for src in accs:
+		merge(acc, src)
+	return acc
+
+
+"""
+	Returns the statistics of acc in the format of the results, with keys
+	prefixed by name: the (post, value) pair as "_only" if there is a single
+	value, otherwise the mean, median, sample standard deviation, and the
+	(post, value) pairs with the largest and smallest value.
+"""
+
+
+def summary(acc, name):
+	if acc.n == 1:
+		return {name + "_only": acc.max}
+	return {
+		name + "_avg": acc.mean,
+		name + "_med": median(acc.values),
+		name + "_std": sqrt(acc.m2 / (acc.n - 1)),
+		name + "_max": acc.max,
+		name + "_min": acc.min,
+	}
@@ -1,17 +1,31 @@
 from collections import defaultdict
+from functools import lru_cache
 import re
 
-from textacy import preprocessing
-
 """
 	String processor utility module for the Social Media Analytics Kit.
 	Performs various string processing functions for loading data and
 	preprocessing before analysis is performed.
 
+	textacy is only imported by the preprocessing functions that use it, so
+	that loading the export does not have to import it.
+
 	@author: DeltaSierra4
 """
 
 
+# Facebook exports store UTF-8 text as if every byte were a latin1 character,
+# e.g. "caf\u00c3\u00a9" for "caf\u00e9". Matches one such escaped UTF-8
+# character.
+MOJIBAKE_PATTERN = re.compile(r'[\xc2-\xf4][\x80-\xbf]+')
+# @[123456789:1234:John Doe]
+NAME_TAG_PATTERN = re.compile(r'\@\[[0-9]+\:[0-9]+\:([A-Za-z0-9 ]+)\]')
+# Joins strings for convert_strs(). Can not be part of an escaped character or
+# a name tag, so the conversions never cross from one string into the next.
+BULK_SEPARATOR = "\x00"
+CONVERT_CACHE_SIZE = 1 << 16
+
+
 """
 	Comprehensive convert_str() that performs all conversions in the following
 	order:
@@ -28,19 +42,60 @@ def convert_str(input_str):
 	return after_name_tag_conv.strip()
 
 
+"""
+	Same as convert_str(), but memoized. Meant for short strings that repeat
+	many times in an export, such as titles and sender names.
+"""
+
+
+@lru_cache(maxsize=CONVERT_CACHE_SIZE)
+def convert_name(input_str):
+	return convert_str(input_str)
+
+
+"""
+	convert_str() on a whole batch of strings at once, e.g. all messages of a
+	file. The strings are joined into one, whose unicode characters are
+	converted in a single pass, and then split up again. Returns the list of
+	converted strings in the same order.
+"""
+
+
+def convert_strs(input_strs):
+	if len(input_strs) == 0:
+		return []
+	joined = BULK_SEPARATOR.join(input_strs)
+	if joined.count(BULK_SEPARATOR) != len(input_strs) - 1:
+		# The separator appears in one of the strings themselves.
+		return [convert_str(input_str) for input_str in input_strs]
+	# Name tags are rare, so they are converted per string where the cheap
+	# check in convert_name_tag() skips most of them.
+	converted = convert_unicode(joined).split(BULK_SEPARATOR)
+	return [convert_name_tag(conv_str).strip() for conv_str in converted]
+
+
 """
 	Convert any incorrectly expressed unicode characters into UTF-8-like
-	characters using regex. Returns the converted string (or the original
-	string if there are no unicode expressions).
+	characters. Returns the converted string (or the original string if there
+	are no unicode expressions).
+
+	Most strings are either plain ASCII or consist entirely of escaped UTF-8,
+	in which case the whole string is re-encoded at once. Strings that mix in
+	characters that can not be re-encoded fall back to converting each escaped
+	character separately with a regex.
 """
 
 
 def convert_unicode(input_str):
-	return re.sub(
-		r'[\xc2-\xf4][\x80-\xbf]+',
-		lambda m: m.group(0).encode('latin1').decode('utf8'),
-		input_str
-	)
+	if input_str.isascii():
+		return input_str
+	try:
+		return input_str.encode('latin1').decode('utf8')
+	except (UnicodeEncodeError, UnicodeDecodeError):
+		return MOJIBAKE_PATTERN.sub(
+			lambda m: m.group(0).encode('latin1').decode('utf8'),
+			input_str
+		)
 
 
 """
@@ -52,11 +107,9 @@ def convert_unicode(input_str):
 
 
 def convert_name_tag(input_str):
-	name_tags = re.findall(r'\@\[[0-9]+\:[0-9]+\:[A-Za-z0-9 ]+\]', input_str)
-	actual_names = [nt.split(":")[2][:-1] for nt in name_tags]
-	for i in range(len(name_tags)):
-		input_str = input_str.replace(name_tags[i], actual_names[i])
-	return input_str
+	if "@[" not in input_str:
+		return input_str
+	return NAME_TAG_PATTERN.sub(r'\1', input_str)
 
 
 """
@@ -67,6 +120,8 @@ def convert_name_tag(input_str):
 
 
 def gibberishremove(inputstring):
+	from textacy import preprocessing
+
 	remove_email = preprocessing.replace_numbers(
 		inputstring.strip(), replace_with=""
 	).strip()
@@ -96,6 +151,8 @@ def gibberishremove(inputstring):
 
 
 def number_and_punccheck(inputstr):
+	from textacy import preprocessing
+
 	remove_phone = preprocessing.replace_phone_numbers(
 		inputstr, replace_with=""
 	)
@@ -290,6 +347,8 @@ def valid_hline_word(word):
 
 
 def preproc_posts(posts):
+	from textacy import preprocessing
+
 	gibberish_chars = ["EE", "AA", "HA", "OO", "II", "UU"]
 	gibberish_chars_lower = [exp.lower() for exp in gibberish_chars]
 	gibberish_puncs = ["!!", "?!", "??", "..", ".\n"]
@@ -345,6 +404,8 @@ def preproc_posts(posts):
 
 
 def wordcloud_preproc(posts):
+	from textacy import preprocessing
+
 	pl = [p.lower().strip() for p in posts]
 	stopwords = load_stopwords()
 	processed_words = []
@@ -0,0 +1,207 @@
+from array import array
+import hashlib
+import json
+import mmap
+import os
+import os.path as op
+import sys
+import time
+import exportfs
+import jsonloader
+import posttable
+
+"""
+	Snapshot module for the Social Media Analytics Kit.
+	Writes the loaded, timestamp-converted post table (see the posttable module)
+	to a single binary file, and memory-maps it on later runs so that the
+	export does not need to be parsed again. The file is laid out as follows:
+
+	MAGIC (8 bytes)
+	Length of the header (8 bytes, little-endian)
+	Header (UTF-8 JSON): version, fingerprint, names, and the byte offset of
+	every section below.
+	Sections, each aligned to 8 bytes:
+		One fixed-width array per table column (ts, codes, and the date columns
+		added by tsconverter.ts_dt_conv()).
+		text_offsets: Start of every row's text in text_blob, plus the end.
+		text_blob: The UTF-8 text of all rows, concatenated.
+		index_*: The time index of the table, stored as the key columns and the
+		first row of every key. Rows are written grouped by key and sorted by
+		timestamp within each key, so every key covers a contiguous range of
+		rows whose slice of the ts column is already sorted.
+
+	Arrays are stored in native byte order. A snapshot is only meant to be read
+	back on the machine that wrote it.
+
+	@author: DeltaSierra4
+"""
+
+MAGIC = b"SMAKSNAP"
+SNAPSHOT_VERSION = 4
+ALIGNMENT = 8
+
+# Table columns stored in the snapshot, along with the date columns listed in
+# the table's "date_columns". "text" is stored separately.
+COLUMNS = ["ts", "category", "group", "kind", "partner", "group_name"]
+INDEX_COLUMNS = [
+	("index_category", "B"),
+	("index_partner", "l"),
+	("index_start", "q"),
+]
+
+
+"""
+	Compute the fingerprint of an export. The fingerprint changes whenever
+	an export file is added, removed, or modified, whenever a setting that
+	affects the loaded rows or their date columns changes, or whenever the
+	local timezone (which the date columns default to) changes.
+"""
+
+
+def export_fingerprint(data_dir, sub_directories, settings):
+	files = []
+	for subdir in sub_directories:
+		for path in jsonloader.find_export_files(data_dir, subdir):
+			size, mtime = exportfs.file_stat(path)
+			files.append([subdir, path, size, mtime])
+	fingerprint = {
+		"settings": settings,
+		"files": files,
+		"timezone": [time.timezone, time.altzone, list(time.tzname)],
+	}
+	fp_json = json.dumps(fingerprint, sort_keys=True)
+	return hashlib.sha1(fp_json.encode("utf-8")).hexdigest()
+
+
+def padding(length):
+	return (ALIGNMENT - length % ALIGNMENT) % ALIGNMENT
+
+
+"""
+	Write the table and its index to a snapshot at path. The table must
+	already hold the date columns added by tsconverter.ts_dt_conv().
+"""
+
+
+def save_snapshot(path, table, index, fingerprint):
+	start = time.perf_counter()
+	keys = sorted(index.keys())
+	order = array("l")
+	index_arrays = {name: array(typecode) for name, typecode in INDEX_COLUMNS}
+	for key in keys:
+		index_arrays["index_category"].append(key[0])
+		index_arrays["index_partner"].append(key[1])
+		index_arrays["index_start"].append(len(order))
+		order.extend(index[key][1])
+	index_arrays["index_start"].append(len(order))
+
+	sections = []
+	for column in COLUMNS + table["date_columns"]:
+		col = table[column]
+		sections.append((column, array(col.typecode, (col[row] for row in order))))
+	text_offsets = array("q", [0])
+	text_parts = []
+	for row in order:
+		encoded = posttable.get_text(table, row).encode("utf-8", "surrogatepass")
+		text_parts.append(encoded)
+		text_offsets.append(text_offsets[-1] + len(encoded))
+	sections.append(("text_offsets", text_offsets))
+	sections.append(("text_blob", b"".join(text_parts)))
+	for name, _ in INDEX_COLUMNS:
+		sections.append((name, index_arrays[name]))
+
+	# Section offsets are relative to the end of the header, which lets us
+	# compute them before the header length is known.
+	layout = {}
+	offset = 0
+	for name, data in sections:
+		typecode = data.typecode if isinstance(data, array) else "B"
+		nbytes = len(data) * (data.itemsize if isinstance(data, array) else 1)
+		layout[name] = [typecode, offset, nbytes]
+		offset += nbytes + padding(nbytes)
+	header = json.dumps({
+		"version": SNAPSHOT_VERSION,
+		"byteorder": sys.byteorder,
+		"fingerprint": fingerprint,
+		"rows": len(order),
+		"names": table["names"],
+		"date_columns": table["date_columns"],
+		"day_parts": table["day_parts"],
+		"sections": layout,
+	}).encode("utf-8")
+	header += b" " * padding(len(MAGIC) + 8 + len(header))
+
+	tmp_path = path + ".tmp"
+	with open(tmp_path, "wb") as f:
+		f.write(MAGIC)
+		f.write(len(header).to_bytes(8, "little"))
+		f.write(header)
+		for name, data in sections:
+			f.write(data)
+			f.write(b"\0" * padding(layout[name][2]))
+	os.replace(tmp_path, path)
+	print("Wrote snapshot of {} rows to {} in {:.2f}s".format(
+		len(order), path, time.perf_counter() - start
+	))
+
+
+"""
+	Memory-map the snapshot at path. Returns a (table, index) tuple, or
+	(None, None) if there is no snapshot, or if it was written by another
+	version of SMAK or for another fingerprint.
+
+	The columns of the returned table are read-only views into the mapped file,
+	and each row's text is decoded only when posttable.get_text() asks for it.
+"""
+
+
+def load_snapshot(path, fingerprint):
+	if not op.exists(path):
+		return None, None
+	start = time.perf_counter()
+	with open(path, "rb") as f:
+		# The mapping stays valid after the file is closed.
+		mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+	if len(mm) < len(MAGIC) + 8 or mm[:len(MAGIC)] != MAGIC:
+		mm.close()
+		return None, None
+	header_start = len(MAGIC) + 8
+	header_end = header_start + int.from_bytes(
+		mm[len(MAGIC):header_start], "little"
+	)
+	header = json.loads(mm[header_start:header_end].decode("utf-8"))
+	if header.get("version") != SNAPSHOT_VERSION or \
+		header.get("byteorder") != sys.byteorder or \
+		header.get("fingerprint") != fingerprint:
+		mm.close()
+		return None, None
+
+	view = memoryview(mm)
+	sections = {}
+	for name, (typecode, offset, nbytes) in header["sections"].items():
+		section = view[header_end + offset:header_end + offset + nbytes]
+		sections[name] = section.cast(typecode)
+
+	table = {
+		column: sections[column] for column in COLUMNS + header["date_columns"]
+	}
+	table["date_columns"] = header["date_columns"]
+	table["day_parts"] = header["day_parts"]
+	table["text_offsets"] = sections["text_offsets"]
+	table["text_blob"] = sections["text_blob"]
+	table["names"] = header["names"]
+	table["name_codes"] = {
+		name: code for code, name in enumerate(header["names"])
+	}
+
+	index = {}
+	ts_col = table["ts"]
+	starts = sections["index_start"]
+	for i in range(len(starts) - 1):
+		key = (sections["index_category"][i], sections["index_partner"][i])
+		first, last = starts[i], starts[i + 1]
+		index[key] = (ts_col[first:last], range(first, last))
+	print("Loaded snapshot of {} rows from {} in {:.1f}ms".format(
+		header["rows"], path, (time.perf_counter() - start) * 1000
+	))
+	return table, index
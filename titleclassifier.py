@@ -0,0 +1,276 @@
+from functools import lru_cache
+import re
+
+"""
+	Title classifier module for the Social Media Analytics Kit.
+	Facebook describes every post and comment with a title such as "John Doe
+	wrote on Jane Doe's timeline." that follows one of a few dozen templates.
+	This module splits each title into words once, matches the words against
+	the known templates, and extracts the name of the person, group, page, or
+	event the user interacted with in the same call.
+
+	The same titles repeat tens of thousands of times in a typical export, so
+	results are memoized per (title, username).
+
+	@author: DeltaSierra4
+"""
+
+TITLE_CACHE_SIZE = 1 << 16
+
+# Key expressions that directly precede the name we want to extract, grouped
+# by the kind of title they appear in.
+KEY_EXPRESSIONS = {
+	# Username wrote on John Doe's timeline
+	# Username added a new photo/video to John Doe's timeline
+	# Username shared a memory to John Doe's timeline
+	"fr": ["wrote on", "memory to", "photo to", "video to"],
+	# John Doe posted in Group Name
+	# John Doe shared a post to the group: Group Name
+	"gr": ["posted in", "the group:", "the event:"],
+	# John Doe commented on Jane Doe's post
+	# John Doe replied to Jane Doe's comment
+	"co": ["commented on", "replied to"],
+}
+
+# One compiled alternation per kind. A search() returns the leftmost
+# occurrence of any of the key expressions in a single scan of the title.
+KEY_EXPRESSION_PATTERNS = {
+	kind: re.compile("|".join(re.escape(exp) for exp in key_exp))
+	for kind, key_exp in KEY_EXPRESSIONS.items()
+}
+
+GROUP_EVENT_KEYS = ["to the group:", "to the event:"]
+OWN_POST_TAGS = ["with", "at", "in", "live"]
+OWN_POST_ACTIVITIES = ["celebrating", "looking", "attending", "eating"]
+OWN_POST_SHARED_MEDIA = ["video", "quote", "episode"]
+EVENT_KEYWORDS = ["event", "private"]
+
+
+"""
+	Safe positional lookup into a list of title words. Returns an empty string
+	instead of raising an IndexError for titles that are shorter than the
+	template being checked.
+"""
+
+
+def word_at(title_words, idx):
+	if -len(title_words) <= idx < len(title_words):
+		return title_words[idx]
+	return ""
+
+
+"""
+	Classify a post title (with the trailing period already clipped off).
+	Returns a (category, name) tuple where category is one of the following:
+
+	"Friend": Post on a friend's timeline. name is the friend's name.
+	"Own": Post on the user's own wall. name is the username.
+	"Group": Post in a group, page, or event. name is its name.
+	"Misc": Anything else. name is "Misc_post".
+	"": Illegitimate title. name is an empty string.
+"""
+
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def classify_post_title(title, username):
+	if title[-8:] == "timeline":
+		name = extract_name(title, "fr", username)
+		return ("Friend", name) if name else ("", "")
+	title_words = title.split()
+	namewc = len(username.split())
+	if own_post(title_words, namewc):
+		return "Own", username
+	if group_page_event_post(title, title_words, namewc, username):
+		name = extract_name(title, "gr", username)
+		return ("Group", name) if name else ("", "")
+	return "Misc", "Misc_post"
+
+
+"""
+	Classify a comment title (with the trailing period already clipped off).
+	Returns a (nature, target) tuple, where nature is "Own" for a comment on the
+	user's own post, "Other" for a comment on someone else's post, or "Replies"
+	for a reply to someone. target is the name of the person the user is
+	interacting with, which is empty for "Own". Both are empty strings if the
+	title is illegitimate.
+"""
+
+
+@lru_cache(maxsize=TITLE_CACHE_SIZE)
+def classify_comment_title(title, username):
+	# Default case is assuming it as a comment to another person's post.
+	title_words = title.split()
+	name_w = len(username.split())
+	if "replied" in title_words:
+		nature = "Replies"
+	elif word_at(title_words, name_w) == "commented" and \
+		word_at(title_words, name_w + 3) == "own":
+		return "Own", ""
+	else:
+		nature = "Other"
+	target = extract_name(title, "co", username)
+	if len(target) == 0:
+		return "", ""
+	return nature, target
+
+
+"""
+	Checks if a post was made on one's own wall, given the words of its title
+	and the number of words in the username.
+"""
+
+
+def own_post(title_words, namewc):
+	# Ignore all group/event page posts
+	if "group:" in title_words or "event:" in title_words:
+		return False
+	first = word_at(title_words, namewc)
+	second = word_at(title_words, namewc + 1)
+	last = word_at(title_words, -1)
+	second_last = word_at(title_words, -2)
+	third_last = word_at(title_words, -3)
+	# First format: John Doe updated his status
+	if last == "status" and third_last == "updated":
+		return True
+	# Second format: John Doe is feeling emotion
+	if first == "is" and second == "feeling":
+		return True
+	if second_last == "feeling" and third_last == "is":
+		return True
+	# Third format: John Doe shared a memory
+	if last == "memory" and second_last == "a":
+		return True
+	# Fourth format: John Doe uploaded a new photo/video(s)
+	if second_last == "new" and ("photo" in last or "video" in last):
+		return True
+	# Fifth format: John Doe answered a question
+	if last == "question" and third_last == "answered":
+		return True
+	# Sixth format: John Doe was with Mary Jane [and x others] [at y] [in z]
+	# A similar format can be the following:
+	# John Doe was celebrating friendship with Mary Jane
+	# John Doe was looking for recommendations
+	# John Doe was attending Storm Area 69
+	# John Doe was live
+	if first == "was" and (
+		second in OWN_POST_TAGS or second in OWN_POST_ACTIVITIES
+	):
+		return True
+	# Seventh format: Sharing other media
+	# John Doe shared a video from the playlist My Playlist
+	# John Doe shared an episode of Some Scary Movie
+	# John Doe shared a quote
+	# John Doe shared moments from his year
+	if first == "shared":
+		if word_at(title_words, namewc + 2) in OWN_POST_SHARED_MEDIA:
+			return True
+		elif second == "moments":
+			return True
+	# Eighth format: John Doe created a poll
+	if last == "poll" and third_last == "created":
+		return True
+	# Ninth format: John Doe was 🎉 celebrating friendship
+	if last == "friendship" and second_last == "celebrating":
+		return True
+	return False
+
+
+"""
+	Checks if a post was made in a group, page, or an event.
+
+	TODO! Handle these titles:
+	John Doe contributed to the album: <album name> in <group name>
+"""
+
+
+def group_page_event_post(title, title_words, namewc, username):
+	first = word_at(title_words, namewc)
+	# First format: John Doe posted in group/event/page
+	if first == "posted" and word_at(title_words, namewc + 1) == "in":
+		return True
+	# Second format: John Doe shared a link to the group/event/page: name
+	# Related: John Doe shared an album: <Album name> to the group: name
+	# Any title containing both "shared an xxx" and "to the group/event/page"
+	# can count as this.
+	rep_title = title.replace(username, "").strip()
+	if rep_title[:8] == "shared a":
+		for ke in GROUP_EVENT_KEYS:
+			if ke in rep_title:
+				return True
+	# Third format: John Doe created a [private] event for group name
+	if first == "created" and word_at(title_words, namewc + 2) in EVENT_KEYWORDS:
+		return True
+	return False
+
+
+"""
+	Extracts the friend's name or the group's name from a title, depending on
+	kind: "fr" for posts on another user's timeline, "gr" for posts in a group,
+	page, or event, and "co" for comments and replies. Returns an empty string
+	if no name can be found.
+"""
+
+
+def extract_name(title, kind, username):
+	# First, take care of the degenerate case of someone attempting to
+	# use a name that matches one of the key expressions.
+	title = username_prune(title, kind, username)
+	if kind == "fr":
+		return " ".join(title.split()[2:-1])[:-2]
+	elif kind == "gr":
+		return " ".join(title.split()[2:])
+
+	# At this point, all comments are in one of the four following formats.
+	# "commented on John Doe's post"
+	# "commented on John Doe's live video"
+	# "replied to John Doe's comment"
+	# "replied to one's own comment"
+	target_name_list = title.split()[2:-1]
+	if len(target_name_list) > 0 and target_name_list[-1] in ("live", "life"):
+		target_name_list = target_name_list[:-1]
+	if len(target_name_list) == 0:
+		return ""
+	if target_name_list[-1] == "own":
+		return username
+	return " ".join(target_name_list)[:-2]
+
+
+"""
+	Takes care of degenerate cases from title data where someone attempts to
+	use a user name or page name that matches one of the key expressions we are
+	looking for, then cuts the title down to start at the key expression.
+
+	e.g. key expression of "commented on", and a Facebook page with the name of
+	"I replied to yo mommas phonecall", dealing with the following title:
+	I replied to yo mommas phonecall replied to John Doe's comment.
+
+	Occurrences of key expressions inside the username are masked first. The
+	leftmost remaining key expression is the actual key phrase, which covers
+	both the usual case of a single match and the edge case of a target name
+	that contains key expressions itself. Returns an empty string if the title
+	contains none of the key expressions.
+"""
+
+
+def username_prune(title, kind, username):
+	for exp in KEY_EXPRESSIONS[kind]:
+		while exp in username:
+			title = title.replace(exp, "your name", 1)
+			username = username.replace(exp, "your name", 1)
+	match = KEY_EXPRESSION_PATTERNS[kind].search(title)
+	if match is None:
+		return ""
+	return title[match.start():]
+
+
+"""
+	Returns the memoization statistics of both classifiers, mostly for
+	benchmarking purposes.
+"""
+
+
+def cache_info():
+	return {
+		"posts": classify_post_title.cache_info(),
+		"comments": classify_comment_title.cache_info(),
+	}
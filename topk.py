@@ -0,0 +1,160 @@
+import heapq
+from types import SimpleNamespace
+
+"""
+	Top-k sketch module for the Social Media Analytics Kit.
+	Keeps approximate counts of the most frequent items (words, key terms or
+	URLs) of a bucket in bounded memory, using the Space-Saving algorithm.
+	A sketch holds at most capacity items. Once it is full, a new item takes
+	the place of the least frequent one, and inherits its count.
+
+	Every sketch has an error bound: the count of every item in the sketch
+	exceeds its true count by at most the bound, and items that are not in the
+	sketch occurred at most that many times. Counts are exact, with a bound of
+	0, as long as a sketch has never been full. Sketches of the same bucket
+	from different worker processes are combined with merge().
+
+	@author: DeltaSierra4
+"""
+
+# The heap of a sketch is rebuilt once it holds this many entries per item.
+HEAP_SLACK = 4
+
+
+"""
+	Returns an empty sketch holding at most capacity items.
+"""
+
+
+def new_sketch(capacity):
+	return SimpleNamespace(counts={}, heap=[], capacity=capacity, bound=0)
+
+
+def is_sketch(value):
+	return isinstance(value, SimpleNamespace) and hasattr(value, "capacity")
+
+
+"""
+	Add weight occurrences of item to sketch.
+"""
+
+
+def update(sketch, item, weight=1):
+	counts = sketch.counts
+	if item in counts:
+		counts[item] += weight
+		return
+	if len(counts) >= sketch.capacity:
+		min_item, min_count = pop_min(sketch)
+		del counts[min_item]
+		# The new item may have occurred up to min_count times before, while
+		# it was not in the sketch.
+		sketch.bound = max(sketch.bound, min_count)
+		weight += min_count
+	counts[item] = weight
+	if sketch.heap is None:
+		rebuild_heap(sketch)
+	else:
+		heapq.heappush(sketch.heap, (weight, item))
+
+
+"""
+	Add a dictionary of {item: count} to sketch.
+"""
+
+
+def update_counts(sketch, counts):
+	for item, count in counts.items():
+		update(sketch, item, count)
+
+
+"""
+	Remove and return the (item, count) of sketch with the lowest count.
+	Heap entries are not updated when counts grow, so stale entries are pushed
+	again with their current count when they reach the top.
+"""
+
+
+def pop_min(sketch):
+	counts = sketch.counts
+	if sketch.heap is None or len(sketch.heap) > HEAP_SLACK * len(counts):
+		rebuild_heap(sketch)
+	while True:
+		count, item = heapq.heappop(sketch.heap)
+		if item not in counts:
+			continue
+		if counts[item] == count:
+			return item, count
+		heapq.heappush(sketch.heap, (counts[item], item))
+
+
+"""
+	Rebuild the heap of sketch from its counts. merge() and map_counts() leave
+	the heap unset, and it is rebuilt on the next update.
+"""
+
+
+def rebuild_heap(sketch):
+	sketch.heap = [(count, item) for item, count in sketch.counts.items()]
+	heapq.heapify(sketch.heap)
+
+
+"""
+	Returns the lowest count of sketch if it is full, 0 otherwise. Items not
+	in the sketch occurred at most this many times.
+"""
+
+
+def floor(sketch):
+	if len(sketch.counts) < sketch.capacity or len(sketch.counts) == 0:
+		return 0
+	return min(sketch.counts.values())
+
+
+"""
+	Returns the error bound of the counts of sketch.
+"""
+
+
+def error_bound(sketch):
+	return max(sketch.bound, floor(sketch))
+
+
+"""
+	Add the sketch src into dst. An item missing from one of the sketches is
+	counted as the floor() of that sketch, so that counts never fall below the
+	true counts. The least frequent items are then dropped until dst is back
+	within its capacity.
+"""
+
+
+def merge(dst, src):
+	dst_bound = error_bound(dst)
+	src_bound = error_bound(src)
+	dst_floor = floor(dst)
+	src_floor = floor(src)
+	counts = dst.counts
+	if src_floor > 0:
+		for item in counts:
+			if item not in src.counts:
+				counts[item] += src_floor
+	for item, count in src.counts.items():
+		counts[item] = counts.get(item, dst_floor) + count
+	dst.bound = dst_bound + src_bound
+	if len(counts) > dst.capacity:
+		kept = sorted(counts.items(), key=lambda val: val[1], reverse=True)
+		dst.counts = dict(kept[:dst.capacity])
+	dst.heap = None
+
+
+"""
+	Returns a copy of sketch whose counts are func(counts), e.g. with its items
+	renamed.
+"""
+
+
+def map_counts(sketch, func):
+	return SimpleNamespace(
+		counts=dict(func(sketch.counts)), heap=None, capacity=sketch.capacity,
+		bound=sketch.bound
+	)
@@ -1,5 +1,15 @@
-from collections import defaultdict
-from datetime import datetime
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime
+from functools import partial
+from operator import itemgetter
+import time
+
+try:
+	from zoneinfo import ZoneInfo
+except ImportError:
+	# Python < 3.9. Only the local time of the machine is available.
+	ZoneInfo = None
 
 """
 	Timestamp converter module for the Social Media Analytics Kit.
@@ -9,134 +19,270 @@ from datetime import datetime
 	@author: DeltaSierra4
 """
 
+# Columns added to the post table for each granularity, and their array
+# typecodes. The "month" granularity is always added, since its "period"
+# column is what the post table index is keyed by.
+GRANULARITY_COLUMNS = {
+	"year": [("year", "H")],
+	"month": [("month", "B"), ("period", "l")],
+	"day": [("day", "B")],
+	"hour": [("hour", "B")],
+	"weekday": [("weekday", "B")],
+	"iso_week": [("iso_week", "l")],
+	"day_part": [("day_part", "B")],
+}
+# Order of the fields returned by hour_fields().
+FIELDS = [
+	"year", "month", "period", "day", "hour", "weekday", "iso_week", "day_part"
+]
+DEFAULT_GRANULARITIES = ["year", "month", "day", "hour", "day_part"]
+# Each day part starts at the given hour and lasts until the next one starts.
+# Hours before the first start belong to the last day part.
+DEFAULT_DAY_PARTS = [["day", 6], ["night", 18]]
+WEEKDAYS = [
+	"Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"
+]
+# UTC offsets are whole multiples of 15 minutes, so all timestamps in an
+# aligned 15 minute bucket fall within the same local hour, unless a timezone
+# transition happens within the bucket.
+OFFSET_BUCKET = 900
+SECONDS_PER_DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
 
 """
-	Wrapper method for converting timestamps to dates.
+	Wrapper method for converting timestamps to dates. Adds the columns of
+	every granularity requested in time_config (the optional "Time_config"
+	section of the config file) to the post table (see the posttable module)
+	in a single pass over its timestamps:
+
+	year, month, day, hour: Date and time of every row.
+	period: Year and month, encoded as year * 12 + month - 1 so that periods
+	sort in chronological order.
+	weekday: Day of the week, from 0 for Monday to 6 for Sunday.
+	iso_week: ISO year and week, encoded as ISO year * 100 + week.
+	day_part: Code into the names of the configured day parts, which are
+	stored in the "day_parts" entry of the table.
+
+	Dates are in the timezone given by time_config["Timezone"], or in the local
+	time of the machine if none is given. The names of the added columns are
+	stored in the "date_columns" entry of the table.
+
+	Instead of building a datetime for every row, UTC offsets are read from a
+	table of timezone transitions, all fields are computed once per local
+	hour, and each column is then filled in one go from the 15 minute bucket
+	of every row.
 """
 
 
-def ts_dt_conv(master_dic, subdir):
-	for sub in subdir:
-		iter_conv(master_dic[sub])
+def ts_dt_conv(table, time_config=None):
+	if time_config is None:
+		time_config = {}
+	granularities = time_config.get("Granularities", DEFAULT_GRANULARITIES)
+	day_parts = time_config.get("Day_parts", DEFAULT_DAY_PARTS)
+	offset_func = offset_function(time_config.get("Timezone", ""))
+	columns = date_columns(granularities)
+
+	ts_col = table["ts"]
+	buckets = list(map(OFFSET_BUCKET.__rfloordiv__, ts_col))
+	row_fields = []
+	if len(buckets) > 0:
+		starts, offsets = transition_table(offset_func, min(ts_col), max(ts_col))
+		hour_parts = day_part_table(day_parts)
+		hour_table = {}
+		day_table = {}
+		bucket_fields = {}
+		mixed_buckets = set()
+		for bucket in set(buckets):
+			bucket_start = bucket * OFFSET_BUCKET
+			idx = bisect_right(starts, bucket_start) - 1
+			if idx + 1 < len(starts) and starts[idx + 1] < bucket_start + OFFSET_BUCKET:
+				# Fixed up row by row below.
+				mixed_buckets.add(bucket)
+			local_hour = (bucket_start + offsets[idx]) // 3600
+			bucket_fields[bucket] = hour_fields(
+				local_hour, hour_table, day_table, hour_parts
+			)
+		row_fields = list(map(bucket_fields.__getitem__, buckets))
+		if len(mixed_buckets) > 0:
+			for row, bucket in enumerate(buckets):
+				if bucket in mixed_buckets:
+					ts = ts_col[row]
+					local_hour = (ts + offsets[bisect_right(starts, ts) - 1]) // 3600
+					row_fields[row] = hour_fields(
+						local_hour, hour_table, day_table, hour_parts
+					)
+
+	for name, typecode in columns:
+		table[name] = array(
+			typecode, list(map(itemgetter(FIELDS.index(name)), row_fields))
+		)
+	table["date_columns"] = [name for name, _ in columns]
+	table["day_parts"] = [name for name, _ in day_parts]
 
 
 """
-	Wrapper method to sort_by_date() all posts in each categories.
+	Returns the list of (column name, typecode) added for the given
+	granularities.
 """
 
 
-def sort_by_date(master_dic, subdir):
-	for sub in subdir:
-		iter_sort(master_dic[sub])
+def date_columns(granularities):
+	columns = []
+	for granularity in GRANULARITY_COLUMNS.keys():
+		if granularity in granularities or granularity == "month":
+			columns += GRANULARITY_COLUMNS[granularity]
+	return columns
 
 
 """
-	Helper method that recursively iterates through dictionaries and converts
-	all timestamp entries in the dictionary into year-month-date-hour formats.
+	Converts the optional Start_date and End_date fields of the config file
+	("YYYY-MM-DD" strings, "" if not set) into a [start, end) range of
+	timestamps, where start is the first second of Start_date and end is the
+	first second after End_date in the given timezone (see offset_function()).
+	Either end is None if its date is not set, and the whole range is None if
+	neither is.
+"""
 
-	Data upon entrance:
-	{
-		"ts": 1600000000,
-		"post": "This is a post",
-		["type": "Regular"], # Only included if is_post == True
-	}
 
-	Data upon return:
-	{
-		"year": 2020,
-		"month": 9,
-		"day": 13,
-		"hour": 5,
-		["type": "Regular"], # Only included if is_post == True
-	}
+def date_range(start_date, end_date, timezone):
+	if start_date == "" and end_date == "":
+		return None
+	ts_range = [None, None]
+	if start_date != "":
+		ts_range[0] = midnight_ts(parse_date(start_date), timezone)
+	if end_date != "":
+		day_after = date.fromordinal(parse_date(end_date).toordinal() + 1)
+		ts_range[1] = midnight_ts(day_after, timezone)
+	return ts_range
 
-	is_post is set to True if we're dealing with a normal post (i.e. not a
-	comment or a message).
-"""
+
+def parse_date(date_str):
+	return datetime.strptime(date_str, "%Y-%m-%d").date()
 
 
-def iter_conv(dic):
-	for key, value in dic.items():
-		if isinstance(value, dict):
-			iter_conv(value)
-		else:
-			dic[key] = [
-				{
-					"ts": p["ts"],
-					"year": int(datetime.fromtimestamp(p["ts"]).year),
-					"month": int(datetime.fromtimestamp(p["ts"]).month),
-					"day": int(datetime.fromtimestamp(p["ts"]).day),
-					"hour": int(datetime.fromtimestamp(p["ts"]).hour),
-					"post": p["post"],
-					"type": p.get("type", ""),
-					"Group name": p.get("Group name", "")
-				} for p in value
-			]
+def midnight_ts(day, timezone):
+	if timezone == "":
+		return int(time.mktime((day.year, day.month, day.day, 0, 0, 0, 0, 0, -1)))
+	midnight = datetime(day.year, day.month, day.day, tzinfo=ZoneInfo(timezone))
+	return int(midnight.timestamp())
 
 
 """
-	Helper method that recursively iterates through dictionaries and sorts
-	all entries in a list into dictionary formats based on their year, month,
-	day, and hour.
+	Returns a function that maps a timestamp to its UTC offset in seconds in
+	the given IANA timezone (e.g. "America/New_York"), or in the local time of
+	the machine if timezone is empty.
+"""
+
+
+def offset_function(timezone):
+	if timezone == "":
+		return local_offset
+	return partial(zone_offset, ZoneInfo(timezone))
+
+
+def local_offset(ts):
+	return time.localtime(ts).tm_gmtoff
+
 
-	Data upon entrance:
-	"Username": [
-		{
-			"year": 2020,
-			"month": 9,
-			"day": 13,
-			"hour": 5,
-			"post": "This is a post",
-			["type": "Regular"], # Only included if is_post == True
-		}
-	]
+def zone_offset(zone, ts):
+	return int(datetime.fromtimestamp(ts, zone).utcoffset().total_seconds())
 
-	Data upon return:
-	"Username": {
-		2020: {
-			9: {
-				13: {
-					"day": [
-						{
-							"post": "This is a post",
-							["type": "Regular"], # Only included if is_post == True
-						}
-					],
-				},
-			},
-		},
-	}
 
-	is_post is set to True if we're dealing with a normal post (i.e. not a
-	comment or a message).
 """
+	Precompute the timezone transitions between the timestamps start and end.
+	Returns two arrays (starts, offsets): offsets[i] is the UTC offset from
+	timestamp starts[i] on, until starts[i + 1].
 
+	The offset is sampled once per day, and every change between two samples
+	is narrowed down to the exact second by bisection. This assumes that a
+	timezone never changes its offset and back within the same day.
+"""
 
-def iter_sort(dic):
-	for key, value in dic.items():
-		if isinstance(value, dict):
-			iter_sort(value)
-		else:
-			sorted_dic = defaultdict(
-				lambda: defaultdict(
-					lambda: defaultdict(
-						lambda: defaultdict(lambda: [])
-					)
-				)
-			)
-			for post in value:
-				p_y = post["year"]
-				p_m = post["month"]
-				p_d = post["day"]
-				if post["hour"] < 18 and post["hour"] >= 6:
-					p_dt = "day"
+
+def transition_table(offset_func, start, end):
+	t = start // SECONDS_PER_DAY * SECONDS_PER_DAY
+	offset = offset_func(t)
+	starts = array("q", [t])
+	offsets = array("l", [offset])
+	while t <= end:
+		next_t = t + SECONDS_PER_DAY
+		next_offset = offset_func(next_t)
+		while next_offset != offset:
+			low, high = t, next_t
+			while high - low > 1:
+				mid = (low + high) // 2
+				if offset_func(mid) == offset:
+					low = mid
 				else:
-					p_dt = "night"
-				post_dic = {
-					"post": post["post"],
-					"type": post.get("type", ""),
-				}
-				if "Group name" in post.keys():
-					post_dic["Group name"] = post["Group name"]
-				sorted_dic[p_y][p_m][p_d][p_dt].append(post_dic)
-			dic[key] = sorted_dic
+					high = mid
+			t = high
+			offset = offset_func(high)
+			starts.append(t)
+			offsets.append(offset)
+		t = next_t
+	return starts, offsets
+
+
+"""
+	Returns the day part code of every hour of the day.
+"""
+
+
+def day_part_table(day_parts):
+	hour_parts = []
+	for hour in range(24):
+		code = len(day_parts) - 1
+		for idx, (_, start_hour) in enumerate(day_parts):
+			if start_hour <= hour:
+				code = idx
+		hour_parts.append(code)
+	return hour_parts
+
+
+"""
+	Computes the fields of a local hour (hours since 1970-01-01 00:00 in local
+	time) in the order of FIELDS. hour_table caches the fields of every hour
+	and day_table the date of every day seen so far.
+"""
+
+
+def hour_fields(local_hour, hour_table, day_table, hour_parts):
+	fields = hour_table.get(local_hour)
+	if fields is None:
+		local_days, hour = divmod(local_hour, 24)
+		day_fields = day_table.get(local_days)
+		if day_fields is None:
+			day_fields = day_table[local_days] = civil_from_days(local_days)
+		year, month, day, weekday, iso_week = day_fields
+		fields = hour_table[local_hour] = (
+			year, month, year * 12 + month - 1, day, hour, weekday, iso_week,
+			hour_parts[hour]
+		)
+	return fields
+
+
+"""
+	Converts a number of days since 1970-01-01 into a (year, month, day,
+	weekday, iso_week) tuple.
+"""
+
+
+def civil_from_days(days):
+	civil = date.fromordinal(EPOCH_ORDINAL + days)
+	iso_year, iso_week, _ = civil.isocalendar()
+	return (
+		civil.year, civil.month, civil.day, civil.weekday(),
+		iso_year * 100 + iso_week
+	)
+
+
+"""
+	Converts a period code as stored by ts_dt_conv() into its "YYYY-MM" string,
+	which is used as the key of all monthly results.
+"""
+
+
+def period_str(period):
+	year, month = divmod(period, 12)
+	return "{}-{:02d}".format(year, month + 1)
@@ -0,0 +1,75 @@
+from collections import Counter, defaultdict
+from itertools import islice
+
+"""
+	Word vocabulary module for the Social Media Analytics Kit.
+	Maps every word seen during a run to an integer id, so that word counts
+	can be kept in compact counters keyed by ids instead of by strings. Ids
+	are assigned in order of first appearance, and mapped back to words only
+	once the results are written.
+
+	Worker processes extend their own copy of the vocabulary. Counts sent back
+	from a worker are translated to the ids of the main process with
+	id_map() and remap_counts().
+
+	@author: DeltaSierra4
+"""
+
+# Id of every word seen so far. A missing word is given the next free id by
+# the dictionary itself, so that looking up a list of words runs entirely in
+# C (see count_words()).
+word_ids = defaultdict()
+word_ids.default_factory = word_ids.__len__
+# Words by id, i.e. the keys of word_ids in order. Extended by words().
+id_words = []
+
+
+"""
+	Add the given words to counter, a Counter of word ids.
+"""
+
+
+def count_words(counter, words):
+	counter.update(map(word_ids.__getitem__, words))
+
+
+"""
+	Returns the list of all words of the vocabulary, indexed by their ids.
+"""
+
+
+def words():
+	if len(id_words) < len(word_ids):
+		id_words.extend(islice(word_ids, len(id_words), None))
+	return id_words
+
+
+"""
+	Returns a Counter of word ids as a dictionary of {word: count}.
+"""
+
+
+def word_counts(counter):
+	all_words = words()
+	return {all_words[word_id]: count for word_id, count in counter.items()}
+
+
+"""
+	Returns the ids in this process of the words of another process, indexed
+	by their ids in the other process. other_words is the list returned by
+	words() in the other process.
+"""
+
+
+def id_map(other_words):
+	return list(map(word_ids.__getitem__, other_words))
+
+
+"""
+	Returns a Counter of the word ids of another process as a Counter of the
+	ids of this process, given the id_map() of the other process.
+"""
+
+
+def remap_counts(counter, ids):
+	return Counter({ids[word_id]: count for word_id, count in counter.items()})
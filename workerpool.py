@@ -0,0 +1,292 @@
+from collections import deque
+import gc
+import multiprocessing
+from multiprocessing.connection import wait
+import threading
+import time
+import traceback
+
+"""
+	Worker pool module for the Social Media Analytics Kit.
+	Runs analysis tasks in worker processes that are forked from the main
+	process after it has loaded and warmed the spaCy model, so that all
+	workers share the model's memory pages copy-on-write instead of each
+	loading their own copy.
+
+	Every worker sends a heartbeat while it is alive. A worker that dies or
+	stops sending heartbeats partway through a task is replaced by a freshly
+	forked one, and its task is handed out again. Workers read their resident
+	memory from /proc and report it with every heartbeat and result. The peaks
+	are printed in a summary when the pool is stopped.
+
+	@author: DeltaSierra4
+"""
+
+HEARTBEAT_INTERVAL = 2.0
+# A worker that has not been heard from for this long is restarted.
+HEARTBEAT_TIMEOUT = 30.0
+# Number of times a task is handed out again after its worker died.
+MAX_TASK_RETRIES = 2
+
+
+"""
+	Start a pool of the given number of worker processes. Each worker calls
+	initializer(*initargs) once after it is started. Workers are forked where
+	the platform supports it, so initargs are inherited rather than copied.
+	The garbage collector is frozen first, so that collections in the workers
+	do not touch (and thereby copy) the pages of objects that already exist.
+
+	Returns the pool, which is a dictionary holding the state of every worker.
+"""
+
+
+def start_pool(workers, initializer, initargs=()):
+	if "fork" in multiprocessing.get_all_start_methods():
+		context = multiprocessing.get_context("fork")
+	else:
+		print(
+			"Fork is not supported on this platform. "
+			"Every worker loads its own model."
+		)
+		context = multiprocessing.get_context()
+	if hasattr(gc, "freeze"):
+		gc.freeze()
+	pool = {
+		"context": context,
+		"initializer": initializer,
+		"initargs": initargs,
+		"workers": [],
+	}
+	for slot in range(workers):
+		pool["workers"].append({
+			"pids": [],
+			"tasks": 0,
+			"restarts": 0,
+			"peak_rss": 0,
+			"peak_pss": 0,
+		})
+		start_worker(pool, slot)
+	return pool
+
+
+def start_worker(pool, slot):
+	parent_conn, child_conn = pool["context"].Pipe()
+	process = pool["context"].Process(
+		target=worker_main,
+		args=(child_conn, pool["initializer"], pool["initargs"]),
+		daemon=True
+	)
+	process.start()
+	child_conn.close()
+	worker = pool["workers"][slot]
+	worker["process"] = process
+	worker["conn"] = parent_conn
+	worker["task"] = None
+	worker["last_seen"] = time.monotonic()
+	worker["pids"].append(process.pid)
+
+
+"""
+	Main loop of a worker process. Receives (task id, function, argument)
+	tuples and sends back the result of function(argument), until it receives
+	None. A background thread sends a heartbeat in the meantime. Every message
+	also carries the current (RSS, PSS) of the worker, so that the memory of
+	a worker that dies is still known.
+"""
+
+
+def worker_main(conn, initializer, initargs):
+	initializer(*initargs)
+	send_lock = threading.Lock()
+	stopped = threading.Event()
+	threading.Thread(
+		target=heartbeat_loop, args=(conn, send_lock, stopped), daemon=True
+	).start()
+	while True:
+		message = conn.recv()
+		if message is None:
+			break
+		task_id, func, arg = message
+		try:
+			reply = ("result", task_id, func(arg))
+		except Exception:
+			reply = ("error", task_id, traceback.format_exc())
+		with send_lock:
+			conn.send(reply + (process_memory("self"),))
+	stopped.set()
+
+
+def heartbeat_loop(conn, send_lock, stopped):
+	while not stopped.wait(HEARTBEAT_INTERVAL):
+		memory = process_memory("self")
+		with send_lock:
+			conn.send(("heartbeat", None, None, memory))
+
+
+"""
+	Run func on every task in the pool. Yields the results in the same order
+	as tasks, like multiprocessing.Pool.imap(). Raises a RuntimeError if a task
+	raises an exception, or if its worker died more than MAX_TASK_RETRIES
+	times while running it.
+"""
+
+
+def imap(pool, func, tasks):
+	tasks = list(tasks)
+	pending = deque(range(len(tasks)))
+	retries = [0] * len(tasks)
+	results = {}
+	next_id = 0
+	workers = pool["workers"]
+	while next_id < len(tasks):
+		for worker in workers:
+			if worker["task"] is None and len(pending) > 0:
+				task_id = pending.popleft()
+				worker["task"] = task_id
+				worker["conn"].send((task_id, func, tasks[task_id]))
+
+		conns = [worker["conn"] for worker in workers]
+		sentinels = [worker["process"].sentinel for worker in workers]
+		ready = wait(conns + sentinels, timeout=HEARTBEAT_INTERVAL)
+		now = time.monotonic()
+		for slot, worker in enumerate(workers):
+			alive = True
+			if worker["conn"] in ready:
+				try:
+					kind, task_id, payload, memory = worker["conn"].recv()
+				except (EOFError, OSError):
+					alive = False
+				else:
+					worker["last_seen"] = now
+					record_memory(worker, memory)
+					if kind == "result":
+						results[task_id] = payload
+						worker["task"] = None
+						worker["tasks"] += 1
+					elif kind == "error":
+						raise RuntimeError("Task {} failed in worker {}:\n{}".format(
+							task_id, worker["process"].pid, payload
+						))
+			if not alive or not worker["process"].is_alive() or \
+				now - worker["last_seen"] > HEARTBEAT_TIMEOUT:
+				restart_worker(pool, slot, pending, retries)
+
+		while next_id in results:
+			yield results.pop(next_id)
+			next_id += 1
+
+
+"""
+	Replace the worker in slot with a freshly forked one, and hand its task
+	out again.
+"""
+
+
+def restart_worker(pool, slot, pending, retries):
+	worker = pool["workers"][slot]
+	task_id = worker["task"]
+	print("Worker {} stopped responding{}. Restarting it.".format(
+		worker["process"].pid,
+		"" if task_id is None else " during task {}".format(task_id)
+	))
+	if worker["process"].is_alive():
+		worker["process"].kill()
+	worker["process"].join()
+	worker["conn"].close()
+	if task_id is not None:
+		retries[task_id] += 1
+		if retries[task_id] > MAX_TASK_RETRIES:
+			raise RuntimeError("Task {} failed after {} restarts".format(
+				task_id, MAX_TASK_RETRIES
+			))
+		pending.appendleft(task_id)
+	worker["restarts"] += 1
+	start_worker(pool, slot)
+
+
+"""
+	Stop all workers of the pool and print the run summary: tasks, restarts,
+	and peak resident memory of every worker. RSS counts shared pages in full,
+	whereas PSS splits them between the processes sharing them, which shows
+	how much memory each worker actually adds. The peaks of a slot cover all
+	processes that ran in it, up to the last message of those that died.
+"""
+
+
+def stop_pool(pool):
+	for worker in pool["workers"]:
+		if worker["process"].is_alive():
+			record_memory(worker, process_memory(worker["process"].pid))
+		try:
+			worker["conn"].send(None)
+		except (BrokenPipeError, OSError):
+			pass
+	for worker in pool["workers"]:
+		worker["process"].join(HEARTBEAT_TIMEOUT)
+		if worker["process"].is_alive():
+			worker["process"].kill()
+			worker["process"].join()
+		worker["conn"].close()
+	if hasattr(gc, "unfreeze"):
+		gc.unfreeze()
+
+	main_memory = process_memory("self")
+	print("Worker summary (main process: RSS {}, PSS {}):".format(
+		format_kb(main_memory[0]), format_kb(main_memory[1])
+	))
+	for slot, worker in enumerate(pool["workers"]):
+		print(
+			"  worker {} (pid {}): {} tasks, {} restarts, "
+			"peak RSS {}, peak PSS {}".format(
+				slot, ",".join(str(pid) for pid in worker["pids"]),
+				worker["tasks"], worker["restarts"], format_kb(worker["peak_rss"]),
+				format_kb(worker["peak_pss"])
+			)
+		)
+
+
+"""
+	Update the peak memory of a worker with an (RSS, PSS) it reported.
+"""
+
+
+def record_memory(worker, memory):
+	rss, pss = memory
+	worker["peak_rss"] = max(worker["peak_rss"], rss)
+	worker["peak_pss"] = max(worker["peak_pss"], pss)
+
+
+"""
+	Returns the (RSS, PSS) of a process in kB, read from /proc. pid may also
+	be "self". Returns (0, 0) where /proc is not available, and the RSS as the
+	PSS on kernels without smaps_rollup.
+"""
+
+
+def process_memory(pid):
+	fields = {}
+	for name in ["smaps_rollup", "status"]:
+		try:
+			with open("/proc/{}/{}".format(pid, name)) as f:
+				for line in f:
+					key, _, value = line.partition(":")
+					if value.strip().endswith("kB"):
+						fields[key] = int(value.split()[0])
+		except OSError:
+			continue
+		if "Rss" in fields or "VmRSS" in fields:
+			break
+	rss = fields.get("Rss", fields.get("VmRSS", 0))
+	return rss, fields.get("Pss", rss)
+
+
+"""
+	Returns a memory size in kB as a string in MB, or "n/a" for 0, i.e. for a
+	worker that never reported its memory.
+"""
+
+
+def format_kb(kb):
+	if kb == 0:
+		return "n/a"
+	return "{:.1f}MB".format(kb / 1024)